@@ -0,0 +1,29 @@
+# archive_orders.py
+"""
+🗄️ ย้าย Order ที่ปิดแล้ว (completed/cancelled) และเก่ากว่าที่กำหนดไปยังตาราง orders_archive / order_items_archive
+
+ใช้รันเป็นงานตามรอบ (เช่น cron) เพื่อให้ตาราง orders และ order_items มีขนาดเล็กอยู่เสมอ:
+
+    python archive_orders.py --older-than-days 180 --batch-size 500
+"""
+import argparse
+from models import order as order_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive closed orders older than a given age")
+    parser.add_argument("--older-than-days", type=int, default=order_model.ORDER_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=order_model.ORDER_ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+
+    archived = order_model.archive_orders(
+        older_than_days=args.older_than_days,
+        batch_size=args.batch_size,
+        max_batches=args.max_batches
+    )
+    print(f"🗄️ Archived {archived} orders")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
 import jwt
 import bcrypt
+import os
+import asyncio
+import hashlib
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
-from fastapi import HTTPException, Depends
+from fastapi import HTTPException, Depends, Request
 from fastapi.security import OAuth2PasswordBearer
+from cache import TTLCache, BloomFilter, worker_round
 from database import get_connection
+from models import user as user_model
 
 # 🔒 ค่าความปลอดภัยของ JWT
 SECRET_KEY = "mysecretkey"
@@ -16,6 +26,36 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# 🧵 Worker Pool สำหรับ bcrypt แยกจาก Threadpool หลักของ API
+# bcrypt ใช้ CPU หนัก ถ้าปล่อยให้รันไม่จำกัดจะแย่ง Worker ของ Request อื่นจนทั้งระบบช้า
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', PASSWORD_HASH_WORKERS * 4))
+
+_password_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+# จำนวนงานที่รันอยู่ + รอคิวได้พร้อมกันสูงสุด ถ้าเต็มจะปฏิเสธทันทีแทนการต่อคิวยาว
+_password_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT)
+
+# 🗂️ Cache ของ Claims ที่ตรวจลายเซ็นแล้ว (key = SHA-256 ของ Token) หมดอายุพร้อม exp ของ Token
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+_verified_tokens = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+# 🚫 รายการ Token ที่ถูกเพิกถอน: ตรวจด้วย Bloom Filter ในหน่วยความจำ และโหลดใหม่จากตาราง revoked_tokens เป็นรอบ
+# (Request ปกติไม่ต้อง Query ฐานข้อมูล จะ Query เฉพาะเมื่อ Bloom Filter ตอบว่า "อาจถูกเพิกถอน")
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('REVOCATION_REFRESH_SECONDS', 30))
+REVOCATION_BLOOM_CAPACITY = int(os.environ.get('REVOCATION_BLOOM_CAPACITY', 100000))
+# ไฟล์ Lock ที่ทุก Worker ใช้ร่วมกัน ให้มี Worker เดียวที่ลบรายการที่หมดอายุในแต่ละรอบ (ดู purge_expired_revocations)
+REVOCATION_PURGE_LOCK_PATH = os.environ.get(
+    'REVOCATION_PURGE_LOCK_PATH', os.path.join(tempfile.gettempdir(), "revoked_tokens_purge.lock")
+)
+_revocation_bloom = BloomFilter(capacity=REVOCATION_BLOOM_CAPACITY)
+_revocation_loaded_at = 0.0
+_revocation_refresh_lock = threading.Lock()
+# ผลการยืนยันกับฐานข้อมูลของ Token ที่ Bloom Filter ตอบว่าอาจมี (กันไม่ให้ Query ซ้ำทุก Request)
+_revocation_checks = TTLCache(maxsize=10000, ttl=REVOCATION_REFRESH_SECONDS)
+
 def hash_password(password: str):
     """ 🔒 แปลงรหัสผ่านเป็น Hash ก่อนบันทึก """
     # ใช้ pwd_context แทนการเรียก bcrypt โดยตรง
@@ -27,23 +67,173 @@ def verify_password(plain_password, hashed_password):
     """
     return pwd_context.verify(plain_password, hashed_password)
 
+async def verify_password_async(plain_password, hashed_password):
+    """ 🔍 ตรวจสอบรหัสผ่านใน Worker Pool ของ bcrypt โดยไม่บล็อก Event Loop
+    ถ้าคิวเต็มจะตอบ 503 ทันที เพื่อไม่ให้ Login จำนวนมากทำให้ API ส่วนอื่นค้าง
+    """
+    if not _password_hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts in progress, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _password_hash_executor, verify_password, plain_password, hashed_password
+        )
+    finally:
+        _password_hash_slots.release()
+
 def create_access_token(data: dict):
     """ 🔥 สร้าง JWT Token """
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # jti ใช้ระบุ Token รายตัวสำหรับการเพิกถอน, iat ใช้เพิกถอน Token ทั้งหมดของผู้ใช้ที่ออกก่อนเวลาหนึ่ง
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def decode_access_token(token: str):
-    """ 🧐 ตรวจสอบ JWT Token """
+    """ 🧐 ตรวจสอบ JWT Token (ใช้ Claims ที่ตรวจแล้วจาก Cache ถ้ามี) และตรวจว่าไม่ถูกเพิกถอน """
+    cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+    claims = _verified_tokens.get(cache_key)
+
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        # เก็บไว้จนถึงเวลา exp เท่านั้น หลังจากนั้นต้องตรวจใหม่ (และจะได้ Token expired)
+        _verified_tokens.set(cache_key, claims, ttl=claims.get("exp", 0) - time.time())
+
+    if is_token_revoked(claims):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return dict(claims)
+
+def refresh_revocations():
+    """ 🔄 โหลดรายการ Token ที่ถูกเพิกถอนและยังไม่หมดอายุจากฐานข้อมูลมาสร้าง Bloom Filter ใหม่ (อ่านอย่างเดียว) """
+    global _revocation_bloom, _revocation_loaded_at
+    conn = get_connection()
     try:
-        decoded_data = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return decoded_data
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT token_key FROM revoked_tokens WHERE expires_at > %s", (datetime.now(),))
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    bloom = BloomFilter(capacity=max(REVOCATION_BLOOM_CAPACITY, len(rows) * 2))
+    for row in rows:
+        bloom.add(row["token_key"])
+
+    _revocation_bloom = bloom
+    _revocation_checks.clear()
+    _revocation_loaded_at = time.monotonic()
+
+def purge_expired_revocations(min_age: float = 0, lock_path: str = REVOCATION_PURGE_LOCK_PATH):
+    """ 🧹 ลบรายการเพิกถอนของ Token ที่หมดอายุแล้ว (เรียกจาก Janitor ไม่ใช่ใน Request)
+    Worker อื่นที่กำลังลบอยู่ หรือเพิ่งลบไปไม่เกิน min_age วินาที จะข้ามไป คืนจำนวนแถวที่ลบ หรือ None ถ้าข้าม
+    """
+    with worker_round(lock_path, min_age) as leader:
+        if not leader:
+            return None
+
+        conn = get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM revoked_tokens WHERE expires_at <= %s", (datetime.now(),))
+                deleted = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+    return deleted
+
+def _maybe_refresh_revocations():
+    """ ⏱️ โหลดรายการเพิกถอนใหม่เมื่อครบรอบ (ให้ Thread เดียวทำ ที่เหลือใช้ข้อมูลเดิมต่อไป) """
+    global _revocation_loaded_at
+    if time.monotonic() - _revocation_loaded_at < REVOCATION_REFRESH_SECONDS:
+        return
+    if not _revocation_refresh_lock.acquire(blocking=False):
+        return
+    try:
+        refresh_revocations()
+    except Exception as e:
+        # ฐานข้อมูลมีปัญหา: ใช้ Bloom Filter เดิมไปก่อน แล้วลองใหม่รอบถัดไป
+        print(f"Error refreshing token revocations: {str(e)}")
+        _revocation_loaded_at = time.monotonic()
+    finally:
+        _revocation_refresh_lock.release()
+
+def is_token_revoked(claims: dict):
+    """ 🚫 ตรวจว่า Token ถูกเพิกถอนหรือไม่ (ส่วนใหญ่จบที่ Bloom Filter โดยไม่ต้อง Query) """
+    _maybe_refresh_revocations()
+
+    keys = [f"sub:{claims.get('sub')}"]
+    if claims.get("jti"):
+        keys.append(f"jti:{claims['jti']}")
+
+    candidates = [key for key in keys if key in _revocation_bloom]
+    if not candidates:
+        return False
+
+    check_key = (claims.get("jti"), claims.get("sub"), claims.get("iat"))
+    revoked = _revocation_checks.get(check_key)
+    if revoked is None:
+        conn = get_connection()
+        try:
+            with conn.cursor() as cursor:
+                placeholders = ', '.join(['%s'] * len(candidates))
+                cursor.execute(
+                    f"SELECT token_key, issued_before FROM revoked_tokens WHERE token_key IN ({placeholders})",
+                    candidates
+                )
+                rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        revoked = any(
+            row["token_key"].startswith("jti:") or claims.get("iat", 0) <= (row["issued_before"] or 0)
+            for row in rows
+        )
+        _revocation_checks.set(check_key, revoked)
+    return revoked
+
+def _save_revocation(token_key: str, issued_before, expires_at: datetime):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO revoked_tokens (token_key, issued_before, expires_at)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE issued_before = VALUES(issued_before), expires_at = VALUES(expires_at)
+                """,
+                (token_key, issued_before, expires_at)
+            )
+            conn.commit()
+    finally:
+        conn.close()
+
+    # มีผลทันทีใน Worker นี้ ส่วน Worker อื่นจะเห็นเมื่อโหลดรายการใหม่รอบถัดไป
+    _revocation_bloom.add(token_key)
+    _revocation_checks.clear()
+
+def revoke_token(claims: dict):
+    """ 🚪 เพิกถอน Token รายตัว (ใช้ตอน Logout) """
+    if not claims.get("jti"):
+        return
+    _save_revocation(f"jti:{claims['jti']}", None, datetime.fromtimestamp(claims.get("exp", time.time())))
+
+def revoke_user_tokens(username: str):
+    """ 🚪 เพิกถอน Token ทั้งหมดของผู้ใช้ที่ออกก่อนเวลานี้ (ใช้ตอนลบผู้ใช้) """
+    _save_revocation(
+        f"sub:{username}",
+        int(time.time()),
+        datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
     """ ✅ ดึงข้อมูล User จาก JWT Token """
@@ -52,6 +242,49 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         raise HTTPException(status_code=401, detail="Invalid token")
     return payload
 
+def _resolve_identity(payload: dict):
+    """ 🪪 แปลง Claims ของ JWT เป็นตัวตนของผู้ใช้ (user_id, role) ผ่าน Cache """
+    username = payload.get("sub") if payload else None
+    if not username:
+        return None
+
+    identity = user_model.get_identity(username)
+    if not identity:
+        return None
+
+    # คง key "sub" ไว้ให้โค้ดเดิมที่อ่าน current_user.get("sub") ใช้งานได้
+    identity["sub"] = username
+    return identity
+
+def get_current_identity(token: str = Depends(oauth2_scheme)):
+    """ ✅ Dependency กลาง: ดึงตัวตนของผู้ใช้จาก JWT Token (user_id, username, role) """
+    identity = _resolve_identity(decode_access_token(token))
+    if not identity:
+        raise HTTPException(status_code=401, detail="User not found")
+    return identity
+
+def get_identity_from_cookie(request: Request):
+    """ 🍪 ดึงตัวตนจาก Cookie access_token (ใช้กับหน้า Admin) คืนค่า None ถ้าไม่มีหรือไม่ถูกต้อง """
+    token = request.cookies.get("access_token")
+    if not token or not token.startswith("Bearer "):
+        return None
+
+    try:
+        payload = decode_access_token(token.replace("Bearer ", ""))
+    except HTTPException:
+        return None
+    return _resolve_identity(payload)
+
+class AdminLoginRequired(Exception):
+    """ 🔐 หน้า Admin ที่ยังไม่ได้ Login เป็น admin (main.py แปลงเป็น Redirect ไปหน้า Login) """
+
+def get_admin_identity_from_cookie(request: Request):
+    """ 🔐 Dependency สำหรับหน้า Admin: ต้องมี Cookie ของผู้ใช้ role admin ไม่เช่นนั้น Redirect ไปหน้า Login """
+    identity = get_identity_from_cookie(request)
+    if not identity or identity.get("role") != "admin":
+        raise AdminLoginRequired()
+    return identity
+
 def authenticate_user(username: str, password: str):
     """ 🔐 ตรวจสอบชื่อผู้ใช้และรหัสผ่านกับฐานข้อมูลจริง """
     conn = get_connection()
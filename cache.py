@@ -0,0 +1,358 @@
+# cache.py
+"""
+🧠 โครงสร้างข้อมูล Cache ในหน่วยความจำที่ใช้ร่วมกันทั้งโปรเจกต์
+(ทุกตัวเป็นแบบ Thread-safe เพราะ Endpoint แบบ def ของ FastAPI รันใน Threadpool)
+"""
+import asyncio
+import functools
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    import fcntl
+except ImportError:  # Windows: ไม่มี flock (ใช้ Worker เดียวอยู่แล้ว)
+    fcntl = None
+
+_MISSING = object()
+
+
+class TTLCache:
+    """ 🗂️ Cache แบบ LRU จำกัดจำนวนรายการ และแต่ละรายการหมดอายุตาม TTL """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        """ 💾 เก็บค่า (ระบุ ttl เพื่อกำหนดอายุเฉพาะรายการนี้ได้) """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class BloomFilter:
+    """ 🌸 Bloom Filter: ตอบได้ว่า "ไม่มีแน่นอน" หรือ "อาจมี" โดยใช้หน่วยความจำคงที่
+    (ใช้คัดกรองก่อน ถ้าตอบว่าอาจมีจึงค่อยตรวจกับแหล่งข้อมูลจริง)
+    """
+
+    def __init__(self, capacity: int = 10000, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: ใช้ hash 2 ค่าจาก digest เดียวสร้างตำแหน่งทั้งหมด
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class DiskLRUCache:
+    """ 💽 Cache ไฟล์บนดิสก์ จำกัดขนาดรวม (byte) เมื่อเกินจะลบไฟล์ที่ไม่ได้ใช้นานที่สุดก่อน (LRU)
+    ลำดับการใช้งานมาจาก mtime ของไฟล์ และทุกครั้งที่ get จะ touch ไฟล์ให้ใหม่ขึ้น
+    ขนาดรวมนับทั้งโฟลเดอร์ที่ทุก Worker ใช้ร่วมกัน: add จะอ่านโฟลเดอร์ใหม่ (รวมไฟล์และการใช้งานของ Worker อื่น)
+    อย่างมากทุก scan_interval วินาที จึงเกินกำหนดได้ไม่เกินไฟล์ที่ Worker อื่นเพิ่มในช่วงนั้น
+    """
+
+    def __init__(self, directory: str, max_bytes: int, scan_interval: float = 60):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.scan_interval = scan_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.scans = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._entries, self.total_bytes = self._scan()
+        self._scanned_at = time.monotonic()
+
+    def _scan(self):
+        existing = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        stat = entry.stat()
+                        existing.append((stat.st_mtime, entry.name, stat.st_size))
+                except FileNotFoundError:
+                    continue  # ถูกลบโดย Worker อื่นระหว่างอ่าน
+        entries = OrderedDict((name, size) for _, name, size in sorted(existing))
+        return entries, sum(entries.values())
+
+    def path(self, name: str):
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str):
+        """ 🔍 คืน Path ของไฟล์ถ้ามีใน Cache (ไม่มีคืน None) """
+        path = self.path(name)
+        with self._lock:
+            if name in self._entries and os.path.exists(path):
+                self._entries.move_to_end(name)
+                self.hits += 1
+            else:
+                # ไฟล์อาจถูกลบโดย Worker อื่น
+                self.total_bytes -= self._entries.pop(name, 0)
+                self.misses += 1
+                return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def add(self, name: str):
+        """ 💾 ลงทะเบียนไฟล์ที่เขียนเสร็จแล้วใน directory และลบไฟล์เก่าจนขนาดรวมไม่เกินกำหนด """
+        if time.monotonic() - self._scanned_at >= self.scan_interval:
+            entries, total_bytes = self._scan()
+            with self._lock:
+                self._entries, self.total_bytes = entries, total_bytes
+                self._scanned_at = time.monotonic()
+                self.scans += 1
+
+        size = os.path.getsize(self.path(name))
+        with self._lock:
+            self.total_bytes -= self._entries.pop(name, 0)
+            self._entries[name] = size
+            self.total_bytes += size
+
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_name, old_size = self._entries.popitem(last=False)
+                self.total_bytes -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(self.path(old_name))
+                except FileNotFoundError:
+                    pass
+        return self.path(name)
+
+    def discard(self, prefix: str):
+        """ 🗑️ ลบทุกไฟล์ที่ชื่อขึ้นต้นด้วย prefix (ใช้เมื่อไฟล์ต้นฉบับถูกลบ) """
+        # ตรวจจากดิสก์ด้วย เพราะไฟล์อาจถูกสร้างโดย Worker อื่นที่ไม่อยู่ใน Index ของ Process นี้
+        with os.scandir(self.directory) as it:
+            names = [entry.name for entry in it if entry.name.startswith(prefix)]
+        with self._lock:
+            for name in names:
+                self.total_bytes -= self._entries.pop(name, 0)
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        return {
+            "files": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "scans": self.scans
+        }
+
+
+class AsyncSingleFlight:
+    """ 🛫 รวม Request ที่ทำงานเดียวกันพร้อมกัน (key เดียวกัน) ให้รันงานจริงเพียงครั้งเดียว
+    ตัวที่มาทีหลังจะรอผลลัพธ์ (หรือ Exception) เดียวกันกับตัวแรก
+    งานจริงรันเป็น Task แยก ผู้เรียกที่ถูกยกเลิก (เช่น Client ตัดการเชื่อมต่อ) จึงไม่ทำให้ผู้เรียกอื่นถูกยกเลิกตาม
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._metrics = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0}
+
+    async def do(self, key, fn, *args):
+        self._metrics["calls"] += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self._metrics["coalesced"] += 1
+        else:
+            self._metrics["executions"] += 1
+            task = self._inflight[key] = asyncio.ensure_future(self._run(key, fn, *args))
+            # ป้องกันคำเตือน "exception was never retrieved" เมื่อผู้เรียกทุกคนถูกยกเลิกไปก่อน
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(task)
+
+    async def _run(self, key, fn, *args):
+        try:
+            return await fn(*args)
+        except Exception:
+            self._metrics["errors"] += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        return {**self._metrics, "inflight": len(self._inflight)}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """ 🛫 AsyncSingleFlight สำหรับฟังก์ชันธรรมดาที่ถูกเรียกจากหลาย Thread (เช่น Endpoint แบบ def ใน Threadpool)
+    Thread แรกของ key รันงานจริง Thread อื่นที่มาระหว่างนั้นรอผลลัพธ์ (หรือ Exception) เดียวกัน
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._metrics = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0}
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            self._metrics["calls"] += 1
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self._metrics["executions"] += 1
+            else:
+                self._metrics["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._metrics["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {**self._metrics, "inflight": len(self._inflight)}
+
+
+_single_flights = {}
+
+
+def single_flight(fn):
+    """ 🛫 Decorator: การเรียก fn ด้วย args เดียวกันที่เกิดขึ้นพร้อมกันใน Process นี้ใช้ผลลัพธ์ (เช่น Query) ร่วมกัน
+    - เรียก fn(*args) ตรง ๆ จาก Thread ใดก็ได้ (Route แบบ def)
+    - await fn.aio(*args) จาก Route แบบ async: ตัวที่รออยู่รอบน Event Loop โดยไม่ใช้ Thread ของ Threadpool
+    ผลลัพธ์เป็น Object เดียวกันสำหรับทุกผู้เรียก ผู้เรียกจึงไม่ควรแก้ไขผลลัพธ์โดยตรง
+    ผู้เรียกอาจได้ผลของ Query ที่เริ่มก่อนการเขียนที่เพิ่ง commit โค้ดหลังการเขียน (หรือที่ Cache ผลตาม version)
+    ต้องเรียกฟังก์ชันที่ไม่ได้ใช้ Decorator นี้
+    """
+    flight = SingleFlight()
+    async_flight = AsyncSingleFlight()
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        return flight.do(args, fn, *args)
+
+    async def aio(*args):
+        return await async_flight.do(args, run_in_threadpool, wrapper, *args)
+
+    wrapper.aio = aio
+    wrapper.stats = lambda: {"threads": flight.stats(), "async": async_flight.stats()}
+    _single_flights[f"{fn.__module__}.{fn.__qualname__}"] = wrapper
+    return wrapper
+
+
+def single_flight_stats():
+    """ 📊 สถิติของทุกฟังก์ชันที่ใช้ @single_flight (coalesced คือจำนวนการเรียกที่ไม่ต้อง Query เอง) """
+    return {name: wrapper.stats() for name, wrapper in _single_flights.items()}
+
+
+@contextmanager
+def worker_round(lock_path: str, min_age: float = 0, done_path: str = None):
+    """ 🔒 ให้งานตามรอบที่ทุก Worker บนเครื่องเดียวกันเรียก ถูกทำโดย Worker เดียว (flock บน lock_path)
+    yield True ถ้าได้ทำรอบนี้ หรือ False ถ้า Worker อื่นกำลังทำอยู่ หรือรอบล่าสุดเสร็จไปไม่เกิน min_age วินาที
+    เวลาที่เสร็จรอบล่าสุดคือ mtime ของ done_path (เช่นไฟล์ผลลัพธ์ของงาน) ถ้าไม่ระบุจะบันทึกลงไฟล์ Lock เมื่อทำสำเร็จ
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+
+        # ไฟล์ว่างหรือไม่มีไฟล์ = ยังไม่เคยทำ
+        marker = done_path or lock_path
+        if min_age and os.path.exists(marker) and os.path.getsize(marker) and time.time() - os.path.getmtime(marker) < min_age:
+            yield False
+            return
+
+        yield True
+        if done_path is None:
+            lock_file.truncate(0)
+            lock_file.write(f"{time.time()}\n")
+        # lock ถูกปล่อยเมื่อปิดไฟล์
@@ -0,0 +1,88 @@
+# catalog_cache.py
+"""
+🗃️ Cache ผลลัพธ์รายการสินค้าของหน้า Admin (ค้นหา / กรอง / เรียง / แบ่งหน้า)
+
+- Key คือ (catalog version ของ Process, catalog version ที่ใช้ร่วมกัน, ตัวกรองที่ Normalize แล้ว) และแต่ละรายการมีอายุสั้น (CATALOG_CACHE_TTL)
+- catalog version ของ Process เพิ่มขึ้นหลัง commit ทุกครั้งที่สินค้า รูปภาพ หรือสต็อกเปลี่ยนใน Worker นี้ (models เรียก bump_version())
+  ผลลัพธ์ที่ Cache ไว้ก่อนหน้าจึงไม่ถูกใช้อีกทันที
+- catalog version ที่ใช้ร่วมกันคือ SUM(product_counters.changes) ซึ่ง Trigger เพิ่มเมื่อเพิ่ม/ลบสินค้า หรือ products.version เปลี่ยน
+  (การเขียนสินค้า รูปภาพ และสต็อกเพิ่ม version เสมอ) จึงรวมการเขียนจาก Worker อื่นและสคริปต์ (SQL ตรง ๆ ต้องเพิ่ม version เอง)
+  อ่านอย่างมากทุก CATALOG_VERSION_CHECK_INTERVAL วินาที Worker อื่นจึงเห็นผลลัพธ์เก่าได้ไม่เกินช่วงนี้
+- Request ที่ขอผลลัพธ์เดียวกันพร้อมกันขณะยังไม่มีใน Cache จะรอ Query เดียวกัน (Single-flight)
+"""
+import os
+import threading
+import time
+from fastapi.concurrency import run_in_threadpool
+from cache import TTLCache, AsyncSingleFlight
+from database import get_connection
+
+CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 30))  # วินาที
+CATALOG_CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', 256))
+CATALOG_COUNT_CACHE_TTL = int(os.environ.get('CATALOG_COUNT_CACHE_TTL', 5 * 60))  # วินาที
+CATALOG_VERSION_CHECK_INTERVAL = float(os.environ.get('CATALOG_VERSION_CHECK_INTERVAL', 1))  # วินาที
+
+search_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+# 🔢 จำนวนผลลัพธ์ของการค้นหาข้อความ (ค่าประมาณ: ไม่ขึ้นกับ catalog version จึงอาจคลาดเคลื่อนได้ไม่เกิน TTL)
+count_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_COUNT_CACHE_TTL)
+_search_flight = AsyncSingleFlight()
+
+_version = 0
+_version_lock = threading.Lock()
+_shared_version = None
+_shared_checked_at = float("-inf")
+
+
+def bump_version():
+    """ 🔖 ทำให้ผลลัพธ์ที่ Cache ไว้ทั้งหมดใช้ไม่ได้ (เรียกหลัง commit การเขียนสินค้า รูปภาพ หรือสต็อก) """
+    global _version
+    with _version_lock:
+        _version += 1
+
+
+def get_version():
+    return _version
+
+
+def load_shared_version():
+    """ 🔖 catalog version ที่ทุก Worker เห็นตรงกัน (จำนวนการเปลี่ยนแถวใน products ที่ Trigger นับไว้ อ่านจาก 16 แถว) """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COALESCE(SUM(changes), 0) AS changes FROM product_counters")
+            return int(cursor.fetchone()['changes'])
+    finally:
+        conn.close()
+
+
+async def get_shared_version():
+    """ 🔖 load_shared_version() ที่อ่านซ้ำอย่างมากทุก CATALOG_VERSION_CHECK_INTERVAL วินาที """
+    global _shared_version, _shared_checked_at
+    now = time.monotonic()
+    if _shared_version is None or now - _shared_checked_at >= CATALOG_VERSION_CHECK_INTERVAL:
+        _shared_checked_at = now
+        _shared_version = await run_in_threadpool(load_shared_version)
+    return _shared_version
+
+
+async def cached_search(filters: tuple, loader):
+    """ 🔍 ผลลัพธ์ของ loader(*filters) จาก Cache หรือ Query ใหม่ (Request ที่ซ้ำกันพร้อมกันใช้ Query เดียว)
+    filters ต้อง Normalize มาแล้ว (เช่น ผ่าน models.product.normalize_product_filters) เพื่อให้ Key ตรงกัน
+    """
+    # อ่าน version ก่อนข้อมูล ผลลัพธ์ที่ Cache จึงไม่เก่ากว่า Key ของมัน
+    key = (get_version(), await get_shared_version(), *filters)
+    result = search_cache.get(key)
+    if result is None:
+        result = await _search_flight.do(key, _load, key, filters, loader)
+    return result
+
+
+async def _load(key, filters, loader):
+    result = await run_in_threadpool(loader, *filters)
+    # เก็บภายใต้ version ตอนเริ่ม Query ถ้ามีการเขียนระหว่างนั้น Key นี้จะไม่ถูกอ่านอีก
+    search_cache.set(key, result)
+    return result
+
+
+def stats():
+    return {"version": _version, "shared_version": _shared_version, **search_cache.stats(), "search_counts": count_cache.stats()}
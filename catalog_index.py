@@ -0,0 +1,267 @@
+# catalog_index.py
+"""
+📊 Index แบบคอลัมน์ในหน่วยความจำ (NumPy) สำหรับกรอง/เรียง/แบ่งหน้า รายการสินค้าของหน้า Admin โดยไม่ต้อง Query MySQL
+
+- เก็บ product_id, ราคา (สตางค์), สต็อก และ created_at เป็น NumPy Array พร้อมลำดับการเรียง (Permutation)
+  ของแต่ละคอลัมน์ที่คำนวณไว้ล่วงหน้า (ชื่อสินค้าเรียงแบบไม่สนตัวพิมพ์เล็ก/ใหญ่)
+- ตัวกรองช่วงราคาและสถานะสต็อกเป็น Boolean Mask แล้วเลือกตามลำดับที่เรียงไว้ ได้ทั้ง product_id ของหน้าและจำนวนทั้งหมด (ตรงเสมอ)
+- models เรียก mark_dirty(product_id) หลัง commit การเขียนสินค้า/สต็อก Query ถัดไปจะอ่านเฉพาะสินค้าที่เปลี่ยนจากฐานข้อมูลมาแก้ Index
+- การเขียนจาก Worker อื่นหรือสคริปต์ถูกตรวจจาก catalog version ที่ใช้ร่วมกัน (ดู catalog_cache.load_shared_version)
+  ทุก CATALOG_INDEX_CHECK_INTERVAL วินาที ถ้าเปลี่ยนจะอ่านเฉพาะสินค้าที่ updated_at ใหม่กว่าที่เคยเห็น (ย้อนเผื่อ CATALOG_INDEX_DELTA_LAG)
+  มาแก้ Index และสร้างใหม่ทั้งหมดเมื่อมีสินค้าเพิ่ม/ลบ (จำนวนใน product_counters ไม่ตรง) หรือแถวที่เปลี่ยนมากเกิน CATALOG_INDEX_MAX_DELTA
+- การแก้ด้วย SQL ตรง ๆ ต้องตั้ง updated_at และเพิ่ม version ด้วย (เหมือนที่ models ทำ) ไม่งั้นจะเห็นเมื่อสร้างใหม่ทั้งหมดรอบถัดไป
+  (อย่างช้าทุก CATALOG_INDEX_REBUILD_INTERVAL วินาทีระหว่างที่มีการเปลี่ยนแปลง)
+- การค้นหาข้อความ (LIKE) ไม่ผ่าน Index นี้ (ใช้ SQL เหมือนเดิม)
+- NumPy เป็น Dependency เสริม ถ้าไม่ได้ติดตั้ง หรือตั้ง CATALOG_INDEX_ENABLED=0 ทุก Query จะใช้ SQL
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+import catalog_cache
+from database import get_connection
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CATALOG_INDEX_ENABLED = np is not None and os.environ.get('CATALOG_INDEX_ENABLED', '1') != '0'
+CATALOG_INDEX_CHECK_INTERVAL = float(os.environ.get('CATALOG_INDEX_CHECK_INTERVAL', 2))  # วินาที
+CATALOG_INDEX_REBUILD_INTERVAL = float(os.environ.get('CATALOG_INDEX_REBUILD_INTERVAL', 10 * 60))  # วินาที
+# updated_at ถูกกำหนดก่อน commit จึงย้อนอ่านเผื่อ Transaction ที่ commit ช้ากว่าเวลาที่บันทึก
+CATALOG_INDEX_DELTA_LAG = timedelta(seconds=float(os.environ.get('CATALOG_INDEX_DELTA_LAG', 5)))
+CATALOG_INDEX_MAX_DELTA = 1000
+
+SORT_COLUMNS = ("id", "name", "price", "stock", "created_at")
+STOCK_FILTERS = ("in_stock", "low_stock", "out_of_stock")
+LOW_STOCK_THRESHOLD = 10  # ตรงกับ PRODUCT_STOCK_FILTERS ใน models/product.py
+
+INDEX_SELECT = "SELECT product_id, name, price, stock_quantity, created_at, updated_at FROM products"
+COUNTERS_SELECT = "SELECT COALESCE(SUM(changes), 0) AS changes, COALESCE(SUM(total), 0) AS total FROM product_counters"
+
+
+def _cents(value):
+    return int(round(float(value) * 100))
+
+
+class CatalogIndex:
+    """ 📊 Index ที่สร้างแล้วไม่แก้ไข (การเปลี่ยนแปลงสร้าง Index ใหม่) จึงอ่านพร้อมกันจากหลาย Thread ได้โดยไม่ต้อง Lock """
+
+    def __init__(self, product_ids, prices, stocks, created_at, names, name_order=None):
+        self.product_ids = product_ids  # เรียงจากน้อยไปมาก (ใช้ searchsorted หาตำแหน่งได้)
+        self.prices = prices
+        self.stocks = stocks
+        self.created_at = created_at
+        self.names = names
+        if name_order is None:
+            name_order = np.array(sorted(range(len(names)), key=lambda i: names[i].casefold()), dtype=np.int64)
+        self._orders = {
+            "id": np.arange(len(names)),
+            "name": name_order,
+            "price": np.argsort(prices, kind="stable"),
+            "stock": np.argsort(stocks, kind="stable"),
+            "created_at": np.argsort(created_at, kind="stable"),
+        }
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = sorted(rows, key=lambda row: row['product_id'])
+        return cls(
+            np.array([row['product_id'] for row in rows], dtype=np.int64),
+            np.array([_cents(row['price']) for row in rows], dtype=np.int64),
+            np.array([row['stock_quantity'] for row in rows], dtype=np.int64),
+            np.array([row['created_at'] for row in rows], dtype="datetime64[us]"),
+            [row['name'] for row in rows]
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def positions(self, product_ids):
+        """ ตำแหน่งของ product_ids ใน Index หรือ None ถ้ามีบางตัวไม่อยู่ใน Index """
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        positions = np.searchsorted(self.product_ids, product_ids)
+        if np.any(positions >= len(self)) or np.any(self.product_ids[np.minimum(positions, len(self) - 1)] != product_ids):
+            return None
+        return positions
+
+    def updated(self, rows):
+        """ Index ใหม่ที่แก้เฉพาะแถวที่เปลี่ยน (ทุกแถวต้องมีอยู่ใน Index แล้ว) คืน None ถ้าต้องสร้างใหม่ทั้งหมด """
+        if not rows:
+            return self
+        positions = self.positions([row['product_id'] for row in rows]) if len(self) else None
+        if positions is None:
+            return None
+
+        prices, stocks, created_at = self.prices.copy(), self.stocks.copy(), self.created_at.copy()
+        names = list(self.names)
+        for position, row in zip(positions, rows):
+            prices[position] = _cents(row['price'])
+            stocks[position] = row['stock_quantity']
+            created_at[position] = np.datetime64(row['created_at'], "us")
+            names[position] = row['name']
+        # เปลี่ยนแค่ราคา/สต็อก (เช่น จาก Order) ไม่ต้องเรียงชื่อใหม่
+        name_order = self._orders["name"] if names == self.names else None
+        return CatalogIndex(self.product_ids, prices, stocks, created_at, names, name_order)
+
+    def query(self, min_price=None, max_price=None, stock_status=None, sort=None, reverse=False, page=1, per_page=10):
+        """ 🔎 คืนค่า (product_ids ของหน้านี้, จำนวนทั้งหมดที่ตรงตัวกรอง) เรียงเหมือน search_products ใน models/product.py
+        (ค่าเริ่มต้นคือ created_at จากใหม่ไปเก่า reverse=True คือจากน้อยไปมาก)
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if min_price is not None:
+            mask &= self.prices >= _cents(min_price)
+        if max_price is not None:
+            mask &= self.prices <= _cents(max_price)
+        if stock_status == "in_stock":
+            mask &= self.stocks > 0
+        elif stock_status == "low_stock":
+            mask &= (self.stocks > 0) & (self.stocks < LOW_STOCK_THRESHOLD)
+        elif stock_status == "out_of_stock":
+            mask &= self.stocks == 0
+
+        order = self._orders.get(sort) if sort in SORT_COLUMNS else self._orders["created_at"]
+        if not reverse:
+            order = order[::-1]
+        selected = order[mask[order]]
+        start = (page - 1) * per_page
+        return self.product_ids[selected[start:start + per_page]].tolist(), int(selected.size)
+
+
+_index = None
+_built_version = None  # catalog version ที่ใช้ร่วมกัน ณ ข้อมูลล่าสุดที่ Index เห็น
+_watermark = None  # updated_at ล่าสุดที่ Index เห็น
+_built_at = float("-inf")
+_checked_at = float("-inf")
+_dirty = set()
+_lock = threading.Lock()  # สร้าง/แก้ Index ทีละ Thread
+_dirty_lock = threading.Lock()  # แยกจาก _lock เพื่อให้ผู้เขียนไม่ต้องรอการอ่านฐานข้อมูลของ Index
+_metrics = {"builds": 0, "refreshes": 0, "delta_refreshes": 0, "refreshed_products": 0, "queries": 0, "last_build_seconds": None}
+
+
+def mark_dirty(*product_ids):
+    """ 🔖 บอกว่าสินค้าเหล่านี้เปลี่ยน (เรียกหลัง commit) Index จะอ่านแถวใหม่ก่อนตอบ Query ถัดไป """
+    if CATALOG_INDEX_ENABLED:
+        with _dirty_lock:
+            _dirty.update(product_ids)
+
+
+def _take_dirty():
+    with _dirty_lock:
+        changed = list(_dirty)
+        _dirty.clear()
+    return changed
+
+
+def _load_rows(product_ids=None, updated_since=None):
+    """ คืนค่า (counters, rows): catalog version/จำนวนสินค้าจาก product_counters และแถวสินค้า
+    อ่านใน Transaction เดียวกัน (Snapshot เดียวกัน) version จึงตรงกับแถวที่อ่านได้
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(COUNTERS_SELECT)
+            counters = cursor.fetchone()
+            if product_ids is not None:
+                placeholders = ', '.join(['%s'] * len(product_ids))
+                cursor.execute(f"{INDEX_SELECT} WHERE product_id IN ({placeholders})", list(product_ids))
+            elif updated_since is not None:
+                cursor.execute(f"{INDEX_SELECT} WHERE updated_at >= %s", (updated_since,))
+            else:
+                cursor.execute(INDEX_SELECT)
+            return counters, cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _max_updated_at(rows, current=None):
+    values = [row['updated_at'] for row in rows if row.get('updated_at') is not None]
+    if current is not None:
+        values.append(current)
+    return max(values, default=None)
+
+
+def _check_due():
+    return time.monotonic() - _checked_at >= CATALOG_INDEX_CHECK_INTERVAL
+
+
+def _refresh(changed, shared_changed):
+    """ Index ที่แก้เฉพาะสินค้าที่เปลี่ยน หรือ None ถ้าต้องสร้างใหม่ทั้งหมด (สินค้าเพิ่ม/ลบ หรือเปลี่ยนมากเกินไป) """
+    global _built_version, _watermark
+    index = _index
+    if changed:
+        _, rows = _load_rows(product_ids=changed)
+        # สินค้าที่เพิ่ม/ลบ (แถวไม่ตรงกับที่มีใน Index) สร้างใหม่ทั้งหมด ซึ่งเกิดไม่บ่อยเท่าการแก้ราคา/สต็อก
+        index = index.updated(rows) if len(rows) == len(changed) else None
+        if index is None:
+            return None
+        _metrics["refreshes"] += 1
+        _metrics["refreshed_products"] += len(rows)
+
+    if shared_changed:
+        if _watermark is None:
+            return None
+        counters, rows = _load_rows(updated_since=_watermark - CATALOG_INDEX_DELTA_LAG)
+        if len(rows) > CATALOG_INDEX_MAX_DELTA or int(counters['total']) != len(index):
+            return None
+        index = index.updated(rows)
+        if index is None:
+            return None
+        _built_version = int(counters['changes'])
+        _watermark = _max_updated_at(rows, _watermark)
+        _metrics["delta_refreshes"] += 1
+        _metrics["refreshed_products"] += len(rows)
+    return index
+
+
+def get_index():
+    """ 📊 Index ปัจจุบัน (สร้างครั้งแรกจากสินค้าทั้งหมด แล้วแก้เฉพาะสินค้าที่ถูก mark_dirty
+    หรือที่ updated_at เปลี่ยนเมื่อ catalog version ที่ใช้ร่วมกันเปลี่ยน) หรือ None ถ้าปิดใช้งาน
+    """
+    global _index, _built_version, _watermark, _built_at, _checked_at
+    if not CATALOG_INDEX_ENABLED:
+        return None
+
+    if _index is not None and not _dirty and not _check_due():
+        return _index
+
+    with _lock:
+        started = time.monotonic()
+        shared_changed = False
+        if _index is not None and _check_due():
+            _checked_at = time.monotonic()
+            shared_changed = catalog_cache.load_shared_version() != _built_version
+
+        changed = _take_dirty()
+        if _index is not None and not changed and not shared_changed:
+            return _index  # Thread อื่นแก้ให้แล้วระหว่างรอ Lock
+
+        updated = None
+        if _index is not None and time.monotonic() - _built_at < CATALOG_INDEX_REBUILD_INTERVAL:
+            updated = _refresh(changed, shared_changed)
+        if updated is not None:
+            _index = updated
+        else:
+            counters, rows = _load_rows()
+            _index = CatalogIndex.from_rows(rows)
+            _built_version = int(counters['changes'])
+            _watermark = _max_updated_at(rows)
+            _built_at = _checked_at = time.monotonic()
+            _metrics["builds"] += 1
+        _metrics["last_build_seconds"] = round(time.monotonic() - started, 4)
+        return _index
+
+
+def query(*args, **kwargs):
+    """ 🔎 CatalogIndex.query บน Index ล่าสุด หรือ None ถ้าปิดใช้งาน (ให้ผู้เรียกใช้ SQL แทน) """
+    index = get_index()
+    if index is None:
+        return None
+    _metrics["queries"] += 1
+    return index.query(*args, **kwargs)
+
+
+def stats():
+    index = _index
+    return {"enabled": CATALOG_INDEX_ENABLED, "products": len(index) if index is not None else 0, **_metrics}
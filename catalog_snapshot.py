@@ -0,0 +1,301 @@
+# catalog_snapshot.py
+"""
+🗂️ Snapshot ของรายการสินค้า (สินค้า + URL รูปหลัก) เป็นไฟล์ไบนารีที่ทุก Worker บนเครื่องเดียวกันใช้ร่วมกันผ่าน mmap
+
+- รูปแบบไฟล์: Header | Record ขนาดคงที่เรียงตาม product_id | String Heap (ชื่อสินค้าและ URL รูปหลักแบบ UTF-8)
+- Worker อ่านด้วย mmap: หน้าไฟล์อยู่ใน Page Cache ของระบบชุดเดียว หน่วยความจำต่อเครื่องจึงไม่เพิ่มตามจำนวน Worker
+- การสร้างใหม่เขียนไฟล์ชั่วคราวแล้ว os.replace ทับ (Atomic) ภายใต้ flock ให้สร้างได้ทีละ Worker
+  Worker ที่อ่านอยู่เห็นไฟล์เดิมจนกว่าจะตรวจพบไฟล์ใหม่ (ทุก CATALOG_SNAPSHOT_CHECK_INTERVAL วินาที) แล้วสลับไปใช้โดยไม่ต้อง Restart
+- รันตามรอบภายในแอป (ดู lifespan ใน main.py) หรือสั่งสร้างเองได้:
+
+    python catalog_snapshot.py
+"""
+import argparse
+import asyncio
+import bisect
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from fastapi.concurrency import run_in_threadpool
+from cache import worker_round
+from database import get_connection
+
+CATALOG_SNAPSHOT_PATH = os.environ.get('CATALOG_SNAPSHOT_PATH', os.path.join(tempfile.gettempdir(), "catalog.snapshot"))
+CATALOG_SNAPSHOT_INTERVAL = int(os.environ.get('CATALOG_SNAPSHOT_INTERVAL', 60))  # วินาที
+CATALOG_SNAPSHOT_CHECK_INTERVAL = float(os.environ.get('CATALOG_SNAPSHOT_CHECK_INTERVAL', 5))  # วินาที
+
+MAGIC = b"CSNP"
+FORMAT_VERSION = 1
+# magic, format, (สำรอง), snapshot version, เวลาที่สร้าง, จำนวนสินค้า
+HEADER = struct.Struct("<4sHHQdI")
+# product_id, ราคา (สตางค์), สต็อก, created_at (วินาที), products.version, primary_image_id (0 = ไม่มี),
+# ตำแหน่ง/ความยาวของชื่อ และตำแหน่ง/ความยาวของ URL รูปหลักใน String Heap
+RECORD = struct.Struct("<IqiqIIIIII")
+
+STOCK_PREDICATES = {
+    "in_stock": lambda stock: stock > 0,
+    "low_stock": lambda stock: 0 < stock < 10,
+    "out_of_stock": lambda stock: stock == 0,
+}
+MAX_SUMMARIES_PER_PAGE = 100
+
+# 📊 สถิติสะสมใน Process นี้ (แสดงที่ /admin/metrics)
+_metrics = {"builds": 0, "skipped": 0, "swaps": 0, "last_build_seconds": None}
+_metrics_lock = threading.Lock()
+
+
+def _to_epoch(value: datetime):
+    return int(value.replace(tzinfo=timezone.utc).timestamp()) if value else 0
+
+
+def _from_epoch(value: int):
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+
+def write_snapshot(rows, path: str, version: int):
+    """ 💾 เขียน rows (เรียงตาม product_id) เป็นไฟล์ Snapshot แล้วแทนที่ไฟล์เดิมแบบ Atomic คืนขนาดไฟล์ """
+    records = bytearray()
+    heap = bytearray()
+
+    def add_string(value):
+        data = (value or "").encode("utf-8")
+        offset = len(heap)
+        heap.extend(data)
+        return offset, len(data)
+
+    for row in rows:
+        name_offset, name_length = add_string(row['name'])
+        url_offset, url_length = add_string(row.get('primary_image_url'))
+        records.extend(RECORD.pack(
+            row['product_id'],
+            int(Decimal(row['price']) * 100),
+            row['stock_quantity'],
+            _to_epoch(row['created_at']),
+            row.get('version') or 0,
+            row.get('primary_image_id') or 0,
+            name_offset, name_length, url_offset, url_length
+        ))
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, version, time.time(), len(rows))
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(records)
+            f.write(heap)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return len(header) + len(records) + len(heap)
+
+
+def load_snapshot_rows():
+    """ 🔍 สินค้าทั้งหมดพร้อม URL รูปหลัก เรียงตาม product_id """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT p.product_id, p.name, p.price, p.stock_quantity, p.created_at, p.version,
+                       p.primary_image_id, pi.image_url AS primary_image_url
+                FROM products p
+                LEFT JOIN product_images pi ON pi.image_id = p.primary_image_id
+                ORDER BY p.product_id
+            """)
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+class CatalogSnapshot:
+    """ 🗂️ Snapshot ที่เปิดด้วย mmap (อ่านอย่างเดียว) ค้นหาด้วย product_id แบบ Binary Search โดยไม่อ่านทั้งไฟล์ """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            stat_result = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, file_format, _, self.version, self.built_at, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or file_format != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"Unsupported catalog snapshot: {path}")
+        self.identity = (stat_result.st_ino, stat_result.st_mtime_ns)
+        self.size = stat_result.st_size
+        self._heap_start = HEADER.size + self.count * RECORD.size
+        self._ids = _ProductIds(self)
+
+    def __len__(self):
+        return self.count
+
+    def _record(self, index: int):
+        return RECORD.unpack_from(self._mm, HEADER.size + index * RECORD.size)
+
+    def _string(self, offset: int, length: int):
+        start = self._heap_start + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def _summary(self, record):
+        product_id, price, stock, created_at, version, primary_image_id, name_offset, name_length, url_offset, url_length = record
+        return {
+            "product_id": product_id,
+            "name": self._string(name_offset, name_length),
+            "price": Decimal(price) / 100,
+            "stock_quantity": stock,
+            "created_at": _from_epoch(created_at),
+            "version": version,
+            "primary_image_id": primary_image_id or None,
+            "primary_image_url": self._string(url_offset, url_length) if url_length else None,
+        }
+
+    def get(self, product_id: int):
+        """ 🔍 ข้อมูลสรุปของสินค้าหรือ None ถ้าไม่มีใน Snapshot """
+        index = bisect.bisect_left(self._ids, product_id)
+        if index < self.count and self._ids[index] == product_id:
+            return self._summary(self._record(index))
+        return None
+
+    def search(self, min_price=None, max_price=None, stock_status=None, after_id: int = 0, limit: int = 20):
+        """ 📋 สินค้าที่ตรงตัวกรอง เรียงตาม product_id ต่อจาก after_id (ถอดรหัสเฉพาะสตริงของแถวที่ตอบกลับ) """
+        min_cents = int(Decimal(str(min_price)) * 100) if min_price is not None else None
+        max_cents = int(Decimal(str(max_price)) * 100) if max_price is not None else None
+        stock_predicate = STOCK_PREDICATES.get(stock_status)
+
+        results = []
+        for index in range(bisect.bisect_right(self._ids, after_id), self.count):
+            record = self._record(index)
+            price, stock = record[1], record[2]
+            if min_cents is not None and price < min_cents:
+                continue
+            if max_cents is not None and price > max_cents:
+                continue
+            if stock_predicate and not stock_predicate(stock):
+                continue
+            results.append(self._summary(record))
+            if len(results) >= limit:
+                break
+        return results
+
+
+class _ProductIds:
+    """ มุมมองลำดับของ product_id ใน Snapshot (ใช้กับ bisect โดยไม่ต้องสร้าง list) """
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self._snapshot = snapshot
+
+    def __len__(self):
+        return self._snapshot.count
+
+    def __getitem__(self, index: int):
+        return struct.unpack_from("<I", self._snapshot._mm, HEADER.size + index * RECORD.size)[0]
+
+
+def _read_version(path: str):
+    try:
+        with open(path, "rb") as f:
+            magic, file_format, _, version, _, _ = HEADER.unpack(f.read(HEADER.size))
+        return version if magic == MAGIC else 0
+    except (OSError, struct.error):
+        return 0
+
+
+def build_snapshot(path: str = CATALOG_SNAPSHOT_PATH, min_age: float = 0):
+    """ 🏗️ สร้าง Snapshot ใหม่จากฐานข้อมูล (Worker อื่นที่กำลังสร้างอยู่ หรือไฟล์ใหม่กว่า min_age วินาที จะข้ามไป)
+    คืนค่า {"version", "products", "bytes"} หรือ None ถ้าข้าม
+    """
+    with worker_round(f"{path}.lock", min_age, done_path=path) as leader:
+        if not leader:
+            with _metrics_lock:
+                _metrics["skipped"] += 1
+            return None
+
+        started = time.monotonic()
+        rows = load_snapshot_rows()
+        version = _read_version(path) + 1
+        size = write_snapshot(rows, path, version)
+
+    with _metrics_lock:
+        _metrics["builds"] += 1
+        _metrics["last_build_seconds"] = round(time.monotonic() - started, 3)
+    return {"version": version, "products": len(rows), "bytes": size}
+
+
+_current = None
+_checked_at = 0.0
+_swap_lock = threading.Lock()
+
+
+def get_snapshot(path: str = CATALOG_SNAPSHOT_PATH):
+    """ 🗂️ Snapshot ล่าสุดที่ Worker นี้เปิดไว้ (ตรวจหาไฟล์ใหม่อย่างมากทุก CATALOG_SNAPSHOT_CHECK_INTERVAL วินาที)
+    คืน None ถ้ายังไม่เคยสร้าง Snapshot
+    """
+    global _current, _checked_at
+    now = time.monotonic()
+    if _current is not None and now - _checked_at < CATALOG_SNAPSHOT_CHECK_INTERVAL:
+        return _current
+
+    with _swap_lock:
+        _checked_at = now
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            return _current
+        if _current is None or _current.identity != (stat_result.st_ino, stat_result.st_mtime_ns):
+            try:
+                snapshot = CatalogSnapshot(path)
+            except (OSError, ValueError, struct.error) as e:
+                print(f"Error opening catalog snapshot: {str(e)}")
+                return _current
+            # mmap เดิมถูกปิดเมื่อ Request ที่ยังอ่านอยู่ปล่อยอ้างอิงหมด
+            _current = snapshot
+            with _metrics_lock:
+                _metrics["swaps"] += 1
+        return _current
+
+
+def stats():
+    """ 📊 Snapshot ที่ใช้อยู่และสถิติสะสมของ Process นี้ """
+    snapshot = _current
+    with _metrics_lock:
+        result = dict(_metrics)
+    result.update({
+        "path": CATALOG_SNAPSHOT_PATH,
+        "version": snapshot.version if snapshot else None,
+        "products": len(snapshot) if snapshot else 0,
+        "bytes": snapshot.size if snapshot else 0,
+    })
+    return result
+
+
+async def run_periodically(interval: int = CATALOG_SNAPSHOT_INTERVAL):
+    """ ⏰ สร้าง Snapshot ใหม่ทุก interval วินาที (ทุก Worker รัน แต่ flock และอายุไฟล์ทำให้สร้างครั้งเดียวต่อรอบต่อเครื่อง) """
+    while True:
+        try:
+            await run_in_threadpool(build_snapshot, CATALOG_SNAPSHOT_PATH, interval)
+        except Exception as e:
+            print(f"Error building catalog snapshot: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the shared memory-mapped catalog snapshot")
+    parser.add_argument("--path", default=CATALOG_SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    result = build_snapshot(args.path)
+    if result is None:
+        print("🗂️ Another process is building the snapshot, skipped")
+    else:
+        print(f"🗂️ Wrote snapshot v{result['version']} with {result['products']} products ({result['bytes']} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# file_uploads.py
+"""
+📤 รับไฟล์รูปภาพที่อัปโหลดแบบ Streaming รอบเดียว
+
+อ่านไฟล์ทีละ Chunk แล้วเขียนลงไฟล์ชั่วคราว พร้อมนับขนาดและคำนวณ SHA-256 ไปในรอบเดียวกัน
+ไฟล์ถูกตั้งชื่อตาม SHA-256 ของเนื้อหา (ไฟล์ที่เหมือนกันเก็บเพียงชุดเดียว และได้ URL เดียวกัน)
+และเก็บแยกโฟลเดอร์ย่อย 2 ชั้นตาม Hash (ab/cd/<ชื่อไฟล์>) เพื่อไม่ให้มีไฟล์นับแสนอยู่ในโฟลเดอร์เดียว
+ใช้หน่วยความจำคงที่ไม่ว่าไฟล์จะใหญ่แค่ไหน หยุดทันทีที่เกิน MAX_FILE_SIZE
+และตรวจชนิดไฟล์จาก Magic Bytes (ไม่เชื่อนามสกุลหรือ Content-Type ที่ Client ส่งมา)
+งาน I/O ทั้งหมดรันใน Threadpool ไม่บล็อก Event Loop
+"""
+import asyncio
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+import uuid
+from fastapi import UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+MAX_BATCH_FILES = 50
+CHUNK_SIZE = 64 * 1024
+SIGNATURE_LENGTH = 12
+
+
+def shard_subdir(filename: str):
+    """ 📁 โฟลเดอร์ย่อย 2 ชั้น (ab/cd) ของไฟล์ ใช้ Hex ต้นชื่อไฟล์ (SHA-256 / UUID) ถ้าไม่ใช่ Hex ใช้ MD5 ของชื่อแทน
+    รูปย่อย <stem>_<variant>.<ext> อยู่โฟลเดอร์เดียวกับ <stem> เสมอ
+    """
+    base = re.split(r"[._]", os.path.basename(filename), maxsplit=1)[0].lower()
+    key = base if re.match(r"^[0-9a-f]{4}", base) else hashlib.md5(base.encode("utf-8")).hexdigest()
+    return f"{key[:2]}/{key[2:4]}"
+
+
+def sharded_path(path: str):
+    """ 🔀 แปลง Path บนดิสก์แบบแบน (dir/name) เป็นแบบแบ่งโฟลเดอร์ (dir/ab/cd/name) """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, *shard_subdir(name).split("/"), name)
+
+
+def sharded_url(url: str):
+    """ 🔀 แปลง URL แบบแบน (/uploads/products/name) เป็น /uploads/products/ab/cd/name """
+    directory, name = posixpath.split(url)
+    return posixpath.join(directory, shard_subdir(name), name)
+
+
+class UploadError(ValueError):
+    """ ⚠️ ไฟล์อัปโหลดไม่ผ่านการตรวจสอบ (status_code บอกว่า Router ควรตอบกลับด้วย Status ไหน) """
+    def __init__(self, message: str, status_code: int = status.HTTP_400_BAD_REQUEST):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def detect_image_type(header: bytes):
+    """ 🔍 ตรวจชนิดรูปจาก Magic Bytes คืนค่า (นามสกุล, content type) หรือ None ถ้าไม่รองรับ """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpg", "image/jpeg"
+    if header.startswith(b"\x89PNG"):
+        return "png", "image/png"
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return "gif", "image/gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp", "image/webp"
+    return None
+
+
+def stream_to_disk(source, dest_dir: str, max_size: int = MAX_FILE_SIZE, content_addressed: bool = True):
+    """ 💾 คัดลอกไฟล์จาก source (file object) ไปยัง dest_dir แบบรอบเดียว (ฟังก์ชันแบบ Blocking)
+    content_addressed=True ตั้งชื่อไฟล์เป็น <sha256>.<ext> ในโฟลเดอร์ย่อย ab/cd ไฟล์เนื้อหาเดียวกันจึงถูกเก็บไว้ไฟล์เดียว
+    คืนค่า dict: filename, relative_path (ใช้ต่อท้าย URL), path, file_size, file_type, extension, sha256
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    hasher = hashlib.sha256()
+    file_size = 0
+    header = b""
+    detected = None
+
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while chunk := source.read(CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise UploadError(
+                        f"File size exceeds the limit of {max_size / (1024 * 1024)}MB",
+                        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                    )
+
+                # ตรวจ Magic Bytes ทันทีที่อ่านได้ครบ ไม่ต้องรอให้อ่านทั้งไฟล์
+                if detected is None:
+                    header += chunk[:SIGNATURE_LENGTH - len(header)]
+                    if len(header) >= SIGNATURE_LENGTH:
+                        detected = detect_image_type(header)
+                        if detected is None:
+                            raise UploadError("Invalid file type. Only JPEG, PNG, GIF, and WEBP are allowed.")
+
+                hasher.update(chunk)
+                tmp.write(chunk)
+
+        # ไฟล์ที่เล็กกว่า SIGNATURE_LENGTH (หรือไฟล์ว่าง) ตรวจตอนจบ
+        if detected is None:
+            detected = detect_image_type(header)
+            if detected is None:
+                raise UploadError("Invalid file type. Only JPEG, PNG, GIF, and WEBP are allowed.")
+
+        extension, file_type = detected
+        sha256 = hasher.hexdigest()
+        if content_addressed:
+            filename = f"{sha256}.{extension}"
+            relative_path = f"{shard_subdir(filename)}/{filename}"
+        else:
+            filename = relative_path = f"{uuid.uuid4()}.{extension}"
+        path = os.path.join(dest_dir, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 🔁 เนื้อหาซ้ำกับไฟล์ที่มีอยู่แล้วก็เขียนทับ (เนื้อหาเดียวกัน) เพื่อให้ไฟล์มีอยู่แน่นอนและ mtime ใหม่
+        # Janitor ที่ลบไฟล์ของ Blob ที่ไม่มีรูปอ้างถึงจะเห็นว่าไฟล์ถูกใช้ใหม่ (ดู image_processing.delete_released_blob_files)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return {
+        "filename": filename,
+        "relative_path": relative_path,
+        "path": path,
+        "file_size": file_size,
+        "file_type": file_type,
+        "extension": extension,
+        "sha256": sha256,
+    }
+
+
+def promote_file(path: str, dest_dir: str):
+    """ 📦 ย้ายไฟล์ที่ตรวจสอบแล้ว (เช่น รูปชั่วคราวตอนสร้างสินค้า) ไปเก็บแบบ Content-addressed ใน dest_dir """
+    with open(path, "rb") as source:
+        saved = stream_to_disk(source, dest_dir)
+    os.remove(path)
+    return saved
+
+
+async def save_upload(file: UploadFile, dest_dir: str, max_size: int = MAX_FILE_SIZE, content_addressed: bool = True):
+    """ 📤 บันทึก UploadFile ลง dest_dir (รันใน Threadpool) ดูค่าที่คืนได้ที่ stream_to_disk """
+    # Starlette รู้ขนาดไฟล์แล้วหลัง parse multipart ถ้าเกินก็ปฏิเสธได้เลยโดยไม่ต้องคัดลอก
+    if file.size is not None and file.size > max_size:
+        raise UploadError(
+            f"File size exceeds the limit of {max_size / (1024 * 1024)}MB",
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    return await run_in_threadpool(stream_to_disk, file.file, dest_dir, max_size, content_addressed)
+
+
+async def save_uploads(files: list, dest_dir: str, max_size: int = MAX_FILE_SIZE, content_addressed: bool = True):
+    """ 📤 บันทึกหลายไฟล์พร้อมกัน (ตรวจสอบและเขียนแต่ละไฟล์ขนานกันใน Threadpool)
+    คืนค่า (saved, errors): saved เรียงตามลำดับไฟล์ที่ส่งมา errors เป็น list ของ {"filename", "detail"}
+    ไฟล์ที่ไม่ผ่านการตรวจสอบไม่ทำให้ไฟล์อื่นล้มเหลว
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise UploadError(f"Too many files. At most {MAX_BATCH_FILES} files can be uploaded at once.")
+
+    results = await asyncio.gather(
+        *(save_upload(file, dest_dir, max_size, content_addressed) for file in files),
+        return_exceptions=True
+    )
+
+    saved = []
+    errors = []
+    for file, result in zip(files, results):
+        if isinstance(result, UploadError):
+            errors.append({"filename": file.filename, "detail": str(result)})
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            saved.append(result)
+    return saved, errors
@@ -0,0 +1,323 @@
+# image_processing.py
+"""
+🖼️ สร้างรูปย่อย (Derivatives) ของรูปสินค้าด้วย Pillow
+
+งานย่อรูปใช้ CPU หนัก จึงรันใน Process Pool แยกจาก Event Loop และ Threadpool ของ API
+และถูกเรียกผ่าน BackgroundTasks หลังตอบ Response แล้ว (ไม่อยู่ใน Request Path)
+
+รูปขนาดอื่น ๆ ที่ Frontend ขอผ่าน /img/{image_id}?w= จะย่อจากต้นฉบับเมื่อถูกขอครั้งแรก
+แล้วเก็บไว้ใน Disk Cache ที่จำกัดขนาดรวม (LRU)
+
+รูปทุกขนาดถูกแปลงเป็น WebP (และ AVIF ถ้ารองรับ) ไว้ด้วย แล้วเลือกส่ง Format ที่เล็กที่สุด
+ที่ Client รองรับตาม Header Accept
+"""
+import asyncio
+import glob
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageOps
+from cache import DiskLRUCache, AsyncSingleFlight
+import file_uploads
+from models import product_image as image_model
+
+# ขนาดรูปย่อย (ด้านที่ยาวที่สุด เป็น pixel)
+DERIVATIVE_SIZES = {
+    "thumbnail": 128,
+    "medium": 480,
+    "large": 1024,
+}
+UPLOAD_DIR = "uploads/products"
+VARIANTS_DIR = os.path.join(UPLOAD_DIR, "variants")
+JPEG_QUALITY = 85
+
+# 📐 ความกว้างที่อนุญาตให้ขอแบบ On-demand (จำกัดไว้เพื่อไม่ให้ Cache ถูกอัดด้วยขนาดสุ่ม)
+RESIZE_WIDTHS = (64, 128, 240, 320, 480, 640, 768, 1024, 1280, 1600)
+RESIZE_FORMATS = {
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "png": ("PNG", "png", "image/png"),
+    "webp": ("WEBP", "webp", "image/webp"),
+}
+# 🗜️ Format สมัยใหม่ที่แปลงไฟล์ไว้ล่วงหน้า (เรียงจากที่ต้องการมากที่สุด) AVIF ใช้ได้เมื่อ Pillow build รองรับเท่านั้น
+Image.init()
+AVIF_SUPPORTED = "AVIF" in Image.SAVE
+if AVIF_SUPPORTED:
+    RESIZE_FORMATS["avif"] = ("AVIF", "avif", "image/avif")
+TRANSCODE_FORMATS = ["avif", "webp"] if AVIF_SUPPORTED else ["webp"]
+ORIGINAL_VARIANT = "original"
+# Format ของไฟล์อัปโหลดที่ทุก Client เปิดได้ ต้นฉบับแบบอื่น (WebP) จะมี "original" แบบ JPEG/PNG สร้างไว้ให้ด้วย
+FALLBACK_SOURCE_FORMATS = ("JPEG", "PNG", "GIF")
+# จำนวนแถวรูปย่อยต่อรูปเมื่อสร้างครบทุก Format (Format ตั้งต้น + Format สมัยใหม่ที่รวมขนาดเต็ม)
+EXPECTED_VARIANT_COUNT = len(DERIVATIVE_SIZES) * (1 + len(TRANSCODE_FORMATS)) + len(TRANSCODE_FORMATS)
+AVIF_QUALITY = 60
+
+RESIZE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', 'uploads/cache')
+RESIZE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # รวมทุก Worker
+RESIZE_CACHE_SCAN_INTERVAL = float(os.environ.get('IMAGE_CACHE_SCAN_INTERVAL', 60))  # วินาที
+
+resize_cache = DiskLRUCache(RESIZE_CACHE_DIR, RESIZE_CACHE_MAX_BYTES, RESIZE_CACHE_SCAN_INTERVAL)
+_resize_flight = AsyncSingleFlight()
+
+# ไฟล์ที่ไม่มีรูปไหนอ้างถึงแล้วถูกลบโดย Janitor หลังผ่านไปอย่างน้อยเท่านี้ (ต้องนานกว่าเวลาตั้งแต่บันทึกไฟล์จนถึงบันทึกรูปของการอัปโหลด)
+IMAGE_BLOB_RELEASE_GRACE = int(os.environ.get('IMAGE_BLOB_RELEASE_GRACE', 10 * 60))  # วินาที
+IMAGE_BLOB_PURGE_BATCH_SIZE = 100
+
+IMAGE_PROCESSING_WORKERS = int(os.environ.get('IMAGE_PROCESSING_WORKERS', os.cpu_count() or 1))
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_PROCESSING_WORKERS)
+    return _pool
+
+
+def url_to_path(image_url: str):
+    """ 🔗 แปลง URL ของรูป (/uploads/...) เป็น Path บนดิสก์
+    URL แบบแบนเดิมที่ไฟล์ถูกย้ายไปโฟลเดอร์ ab/cd แล้ว (ระหว่าง Migration) จะได้ Path ใหม่
+    """
+    path = os.path.join(".", image_url.lstrip("/"))
+    if not os.path.exists(path):
+        moved_path = file_uploads.sharded_path(path)
+        if os.path.exists(moved_path):
+            return moved_path
+    return path
+
+
+def path_to_url(path: str):
+    """ 🔗 แปลง Path บนดิสก์ (uploads/...) เป็น URL """
+    return "/" + os.path.relpath(path, ".").replace(os.sep, "/")
+
+
+def _output_format(image: Image.Image):
+    """ รูปที่มีพื้นโปร่งใสเก็บเป็น PNG นอกนั้นเก็บเป็น JPEG """
+    return RESIZE_FORMATS["png"] if _has_alpha(image) else RESIZE_FORMATS["jpeg"]
+
+
+def _has_alpha(image: Image.Image):
+    return image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def _prepare(image: Image.Image, pil_format: str):
+    """ แปลง Mode ของรูปให้บันทึกเป็น Format ปลายทางได้ (JPEG ไม่รองรับพื้นโปร่งใส) """
+    if pil_format == "JPEG":
+        return image if image.mode == "RGB" else image.convert("RGB")
+    if image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGBA" if _has_alpha(image) else "RGB")
+    return image
+
+
+def _save(image: Image.Image, dest_path: str, pil_format: str):
+    """ บันทึกลงไฟล์ .tmp ก่อนแล้วค่อย rename (ผู้อ่านจะไม่เห็นไฟล์ที่เขียนไม่เสร็จ) """
+    tmp_path = f"{dest_path}.tmp"
+    if pil_format == "JPEG":
+        image.save(tmp_path, pil_format, quality=JPEG_QUALITY, optimize=True, progressive=True)
+    elif pil_format == "WEBP":
+        image.save(tmp_path, pil_format, quality=JPEG_QUALITY, method=4)
+    elif pil_format == "AVIF":
+        image.save(tmp_path, pil_format, quality=AVIF_QUALITY)
+    else:
+        image.save(tmp_path, pil_format, optimize=True)
+    os.replace(tmp_path, dest_path)
+
+
+def variant_tag(size, pil_format: str):
+    """ 🏷️ Hash สั้น ๆ ของค่าที่ใช้สร้างรูปย่อย (ขนาด Format และคุณภาพ) สำหรับใส่ในชื่อไฟล์
+    เปลี่ยนค่าเหล่านี้แล้วรูปย่อยที่สร้างใหม่จะได้ชื่อ (URL) ใหม่ ไฟล์เดิมที่ Cache แบบ immutable ไว้จึงไม่ถูกเขียนทับ
+    """
+    params = f"{size}:{pil_format}:{JPEG_QUALITY}:{AVIF_QUALITY}"
+    return hashlib.sha256(params.encode("utf-8")).hexdigest()[:8]
+
+
+def generate_derivatives(source_path: str, dest_dir: str = VARIANTS_DIR, fmt: str = None):
+    """ 🏭 สร้างรูปย่อยทุกขนาดจากไฟล์ต้นฉบับ (รันใน Process Pool)
+    ไฟล์ผลลัพธ์ชื่อ <ชื่อไฟล์ต้นฉบับ>_<variant>-<variant_tag>.<ext> ในโฟลเดอร์ย่อย ab/cd คืนค่า list ของข้อมูลรูปย่อยแต่ละขนาด
+    ถ้าระบุ fmt (เช่น "webp") จะแปลงเป็น Format นั้น รวมถึงรูปขนาดเต็ม (variant "original") ด้วย
+    ถ้าไม่ระบุและต้นฉบับเป็น WebP จะสร้าง "original" แบบ JPEG/PNG ด้วย ให้ Client ที่ไม่รองรับ WebP มีรูปขนาดเต็มที่เปิดได้
+    """
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    dest_dir = os.path.join(dest_dir, *file_uploads.shard_subdir(stem).split("/"))
+    os.makedirs(dest_dir, exist_ok=True)
+    derivatives = []
+
+    with Image.open(source_path) as original:
+        # หมุนรูปตาม EXIF (รูปจากมือถือ) ก่อนย่อ
+        image = ImageOps.exif_transpose(original)
+        if fmt is None:
+            pil_format, ext, content_type = _output_format(image)
+            sizes = DERIVATIVE_SIZES
+            if original.format not in FALLBACK_SOURCE_FORMATS:
+                sizes = {**DERIVATIVE_SIZES, ORIGINAL_VARIANT: None}
+        else:
+            pil_format, ext, content_type = RESIZE_FORMATS[fmt]
+            sizes = {**DERIVATIVE_SIZES, ORIGINAL_VARIANT: None}
+        image = _prepare(image, pil_format)
+
+        for variant, size in sizes.items():
+            resized = image.copy()
+            if size:
+                # thumbnail() ย่อโดยรักษาสัดส่วน และไม่ขยายรูปที่เล็กกว่าขนาดที่กำหนด
+                resized.thumbnail((size, size), Image.LANCZOS)
+
+            dest_path = os.path.join(dest_dir, f"{stem}_{variant}-{variant_tag(size, pil_format)}.{ext}")
+            _save(resized, dest_path, pil_format)
+
+            derivatives.append({
+                "variant": variant,
+                "image_url": path_to_url(dest_path),
+                "width": resized.width,
+                "height": resized.height,
+                "file_size": os.path.getsize(dest_path),
+                "file_type": content_type,
+            })
+
+    return derivatives
+
+
+def negotiate_format(accept: str, available: list):
+    """ 🤝 เลือกชนิดไฟล์แรกใน available (เรียงตามลำดับที่ต้องการ) ที่ Client ระบุไว้ใน Header Accept
+    นับเฉพาะชนิดที่ระบุตรง ๆ เพราะ image/* หรือ */* ไม่ได้รับประกันว่ารองรับ WebP/AVIF คืน None ถ้าไม่มี
+    """
+    accepted = {}
+    for part in (accept or "").split(","):
+        media_type, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.strip().lower()] = quality
+
+    for content_type in available:
+        if accepted.get(content_type, 0.0) > 0:
+            return content_type
+    return None
+
+
+def resize_image(source_path: str, dest_path: str, width: int, pil_format: str):
+    """ 📐 ย่อรูปต้นฉบับให้กว้างไม่เกิน width โดยรักษาสัดส่วน (รันใน Process Pool) """
+    with Image.open(source_path) as original:
+        image = _prepare(ImageOps.exif_transpose(original), pil_format)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        _save(image, dest_path, pil_format)
+
+
+def default_resize_format(file_type: str):
+    """ Format เริ่มต้นเมื่อไม่ระบุ fmt และ Client ไม่รองรับ Format สมัยใหม่: ใช้ตามชนิดของไฟล์ต้นฉบับ
+    (GIF ย่อแล้วเก็บเป็น PNG ส่วน WebP ที่ Client เปิดไม่ได้เก็บเป็น PNG เพื่อรักษาพื้นโปร่งใส)
+    """
+    return {"image/png": "png", "image/gif": "png", "image/webp": "png"}.get(file_type, "jpeg")
+
+
+def negotiate_resize_format(accept: str, file_type: str):
+    """ เลือก fmt สำหรับ /img/{image_id}?w= เมื่อ Client ไม่ได้ระบุ: ใช้ Format สมัยใหม่ถ้ารองรับ ไม่งั้นใช้ตามต้นฉบับ """
+    content_type = negotiate_format(accept, [RESIZE_FORMATS[fmt][2] for fmt in TRANSCODE_FORMATS])
+    for fmt in TRANSCODE_FORMATS:
+        if RESIZE_FORMATS[fmt][2] == content_type:
+            return fmt
+    return default_resize_format(file_type)
+
+
+def _resized_name(image_url: str, width: int, ext: str):
+    stem = os.path.splitext(os.path.basename(image_url))[0]
+    return f"{stem}_w{width}.{ext}"
+
+
+async def _render_resized(source_path: str, name: str, width: int, pil_format: str):
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(source_path)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_get_pool(), resize_image, source_path, resize_cache.path(name), width, pil_format)
+    return resize_cache.add(name)
+
+
+async def get_resized_image(image_url: str, width: int, fmt: str):
+    """ 🔍 คืน Path ของรูปที่ย่อแล้วจาก Disk Cache ถ้ายังไม่มีจะย่อจากต้นฉบับ
+    Request ที่ขอรูปเดียวกันพร้อมกันจะรอผลจากการย่อครั้งเดียวกัน
+    """
+    pil_format, ext, _ = RESIZE_FORMATS[fmt]
+    name = _resized_name(image_url, width, ext)
+    path = resize_cache.get(name)
+    if path is None:
+        path = await _resize_flight.do(name, _render_resized, url_to_path(image_url), name, width, pil_format)
+    return path
+
+
+async def process_uploaded_image(image_id: int, image_url: str):
+    """ ⚙️ งานเบื้องหลังหลังอัปโหลด: สร้างรูปย่อยและแปลง Format ใน Process Pool แล้วบันทึกลงตาราง product_image_variants """
+    try:
+        # 🔁 ไฟล์เดียวกันเคยถูกอัปโหลดให้รูปอื่นแล้ว ใช้รูปย่อยชุดเดิมได้เลย (ชื่อไฟล์ <sha256>_<variant> ใช้ร่วมกัน)
+        copied = await run_in_threadpool(image_model.copy_blob_variants, image_id)
+        if copied >= EXPECTED_VARIANT_COUNT:
+            return
+
+        loop = asyncio.get_running_loop()
+        source_path = url_to_path(image_url)
+        derivatives = await loop.run_in_executor(_get_pool(), generate_derivatives, source_path)
+        await run_in_threadpool(image_model.save_image_variants, image_id, derivatives)
+
+        # แปลงเป็น WebP/AVIF ทีหลัง เพื่อให้รูปย่อย Format ปกติพร้อมใช้งานก่อน
+        for fmt in TRANSCODE_FORMATS:
+            transcoded = await loop.run_in_executor(_get_pool(), generate_derivatives, source_path, VARIANTS_DIR, fmt)
+            await run_in_threadpool(image_model.save_image_variants, image_id, transcoded)
+    except Exception as e:
+        print(f"Error generating derivatives for image {image_id}: {str(e)}")
+
+
+def _delete_variant_files(image_path: str):
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    variant_dirs = [VARIANTS_DIR, os.path.join(VARIANTS_DIR, *file_uploads.shard_subdir(stem).split("/"))]
+    for path in [path for d in variant_dirs for path in glob.glob(os.path.join(d, f"{glob.escape(stem)}_*"))]:
+        if os.path.exists(path):
+            os.remove(path)
+    resize_cache.discard(f"{stem}_w")
+
+
+def delete_image_files(image_url: str):
+    """ 🗑️ ลบไฟล์ต้นฉบับและรูปย่อยทั้งหมดของรูปนี้ออกจากดิสก์ """
+    image_path = url_to_path(image_url)
+    if os.path.exists(image_path):
+        os.remove(image_path)
+    _delete_variant_files(image_path)
+
+
+def delete_released_blob_files(image_url: str, released_at: datetime):
+    """ 🗑️ ลบไฟล์ของ Blob ที่ไม่มีรูปไหนอ้างถึงตั้งแต่ released_at (เรียกขณะถือ Lock แถวใน image_blobs)
+    ถ้าไฟล์ถูกเขียนใหม่หลัง released_at (อัปโหลดเนื้อหาเดียวกันซ้ำ และกำลังจะอ้างถึงไฟล์นี้) จะคืนไฟล์และคืนค่า False
+    """
+    image_path = url_to_path(image_url)
+    aside_path = f"{image_path}.deleting"
+    try:
+        # ย้ายออกก่อนตรวจ ไฟล์ที่ผู้อัปโหลดเขียนทับหลังจากนี้จึงไม่ถูกลบไปด้วย
+        os.replace(image_path, aside_path)
+    except FileNotFoundError:
+        aside_path = None
+
+    if aside_path is not None:
+        if os.stat(aside_path).st_mtime >= released_at.timestamp():
+            os.replace(aside_path, image_path)
+            return False
+        os.remove(aside_path)
+    _delete_variant_files(image_path)
+    return True
+
+
+def purge_released_blobs(grace: int = IMAGE_BLOB_RELEASE_GRACE, batch_size: int = IMAGE_BLOB_PURGE_BATCH_SIZE):
+    """ 🧹 ลบไฟล์ของ Blob ที่ไม่มีรูปไหนอ้างถึงนานกว่า grace วินาที (เรียกจาก Janitor) คืนจำนวน Blob ที่ลบ """
+    released_before = datetime.now() - timedelta(seconds=grace)
+    purged = 0
+    for sha256 in image_model.list_released_blobs(released_before, batch_size):
+        if image_model.purge_released_blob(sha256, released_before, delete_released_blob_files):
+            purged += 1
+    return purged
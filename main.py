@@ -1,24 +1,50 @@
 # main.py
-from fastapi import FastAPI, Request, Form, HTTPException, status
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Request, Form, HTTPException, status, Depends
+from static_files import CachedStaticFiles
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from routers import user as user_router
 from routers import product as product_router
 from routers import product_image as product_image_router
 from routers import order as order_router
 from routers import admin_product as admin_product_router
+from routers import image as image_router
+from routers import catalog as catalog_router
 from fastapi.middleware.cors import CORSMiddleware
-from auth import authenticate_user, create_access_token, decode_access_token
+from fastapi.concurrency import run_in_threadpool
+from auth import create_access_token, decode_access_token, revoke_token, verify_password_async, get_identity_from_cookie, get_admin_identity_from_cookie, AdminLoginRequired
 from database import get_connection
+from models import user as user_model
+import image_processing
+import temp_janitor
+import order_events
+import templating
+import catalog_cache
+import catalog_snapshot
+import catalog_index
+import cache
+from templating import templates
+from contextlib import asynccontextmanager
+import asyncio
 import os
 from typing import Optional
 
+# ⏰ งานเบื้องหลังตลอดอายุของแอป (เริ่มตอน Startup และหยุดตอน Shutdown)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    janitor_task = asyncio.create_task(temp_janitor.run_periodically())
+    snapshot_task = asyncio.create_task(catalog_snapshot.run_periodically())
+    try:
+        yield
+    finally:
+        janitor_task.cancel()
+        snapshot_task.cancel()
+
 # 🚀 สร้าง FastAPI App
 app = FastAPI(
     title="E-commerce API",
     description="API สำหรับร้านค้าออนไลน์ มีระบบจัดการ User, Product, Order",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # สร้างโฟลเดอร์สำหรับเก็บรูปภาพ
@@ -30,16 +56,15 @@ app.include_router(product_router.router)
 app.include_router(product_image_router.router)
 app.include_router(order_router.router)
 app.include_router(admin_product_router.router)
+app.include_router(image_router.router)
+app.include_router(catalog_router.router)
 
-# 🖼️ Mount เส้นทางสำหรับไฟล์สตาติก (รูปภาพสินค้า)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# 🖼️ Mount เส้นทางสำหรับไฟล์สตาติก (รูปภาพสินค้า) พร้อม Header สำหรับ Cache (ดู static_files.py)
+app.mount("/uploads", CachedStaticFiles(directory="uploads"), name="uploads")
 
 # สร้างโฟลเดอร์สำหรับเก็บรูปภาพชั่วคราว
 os.makedirs("uploads/products/temp", exist_ok=True)
 
-# 🎨 ตั้งค่า Jinja2 Templates
-templates = Jinja2Templates(directory="templates")
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:8181"],
@@ -48,24 +73,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 🔐 หน้า Admin ที่ยังไม่ได้ Login: Redirect ไปหน้า Login
+@app.exception_handler(AdminLoginRequired)
+async def admin_login_required(request: Request, exc: AdminLoginRequired):
+    # 👉 ถ้ามาจาก HTMX ให้สั่งเปลี่ยนทั้งหน้าผ่าน HX-Redirect (ไม่งั้น HTMX จะใส่ Response ลงใน Fragment ที่เป็นเป้าหมาย)
+    if request.headers.get("HX-Request") == "true":
+        return HTMLResponse(content="", headers={"HX-Redirect": "/admin/login"})
+    return RedirectResponse(url="/admin/login", status_code=status.HTTP_303_SEE_OTHER)
+
 # 🔐 Admin Login Page
 @app.get("/admin/login", response_class=HTMLResponse)
 async def admin_login_page(request: Request):
-    token = request.cookies.get("access_token")
-    if token and token.startswith("Bearer "):
-        try:
-            token_data = decode_access_token(token.replace("Bearer ", ""))
-            if token_data:
-                conn = get_connection()
-                with conn.cursor() as cursor:
-                    cursor.execute("SELECT * FROM users WHERE username = %s", (token_data.get("sub"),))
-                    user = cursor.fetchone()
-                conn.close()
-
-                if user:
-                    return RedirectResponse(url="/admin/dashboard", status_code=302)
-        except Exception:
-            pass
+    # 🪪 ถ้ามี Cookie ที่ยังใช้ได้อยู่แล้ว ให้ไปหน้า Dashboard เลย (ตัวตนมาจาก Cache)
+    try:
+        user = await run_in_threadpool(get_identity_from_cookie, request)
+        if user:
+            return RedirectResponse(url="/admin/dashboard", status_code=302)
+    except Exception:
+        pass
 
     return templates.TemplateResponse("admin/login.html", {"request": request})
 
@@ -76,7 +101,11 @@ async def admin_login(
     username: str = Form(...),
     password: str = Form(...)
 ):
-    user = authenticate_user(username, password)
+    # 🔍 ค้นหาด้วย Unique Index แล้วตรวจรหัสผ่านใน Worker Pool ของ bcrypt (ไม่บล็อก Event Loop)
+    user = await run_in_threadpool(user_model.get_user_by_username, username)
+    if user and not await verify_password_async(password, user["password"]):
+        user = None
+
     if not user or user["role"] != "admin":
         return templates.TemplateResponse(
             "admin/login.html",
@@ -105,24 +134,13 @@ async def admin_login(
 # 🏠 Admin Dashboard
 @app.get("/admin/dashboard", response_class=HTMLResponse)
 async def admin_dashboard(request: Request):
-    token = request.cookies.get("access_token")
-    if not token or not token.startswith("Bearer "):
-        return RedirectResponse(url="/admin/login", status_code=status.HTTP_302_FOUND)
-
     try:
-        token_data = decode_access_token(token.replace("Bearer ", ""))
-        if not token_data:
+        user = await run_in_threadpool(get_identity_from_cookie, request)
+        if not user or user["role"] != "admin":
             return RedirectResponse(url="/admin/login", status_code=status.HTTP_302_FOUND)
 
         conn = get_connection()
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users WHERE username = %s", (token_data.get("sub"),))
-            user = cursor.fetchone()
-
-            if not user or user["role"] != "admin":
-                conn.close()
-                return RedirectResponse(url="/admin/login", status_code=status.HTTP_302_FOUND)
-
             cursor.execute("SELECT COUNT(*) as count FROM products")
             product_count = cursor.fetchone()['count']
 
@@ -152,7 +170,16 @@ async def admin_dashboard(request: Request):
 
 # 🔄 Logout
 @app.post("/logout")
-async def logout():
+async def logout(request: Request):
+    # 🚪 เพิกถอน Token ใน Cookie ด้วย เพื่อไม่ให้นำ Token เดิมกลับมาใช้ได้อีก
+    token = request.cookies.get("access_token")
+    if token and token.startswith("Bearer "):
+        try:
+            claims = await run_in_threadpool(decode_access_token, token.replace("Bearer ", ""))
+            await run_in_threadpool(revoke_token, claims)
+        except Exception:
+            pass
+
     response = RedirectResponse(url="/admin/login", status_code=status.HTTP_303_SEE_OTHER)
     response.delete_cookie(key="access_token")
     return response
@@ -165,19 +192,15 @@ async def get_recent_activity(request: Request):
         return "<p class='text-center text-red-500'>Authentication required to load recent activity</p>"
 
     try:
-        token_data = decode_access_token(token.replace("Bearer ", ""))
-        if not token_data:
+        user = await run_in_threadpool(get_identity_from_cookie, request)
+        if not user:
             return "<p class='text-center text-red-500'>Authentication expired. Please refresh page.</p>"
 
+        if user["role"] != "admin":
+            return "<p class='text-center text-red-500'>You don't have permission to view this content</p>"
+
         conn = get_connection()
         with conn.cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE username = %s", (token_data.get("sub"),))
-            user = cursor.fetchone()
-
-            if not user or user["role"] != "admin":
-                conn.close()
-                return "<p class='text-center text-red-500'>You don't have permission to view this content</p>"
-
             cursor.execute("SELECT * FROM orders ORDER BY created_at DESC LIMIT 5")
             recent_orders = cursor.fetchall()
 
@@ -190,3 +213,46 @@ async def get_recent_activity(request: Request):
 
     except Exception as e:
         return f"<p class='text-center text-red-500'>Error loading activity data: {str(e)}</p>"
+
+# 📡 Recent Activity แบบ Live (Server-Sent Events): ส่งเฉพาะ Order ที่สร้างใหม่หรือเปลี่ยนสถานะ
+# Order ที่เปลี่ยนถูกอ่านจากฐานข้อมูลครั้งเดียวแล้วส่งให้ Admin ทุกคนที่เปิด Dashboard อยู่ (ดู order_events.py)
+@app.get("/admin/recent-activity/stream")
+async def recent_activity_stream(user: dict = Depends(get_admin_identity_from_cookie)):
+    item_template = templates.get_template("components/_order_activity_item.html")
+
+    async def event_stream():
+        async with order_events.broadcaster.subscribe() as queue:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    events = await asyncio.wait_for(queue.get(), timeout=order_events.ORDER_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Comment line กันไม่ให้ Proxy ตัดการเชื่อมต่อที่เงียบนาน
+                    yield ": keep-alive\n\n"
+                    continue
+
+                for event, order in events:
+                    html = item_template.render(order=order, oob=event != order_events.ORDER_CREATED)
+                    if event == order_events.ORDER_CREATED:
+                        html += '<p id="recent-activity-empty" hx-swap-oob="true" class="hidden"></p>'
+                    yield order_events.format_sse("order", html)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 📊 Metrics ของงานเบื้องหลังและ Cache (ค่าของ Worker Process ที่ตอบ Request นี้)
+@app.get("/admin/metrics")
+async def admin_metrics(user: dict = Depends(get_admin_identity_from_cookie)):
+    return {
+        "temp_janitor": temp_janitor.get_metrics(),
+        "image_resize_cache": image_processing.resize_cache.stats(),
+        "order_events": order_events.broadcaster.stats(),
+        "template_fragments": templating.fragment_cache.stats(),
+        "admin_product_search": catalog_cache.stats(),
+        "catalog_snapshot": catalog_snapshot.stats(),
+        "catalog_index": catalog_index.stats(),
+        "single_flight": cache.single_flight_stats()
+    }
@@ -0,0 +1,19 @@
+# migrate_primary_images.py
+"""
+⭐ อัปเกรดฐานข้อมูลที่สร้างก่อนมีคอลัมน์ products.primary_image_id
+
+เพิ่มคอลัมน์ products.primary_image_id คัดลอกรูปหลักเดิมจาก product_images.is_primary แล้วจึงลบคอลัมน์ is_primary
+(ถ้าลบคอลัมน์ก่อนคัดลอก สินค้าทุกตัวจะเสียรูปหลักที่เลือกไว้) รันซ้ำได้ รอบถัดไปจะไม่ทำอะไร:
+
+    python migrate_primary_images.py
+"""
+from models import product_image as image_model
+
+
+def main():
+    migrated = image_model.migrate_primary_images()
+    print(f"⭐ Migrated primary images of {migrated} products")
+
+
+if __name__ == "__main__":
+    main()
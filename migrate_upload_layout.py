@@ -0,0 +1,66 @@
+# migrate_upload_layout.py
+"""
+🔀 ย้ายไฟล์รูปที่อัปโหลดก่อนหน้านี้จากโครงสร้างแบบแบน (uploads/products/<name>)
+ไปโครงสร้างแบบแบ่งโฟลเดอร์ 2 ชั้น (uploads/products/ab/cd/<name>) และแก้ image_url ในฐานข้อมูลทีละ batch
+
+รันซ้ำได้เสมอ (Resumable): แต่ละรอบเลือกเฉพาะ URL ที่ยังไม่ได้ย้าย ถ้าหยุดกลางคันรันใหม่ก็ทำต่อจากที่ค้างไว้
+ระหว่างย้าย URL เดิมยังเปิดได้ เพราะ /uploads จะหาไฟล์ในโฟลเดอร์ใหม่ให้ถ้าไม่พบที่เดิม (ดู static_files.py)
+
+    python migrate_upload_layout.py --batch-size 500
+"""
+import argparse
+import os
+import file_uploads
+from models import product_image as image_model
+
+MIGRATION_BATCH_SIZE = int(os.environ.get('UPLOAD_MIGRATION_BATCH_SIZE', 500))
+
+
+def migrate_batch(batch_size: int = MIGRATION_BATCH_SIZE):
+    """ 🔀 ย้ายไฟล์หนึ่ง batch แล้วแก้ URL ในฐานข้อมูล คืนจำนวน URL ที่ย้ายได้ (0 = เสร็จแล้ว) """
+    urls = image_model.get_unsharded_image_urls(batch_size)
+    url_map = {}
+
+    for old_url in urls:
+        new_url = file_uploads.sharded_url(old_url)
+        old_path = os.path.join(".", old_url.lstrip("/"))
+        new_path = os.path.join(".", new_url.lstrip("/"))
+
+        # ย้ายไฟล์ก่อนแก้ URL: ถ้าหยุดกลางคัน ไฟล์อยู่ที่ใหม่แล้วแต่ URL ยังเป็นแบบเดิม ซึ่งยังเปิดได้
+        if os.path.exists(old_path):
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            os.replace(old_path, new_path)
+        elif not os.path.exists(new_path):
+            print(f"⚠️ Missing file for {old_url}")
+
+        url_map[old_url] = new_url
+
+    image_model.rewrite_image_urls(url_map)
+    return len(url_map)
+
+
+def migrate_upload_layout(batch_size: int = MIGRATION_BATCH_SIZE, max_batches: int = None):
+    """ 🔁 ย้ายทีละ batch จนหมด (หรือครบ max_batches) คืนจำนวน URL ที่ย้ายทั้งหมด """
+    migrated = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = migrate_batch(batch_size)
+        if moved == 0:
+            break
+        migrated += moved
+        batches += 1
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move uploaded images into the sharded ab/cd directory layout")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+
+    migrated = migrate_upload_layout(batch_size=args.batch_size, max_batches=args.max_batches)
+    print(f"🔀 Migrated {migrated} image URLs")
+
+
+if __name__ == "__main__":
+    main()
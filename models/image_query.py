@@ -0,0 +1,31 @@
+# 🖼️ Query รูปภาพของสินค้าที่ใช้ร่วมกันระหว่าง models/product_image.py (API) และ models/product_document.py (Read Model)
+# แยกไว้ที่นี่เพื่อให้ product_image เรียก product_document ได้โดยไม่ต้อง Import กลับกัน
+
+# ⭐ รูปหลักเก็บเป็น products.primary_image_id (แถวเดียวต่อสินค้า) ส่วน is_primary ของแต่ละรูปคำนวณจากการ JOIN
+PRODUCT_IMAGE_SELECT = """
+    SELECT pi.*, COALESCE(pi.image_id = p.primary_image_id, 0) AS is_primary
+    FROM product_images pi
+    JOIN products p ON p.product_id = pi.product_id
+"""
+
+
+# 🖼️ ใส่ URL ของรูปย่อย (thumbnail / medium / large / original) ให้รูปภาพทุกรูปด้วย Query เดียว
+# URL ชี้ไปที่ /img/{image_id}/{variant} ซึ่งเลือก Format (AVIF/WebP/JPEG/PNG) ตาม Header Accept ให้เอง
+def attach_variants(cursor, images):
+    images = [image for image in images if image]
+    if not images:
+        return images
+
+    image_ids = [image['image_id'] for image in images]
+    placeholders = ', '.join(['%s'] * len(image_ids))
+    cursor.execute(
+        f"SELECT DISTINCT image_id, variant FROM product_image_variants WHERE image_id IN ({placeholders})",
+        image_ids
+    )
+    variants = {}
+    for row in cursor.fetchall():
+        variants.setdefault(row['image_id'], {})[row['variant']] = f"/img/{row['image_id']}/{row['variant']}"
+
+    for image in images:
+        image['variants'] = variants.get(image['image_id'], {})
+    return images
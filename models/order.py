@@ -1,6 +1,16 @@
 from database import get_connection
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
+import os
+import order_events
+import catalog_cache
+import catalog_index
+from models import product_document
+
+# ⚙️ การตั้งค่าการย้าย Order เก่าไปเก็บในตาราง Archive
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 180))
+ORDER_ARCHIVE_BATCH_SIZE = int(os.environ.get('ORDER_ARCHIVE_BATCH_SIZE', 500))
+ARCHIVABLE_STATUSES = ('completed', 'cancelled')
 
 # 📦 CREATE: สร้าง Order และ Order Items
 def create_order(order_data):
@@ -75,13 +85,19 @@ def create_order(order_data):
                 # 4. อัปเดตสต็อกสินค้า
                 new_stock = item['product']['stock_quantity'] - item['quantity']
                 cursor.execute(
-                    "UPDATE products SET stock_quantity = %s, updated_at = %s WHERE product_id = %s",
+                    "UPDATE products SET stock_quantity = %s, updated_at = %s, version = version + 1 WHERE product_id = %s",
                     (new_stock, now, item['product_id'])
                 )
+                product_document.rebuild_product_document(cursor, item['product_id'])
             
             # Commit Transaction
             conn.commit()
             
+            # 📣 แจ้ง Dashboard ของ Admin ที่เปิดอยู่ และทำให้ผลลัพธ์รายการสินค้าที่ Cache ไว้ (สต็อกเดิม) ใช้ไม่ได้
+            order_events.publish(order_id, order_events.ORDER_CREATED)
+            catalog_index.mark_dirty(*(item['product_id'] for item in order_items))
+            catalog_cache.bump_version()
+            
             # ดึงข้อมูล Order ที่เพิ่งสร้างมาเพื่อตอบกลับ
             order = get_order_with_items(order_id)
             
@@ -107,19 +123,29 @@ def get_orders():
     return orders
 
 
-# 📦 READ: ดึงข้อมูล Order ของผู้ใช้คนใดคนหนึ่ง
-def get_user_orders(user_id: int):
+# 📦 READ: ดึงข้อมูล Order ของผู้ใช้คนใดคนหนึ่ง (รวม Order ที่ถูกย้ายไป Archive แล้ว)
+def get_user_orders(user_id: int, include_archived: bool = True):
     conn = get_connection()
     with conn.cursor() as cursor:
-        sql = "SELECT * FROM orders WHERE user_id = %s ORDER BY created_at DESC"
-        cursor.execute(sql, (user_id,))
+        columns = "order_id, user_id, total_amount, status, created_at, updated_at"
+        if include_archived:
+            sql = f"""
+                SELECT {columns} FROM orders WHERE user_id = %s
+                UNION ALL
+                SELECT {columns} FROM orders_archive WHERE user_id = %s
+                ORDER BY created_at DESC
+            """
+            cursor.execute(sql, (user_id, user_id))
+        else:
+            sql = f"SELECT {columns} FROM orders WHERE user_id = %s ORDER BY created_at DESC"
+            cursor.execute(sql, (user_id,))
         orders = cursor.fetchall()
 
     conn.close()
     return orders
 
 
-# 📦 READ: ดึงข้อมูล Order พร้อม Order Items
+# 📦 READ: ดึงข้อมูล Order พร้อม Order Items (ถ้าไม่พบในตารางหลักจะค้นหาใน Archive ต่อ)
 def get_order_with_items(order_id: int):
     conn = get_connection()
     with conn.cursor() as cursor:
@@ -128,22 +154,29 @@ def get_order_with_items(order_id: int):
         cursor.execute(sql, (order_id,))
         order = cursor.fetchone()
         
-        if not order:
-            conn.close()
-            return None
-            
-        # ดึงข้อมูล Order Items
-        sql = """
-            SELECT oi.*, p.name as product_name
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.product_id
-            WHERE oi.order_id = %s
-        """
-        cursor.execute(sql, (order_id,))
-        items = cursor.fetchall()
-        
-        # เพิ่ม items เข้าไปใน order
-        order['items'] = items
+        if order:
+            # ดึงข้อมูล Order Items
+            sql = """
+                SELECT oi.*, p.name as product_name
+                FROM order_items oi
+                JOIN products p ON oi.product_id = p.product_id
+                WHERE oi.order_id = %s
+            """
+            cursor.execute(sql, (order_id,))
+            order['items'] = cursor.fetchall()
+            order['archived'] = False
+        else:
+            # 🗄️ ค้นหาใน Archive (ชื่อสินค้าถูกเก็บไว้ตอนย้ายแล้ว ไม่ต้อง Join)
+            cursor.execute("SELECT * FROM orders_archive WHERE order_id = %s", (order_id,))
+            order = cursor.fetchone()
+
+            if order:
+                cursor.execute(
+                    "SELECT * FROM order_items_archive WHERE order_id = %s",
+                    (order_id,)
+                )
+                order['items'] = cursor.fetchall()
+                order['archived'] = True
 
     conn.close()
     return order
@@ -153,11 +186,13 @@ def get_order_with_items(order_id: int):
 def update_order_status(order_id: int, status: str):
     conn = get_connection()
     with conn.cursor() as cursor:
-        # ตรวจสอบว่ามี Order นี้หรือไม่
-        cursor.execute("SELECT * FROM orders WHERE order_id = %s", (order_id,))
+        # ตรวจสอบว่ามี Order นี้หรือไม่ และล็อกไว้จน commit (archive_orders ที่รันพร้อมกันจะรอ ไม่ย้ายระหว่างอัปเดต)
+        # คืน None ถ้าไม่พบในตารางหลัก (เช่นถูกย้ายไป Archive หลังผู้เรียกตรวจสอบ)
+        cursor.execute("SELECT * FROM orders WHERE order_id = %s FOR UPDATE", (order_id,))
         current_order = cursor.fetchone()
         
         if not current_order:
+            conn.rollback()
             conn.close()
             return None
             
@@ -174,11 +209,12 @@ def update_order_status(order_id: int, status: str):
                 cursor.execute(
                     """
                     UPDATE products 
-                    SET stock_quantity = stock_quantity + %s, updated_at = %s 
+                    SET stock_quantity = stock_quantity + %s, updated_at = %s, version = version + 1 
                     WHERE product_id = %s
                     """,
                     (item['quantity'], now, item['product_id'])
                 )
+                product_document.rebuild_product_document(cursor, item['product_id'])
         
         # อัปเดตสถานะ
         sql = "UPDATE orders SET status = %s, updated_at = %s WHERE order_id = %s"
@@ -186,8 +222,93 @@ def update_order_status(order_id: int, status: str):
         cursor.execute(sql, (status, now, order_id))
         conn.commit()
         
+        # ถ้ามีการคืนสต็อก ผลลัพธ์รายการสินค้าที่ Cache ไว้ใช้ไม่ได้แล้ว
+        if current_order['status'] == 'pending' and status == 'cancelled':
+            catalog_index.mark_dirty(*(item['product_id'] for item in items))
+            catalog_cache.bump_version()
+        
+        # 📣 แจ้ง Dashboard ของ Admin ที่เปิดอยู่
+        if status != current_order['status']:
+            order_events.publish(order_id, order_events.ORDER_STATUS_CHANGED)
+        
         # ดึงข้อมูล Order ที่อัปเดตแล้วพร้อม items
         updated_order = get_order_with_items(order_id)
 
     conn.close()
-    return updated_order
\ No newline at end of file
+    return updated_order
+
+
+# 🗄️ ARCHIVE: ย้าย Order ที่ปิดแล้ว (completed/cancelled) และเก่ากว่าที่กำหนดไปตาราง Archive ทีละ batch
+def archive_orders(older_than_days: int = ORDER_ARCHIVE_AFTER_DAYS, batch_size: int = ORDER_ARCHIVE_BATCH_SIZE, max_batches: int = None):
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    status_placeholders = ', '.join(['%s'] * len(ARCHIVABLE_STATUSES))
+    archived_count = 0
+    batches = 0
+
+    conn = get_connection()
+    try:
+        while max_batches is None or batches < max_batches:
+            with conn.cursor() as cursor:
+                # แต่ละ batch เป็น Transaction สั้น ๆ ของตัวเอง เพื่อไม่ให้ล็อกตาราง orders นาน
+                conn.begin()
+
+                cursor.execute(
+                    f"""
+                    SELECT order_id FROM orders
+                    WHERE status IN ({status_placeholders}) AND updated_at < %s
+                    ORDER BY order_id
+                    LIMIT %s
+                    FOR UPDATE
+                    """,
+                    ARCHIVABLE_STATUSES + (cutoff, batch_size)
+                )
+                order_ids = [row['order_id'] for row in cursor.fetchall()]
+
+                if not order_ids:
+                    conn.rollback()
+                    break
+
+                placeholders = ', '.join(['%s'] * len(order_ids))
+
+                # 1. คัดลอก Order ไปตาราง Archive
+                cursor.execute(
+                    f"""
+                    INSERT INTO orders_archive (order_id, user_id, total_amount, status, created_at, updated_at, archived_at)
+                    SELECT order_id, user_id, total_amount, status, created_at, updated_at, %s
+                    FROM orders WHERE order_id IN ({placeholders})
+                    """,
+                    [datetime.now()] + order_ids
+                )
+
+                # 2. คัดลอก Order Items พร้อมชื่อสินค้า ณ เวลาที่ย้าย
+                cursor.execute(
+                    f"""
+                    INSERT INTO order_items_archive (
+                        order_item_id, order_id, product_id, product_name, quantity, price_at_time, subtotal
+                    )
+                    SELECT oi.order_item_id, oi.order_id, oi.product_id, p.name, oi.quantity, oi.price_at_time, oi.subtotal
+                    FROM order_items oi
+                    LEFT JOIN products p ON oi.product_id = p.product_id
+                    WHERE oi.order_id IN ({placeholders})
+                    """,
+                    order_ids
+                )
+
+                # 3. ลบออกจากตารางหลัก
+                cursor.execute(f"DELETE FROM order_items WHERE order_id IN ({placeholders})", order_ids)
+                cursor.execute(f"DELETE FROM orders WHERE order_id IN ({placeholders})", order_ids)
+
+                conn.commit()
+
+            archived_count += len(order_ids)
+            batches += 1
+
+            if len(order_ids) < batch_size:
+                break
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        conn.close()
+
+    return archived_count
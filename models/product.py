@@ -1,5 +1,28 @@
 from database import get_connection
 from datetime import datetime
+from models import product_image as image_model
+from models import product_document
+import catalog_cache
+import catalog_index
+from cache import single_flight
+
+# 🔎 ตัวเลือกของหน้ารายการสินค้า (Admin)
+PRODUCT_SORT_COLUMNS = {
+    "id": "p.product_id",
+    "name": "p.name",
+    "price": "p.price",
+    "stock": "p.stock_quantity",
+    "created_at": "p.created_at",
+}
+PRODUCT_STOCK_FILTERS = {
+    "in_stock": "p.stock_quantity > 0",
+    "low_stock": "p.stock_quantity > 0 AND p.stock_quantity < 10",
+    "out_of_stock": "p.stock_quantity = 0",
+}
+MAX_PER_PAGE = 100
+PAGINATION_PAGES = "pages"  # แสดงเลขหน้าและจำนวนทั้งหมด
+PAGINATION_NEXT = "next"    # แสดงแค่ก่อนหน้า/ถัดไป ไม่ต้องนับจำนวนทั้งหมด
+PAGINATION_MODES = (PAGINATION_PAGES, PAGINATION_NEXT)
 
 # 🚀 CREATE: Insert Product และ Return Product ที่เพิ่ง Insert
 def create_product(product):
@@ -19,10 +42,13 @@ def create_product(product):
             now,
             now
         ))
+        product_id = cursor.lastrowid
+        product_document.rebuild_product_document(cursor, product_id)
         conn.commit()
+        catalog_index.mark_dirty(product_id)
+        catalog_cache.bump_version()
         
         # 🔍 ดึงข้อมูล Product ที่เพิ่ง Insert มาเพื่อตอบกลับ
-        product_id = cursor.lastrowid
         cursor.execute("SELECT * FROM products WHERE product_id = %s", (product_id,))
         new_product = cursor.fetchone()
 
@@ -42,7 +68,8 @@ def get_products():
     return products
 
 
-# 🚀 READ: Select Product โดยใช้ product_id
+# 🚀 READ: Select Product โดยใช้ product_id (Request ที่ขอสินค้าเดียวกันพร้อมกันใช้ Query เดียว)
+@single_flight
 def get_product_by_id(product_id: int):
     conn = get_connection()
     with conn.cursor() as cursor:
@@ -54,6 +81,146 @@ def get_product_by_id(product_id: int):
     return product
 
 
+# 🔎 Normalize ตัวกรองของหน้ารายการสินค้า ให้ตัวกรองที่มีผลเหมือนกันได้ Key เดียวกัน (ใช้กับ catalog_cache)
+# คืนค่า tuple (search, min_price, max_price, stock_status, sort, reverse, page, per_page)
+def normalize_product_filters(search=None, min_price=None, max_price=None, stock_status=None,
+                              sort=None, reverse=False, page=1, per_page=10, pagination=None):
+    search = (search or "").strip().lower() or None  # LIKE ของ Collation utf8mb4_unicode_ci ไม่สนตัวพิมพ์เล็ก/ใหญ่อยู่แล้ว
+    min_price = float(min_price) if min_price is not None else None
+    max_price = float(max_price) if max_price is not None else None
+    stock_status = stock_status if stock_status in PRODUCT_STOCK_FILTERS else None
+    sort = sort if sort in PRODUCT_SORT_COLUMNS and sort != "created_at" else None  # created_at คือค่าเริ่มต้น
+    page = max(int(page), 1)
+    per_page = min(max(int(per_page), 1), MAX_PER_PAGE)
+    pagination = pagination if pagination in PAGINATION_MODES else PAGINATION_PAGES
+    return (search, min_price, max_price, stock_status, sort, bool(reverse), page, per_page, pagination)
+
+
+# 🔎 สร้าง WHERE ของตัวกรองหน้ารายการสินค้า คืนค่า (sql, params)
+def _product_filter_sql(search, min_price, max_price, stock_status):
+    where_clauses = []
+    params = []
+
+    if search:
+        where_clauses.append("(p.name LIKE %s OR p.description LIKE %s)")
+        params.extend([f"%{search}%", f"%{search}%"])
+    if min_price is not None:
+        where_clauses.append("p.price >= %s")
+        params.append(min_price)
+    if max_price is not None:
+        where_clauses.append("p.price <= %s")
+        params.append(max_price)
+    if stock_status in PRODUCT_STOCK_FILTERS:
+        where_clauses.append(PRODUCT_STOCK_FILTERS[stock_status])
+
+    where_sql = f"WHERE {' AND '.join(where_clauses)} " if where_clauses else ""
+    return where_sql, params
+
+
+# 🔢 READ: จำนวนสินค้าที่ตรงตัวกรอง คืนค่า (count, exact)
+# - ไม่มีตัวกรอง หรือกรองเฉพาะสถานะสต็อก: อ่านจากตัวนับ product_counters ที่ Trigger ดูแล (ตรงเสมอ)
+# - กรองช่วงราคา: COUNT(*) บน products โดยใช้ Index ของราคา (ตรงเสมอ)
+# - ค้นหาข้อความ (LIKE '%...%' ใช้ Index ไม่ได้): นับจริงครั้งเดียวแล้ว Cache ไว้ (ค่าประมาณ แสดงเป็น "about N")
+def count_products(cursor, search=None, min_price=None, max_price=None, stock_status=None):
+    if not search and min_price is None and max_price is None:
+        column = stock_status if stock_status in PRODUCT_STOCK_FILTERS else "total"
+        cursor.execute(f"SELECT COALESCE(SUM({column}), 0) AS count FROM product_counters")
+        return int(cursor.fetchone()['count']), True
+
+    if search:
+        key = (search, min_price, max_price, stock_status)
+        count = catalog_cache.count_cache.get(key)
+        if count is not None:
+            return count, False
+
+    where_sql, params = _product_filter_sql(search, min_price, max_price, stock_status)
+    cursor.execute(f"SELECT COUNT(*) AS count FROM products p {where_sql}", params)
+    count = cursor.fetchone()['count']
+    if search:
+        catalog_cache.count_cache.set(key, count)
+    return count, not search
+
+
+# 🔎 READ: ค้นหา/กรอง/เรียง/แบ่งหน้า สินค้าสำหรับหน้า Admin พร้อมรูปหลักของแต่ละสินค้า
+# คืนค่า {"products": [...], "has_next": มีหน้าถัดไปหรือไม่, "total_count": จำนวนทั้งหมดหรือ None, "total_exact": bool}
+# pagination = "next" จะไม่นับจำนวนทั้งหมดเลย (ดูแค่ว่ามีหน้าถัดไปจากแถวที่ per_page + 1)
+# ถ้าไม่มีการค้นหาข้อความและเปิดใช้ catalog_index (NumPy) จะกรอง/เรียงในหน่วยความจำ แล้วอ่านแค่แถวของหน้านี้จาก MySQL
+def search_products(search=None, min_price=None, max_price=None, stock_status=None,
+                    sort=None, reverse=False, page=1, per_page=10, pagination=PAGINATION_PAGES):
+    if not search:
+        result = catalog_index.query(min_price, max_price, stock_status, sort, reverse, page, per_page)
+        if result is not None:
+            product_ids, total_count = result
+            return _load_product_page(product_ids, (page - 1) * per_page + len(product_ids) < total_count, total_count)
+
+    where_sql, params = _product_filter_sql(search, min_price, max_price, stock_status)
+    order_column = PRODUCT_SORT_COLUMNS.get(sort, "p.created_at")
+    order_dir = "ASC" if reverse else "DESC"
+    sql_query = f"SELECT p.* FROM products p {where_sql}ORDER BY {order_column} {order_dir} LIMIT %s OFFSET %s"
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            total_count, total_exact = None, False
+            if pagination != PAGINATION_NEXT:
+                total_count, total_exact = count_products(cursor, search, min_price, max_price, stock_status)
+
+            cursor.execute(sql_query, params + [per_page + 1, (page - 1) * per_page])
+            products = cursor.fetchall()
+            has_next = len(products) > per_page
+            products = products[:per_page]
+            attach_primary_images(cursor, products)
+    finally:
+        conn.close()
+
+    return {"products": products, "has_next": has_next, "total_count": total_count, "total_exact": total_exact}
+
+
+# 🔎 READ: แถวของสินค้าตาม product_ids ที่ catalog_index เลือกไว้ (คงลำดับเดิม) พร้อมรูปหลัก
+def _load_product_page(product_ids, has_next, total_count):
+    products = []
+    if product_ids:
+        conn = get_connection()
+        try:
+            with conn.cursor() as cursor:
+                placeholders = ', '.join(['%s'] * len(product_ids))
+                cursor.execute(f"SELECT p.* FROM products p WHERE p.product_id IN ({placeholders})", product_ids)
+                rows = {row['product_id']: row for row in cursor.fetchall()}
+                products = [rows[product_id] for product_id in product_ids if product_id in rows]
+                attach_primary_images(cursor, products)
+        finally:
+            conn.close()
+    return {"products": products, "has_next": has_next, "total_count": total_count, "total_exact": True}
+
+
+# ⭐ ใส่รูปหลักให้สินค้าทุกตัวด้วย Query เดียว (products.primary_image_id) พร้อม URL ของรูปย่อย
+def attach_primary_images(cursor, products):
+    primary_ids = [product['primary_image_id'] for product in products if product.get('primary_image_id')]
+    primary_images = {}
+    if primary_ids:
+        placeholders = ', '.join(['%s'] * len(primary_ids))
+        cursor.execute(
+            f"SELECT *, 1 AS is_primary FROM product_images WHERE image_id IN ({placeholders})",
+            primary_ids
+        )
+        primary_images = {image['image_id']: image for image in cursor.fetchall()}
+    for product in products:
+        product['primary_image'] = primary_images.get(product.get('primary_image_id'))
+    image_model.attach_variants(cursor, [product['primary_image'] for product in products])
+    return products
+
+
+# 🔖 READ: version ปัจจุบันของ Product (เพิ่มขึ้นทุกครั้งที่สินค้าหรือรูปของสินค้าเปลี่ยน) หรือ None ถ้าไม่พบ
+def get_product_version(product_id: int):
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version FROM products WHERE product_id = %s", (product_id,))
+        row = cursor.fetchone()
+
+    conn.close()
+    return row['version'] if row else None
+
+
 # 🚀 UPDATE: แก้ไขข้อมูล Product โดยใช้ product_id
 def update_product(product_id: int, product):
     conn = get_connection()
@@ -75,7 +242,7 @@ def update_product(product_id: int, product):
         # 🔄 Update Product
         sql = """
             UPDATE products 
-            SET name = %s, description = %s, price = %s, stock_quantity = %s, updated_at = %s
+            SET name = %s, description = %s, price = %s, stock_quantity = %s, updated_at = %s, version = version + 1
             WHERE product_id = %s
         """
         now = datetime.now()
@@ -87,7 +254,10 @@ def update_product(product_id: int, product):
             now,
             product_id
         ))
+        product_document.rebuild_product_document(cursor, product_id)
         conn.commit()
+        catalog_index.mark_dirty(product_id)
+        catalog_cache.bump_version()
         
         # 🔍 ดึงข้อมูล Product ที่ถูก Update มาเพื่อตอบกลับ
         cursor.execute("SELECT * FROM products WHERE product_id = %s", (product_id,))
@@ -101,13 +271,26 @@ def update_product(product_id: int, product):
 def delete_product(product_id: int):
     conn = get_connection()
     with conn.cursor() as cursor:
+        # 🔗 ลดจำนวนการอ้างอิงไฟล์รูปก่อน เพราะ ON DELETE CASCADE จะลบแถวรูปไปโดยไม่ผ่านโค้ดนี้
+        cursor.execute(
+            "SELECT image_id, image_url, blob_sha256 FROM product_images WHERE product_id = %s FOR UPDATE",
+            (product_id,)
+        )
+        orphaned_urls = image_model.release_image_blobs(cursor, cursor.fetchall())
+
         # ❌ ลบ Product
         sql = "DELETE FROM products WHERE product_id = %s"
         cursor.execute(sql, (product_id,))
-        conn.commit()
 
         # 🔄 ตรวจสอบว่ามีการลบหรือไม่
         affected_rows = cursor.rowcount
+        if affected_rows == 0:
+            conn.rollback()
+            conn.close()
+            return None
+        conn.commit()
+        catalog_index.mark_dirty(product_id)
+        catalog_cache.bump_version()
 
     conn.close()
-    return affected_rows > 0  # ✅ Return True ถ้าลบสำเร็จ
\ No newline at end of file
+    return orphaned_urls  # ✅ คืน URL ของไฟล์รูปที่ไม่มีใครใช้แล้ว (ให้ผู้เรียกลบออกจากดิสก์)
\ No newline at end of file
@@ -0,0 +1,122 @@
+from database import get_connection
+from models.image_query import PRODUCT_IMAGE_SELECT, attach_variants
+from schemas.product import ProductDocument
+
+# 📄 Read Model ของหน้าร้าน: JSON ของสินค้าพร้อมรูปภาพ รูปหลัก และ URL ของรูปย่อย (ตาราง product_documents)
+# สร้างใหม่ภายใน Transaction เดียวกับการเขียนสินค้า/รูปภาพ/สต็อก (ผ่าน touch_product หรือเรียกตรง)
+# จึงไม่มีช่วงที่ข้อมูลหลัก commit แล้วแต่เอกสารยังเป็นของเดิม และการอ่านไม่ต้อง JOIN หรือแปลงเป็น JSON ใหม่
+MAX_DOCUMENTS_PER_PAGE = 100
+
+
+# 📄 แปลงข้อมูลจริงของสินค้า (products + รูปภาพ + รูปย่อย) เป็นเอกสาร JSON โดยไม่เขียนอะไร
+# คืนค่า (version, document) หรือ None ถ้าไม่พบสินค้า
+def build_product_document(cursor, product_id: int):
+    cursor.execute("SELECT * FROM products WHERE product_id = %s", (product_id,))
+    product = cursor.fetchone()
+    if not product:
+        return None
+
+    cursor.execute(f"{PRODUCT_IMAGE_SELECT} WHERE pi.product_id = %s ORDER BY pi.sort_order", (product_id,))
+    images = cursor.fetchall()
+    attach_variants(cursor, images)
+
+    document = ProductDocument.model_validate({
+        **product,
+        "images": images,
+        "primary_image": next((image for image in images if image['is_primary']), None),
+    }).model_dump_json()
+    return product['version'], document
+
+
+# 📄 สร้างเอกสารของสินค้าใหม่และเก็บไว้ (เรียกภายใน Transaction ของผู้เรียก หลังเขียนทุกอย่างเสร็จแล้ว)
+def rebuild_product_document(cursor, product_id: int):
+    built = build_product_document(cursor, product_id)
+    if built is None:
+        return None  # สินค้าถูกลบแล้ว เอกสารถูกลบตาม ON DELETE CASCADE
+
+    version, document = built
+    cursor.execute(
+        """
+        INSERT INTO product_documents (product_id, version, document)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE version = VALUES(version), document = VALUES(document)
+        """,
+        (product_id, version, document)
+    )
+    return document
+
+
+# 📄 READ: เอกสาร JSON ของสินค้า (อ่านด้วย Primary Key ครั้งเดียว) หรือ None ถ้าไม่พบสินค้า
+# สินค้าที่ยังไม่มีเอกสาร (เช่น เพิ่มด้วย SQL ตรง หรือยังไม่ได้รัน rebuild_product_documents.py) แปลงจากข้อมูลจริงทุกครั้ง
+# โดยไม่เก็บไว้ (การอ่านไม่เปิด Transaction เขียนหรือล็อกแถว) เอกสารถูกเก็บโดยการเขียนสินค้าครั้งถัดไปหรือสคริปต์ rebuild
+def get_product_document(product_id: int):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT document FROM product_documents WHERE product_id = %s", (product_id,))
+            row = cursor.fetchone()
+            if row:
+                return row['document']
+
+            built = build_product_document(cursor, product_id)
+            return built[1] if built else None
+    finally:
+        conn.close()
+
+
+# 📄 READ: เอกสารของสินค้าเรียงตาม product_id ต่อจาก after_id (แบ่งหน้าแบบ Keyset ไม่ต้อง OFFSET)
+# แบ่งหน้าตามตาราง products สินค้าที่ยังไม่มีเอกสารจึงไม่หายจากหน้า แต่แปลงจากข้อมูลจริงแบบเดียวกับ get_product_document
+def list_product_documents(after_id: int = 0, limit: int = 20):
+    limit = min(max(int(limit), 1), MAX_DOCUMENTS_PER_PAGE)
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT p.product_id, d.document
+                FROM products p
+                LEFT JOIN product_documents d ON d.product_id = p.product_id
+                WHERE p.product_id > %s
+                ORDER BY p.product_id
+                LIMIT %s
+                """,
+                (after_id, limit)
+            )
+            rows = cursor.fetchall()
+
+            # อ่านใน Snapshot ของ Transaction เดียวกับ Query ด้านบน สินค้าในหน้านี้จึงยังพบเสมอ
+            for row in rows:
+                if row['document'] is None:
+                    row['document'] = build_product_document(cursor, row['product_id'])[1]
+    finally:
+        conn.close()
+    return rows
+
+
+# 📄 สร้างเอกสารของสินค้าทุกตัวใหม่ทีละชุด (ใช้ครั้งแรกกับฐานข้อมูลเดิม หรือหลังเปลี่ยนรูปแบบเอกสาร)
+# คืนจำนวนสินค้าที่สร้างเอกสาร
+def rebuild_all_product_documents(batch_size: int = 200):
+    rebuilt = 0
+    last_id = 0
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            while True:
+                cursor.execute(
+                    "SELECT product_id FROM products WHERE product_id > %s ORDER BY product_id LIMIT %s",
+                    (last_id, batch_size)
+                )
+                product_ids = [row['product_id'] for row in cursor.fetchall()]
+                if not product_ids:
+                    break
+                for product_id in product_ids:
+                    rebuild_product_document(cursor, product_id)
+                conn.commit()
+                rebuilt += len(product_ids)
+                last_id = product_ids[-1]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return rebuilt
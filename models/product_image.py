@@ -1,22 +1,26 @@
 from database import get_connection
 from datetime import datetime
+import catalog_cache
+from cache import single_flight
+from models import product_document
+from models.image_query import PRODUCT_IMAGE_SELECT, attach_variants
+
+
+# 🔖 เพิ่ม products.version เมื่อรูปของสินค้าเปลี่ยน (เรียกภายใน Transaction ของผู้เรียก หลังเขียนเสร็จ)
+# HTML ที่ Cache ไว้ตาม version เดิม (ดู templating.py) จึงไม่ถูกใช้อีก และสร้างเอกสารใน product_documents ใหม่
+def touch_product(cursor, product_id: int):
+    cursor.execute("UPDATE products SET version = version + 1 WHERE product_id = %s", (product_id,))
+    product_document.rebuild_product_document(cursor, product_id)
 
 # 🖼️ CREATE: Insert Product Image และ Return ที่เพิ่ง Insert
 def create_product_image(image):
     conn = get_connection()
     with conn.cursor() as cursor:
-        # ถ้าเป็นภาพ primary ให้รีเซ็ตภาพ primary เดิมก่อน
-        if image.is_primary:
-            cursor.execute(
-                "UPDATE product_images SET is_primary = 0 WHERE product_id = %s", 
-                (image.product_id,)
-            )
-        
         # 💾 Insert Product Image
         sql = """
             INSERT INTO product_images (
-                product_id, image_url, image_type, sort_order, 
-                is_primary, file_size, file_type, created_at, updated_at
+                product_id, image_url, blob_sha256, image_type, sort_order, 
+                file_size, file_type, created_at, updated_at
             )
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
@@ -32,39 +36,138 @@ def create_product_image(image):
         else:
             next_order = image.sort_order
             
+        # 🔗 เพิ่มจำนวนการอ้างอิงไฟล์ (Transaction เดียวกับการ Insert รูป)
+        if image.blob_sha256:
+            cursor.execute(
+                """
+                INSERT INTO image_blobs (sha256, image_url, file_size, file_type, ref_count)
+                VALUES (%s, %s, %s, %s, 1)
+                ON DUPLICATE KEY UPDATE ref_count = ref_count + 1, released_at = NULL
+                """,
+                (image.blob_sha256, image.image_url, image.file_size, image.file_type)
+            )
+            
         cursor.execute(sql, (
             image.product_id,
             image.image_url,
+            image.blob_sha256,
             image.image_type,
             next_order,
-            image.is_primary,
             image.file_size,
             image.file_type,
             now,
             now
         ))
+        image_id = cursor.lastrowid
+        
+        # ⭐ ถ้าเป็นภาพ primary ให้ชี้รูปหลักของสินค้ามาที่รูปนี้ (เขียนแถวเดียว)
+        if image.is_primary:
+            cursor.execute(
+                "UPDATE products SET primary_image_id = %s WHERE product_id = %s",
+                (image_id, image.product_id)
+            )
+        touch_product(cursor, image.product_id)
         conn.commit()
+        catalog_cache.bump_version()
         
         # 🔍 ดึงข้อมูลที่เพิ่ง Insert มาเพื่อตอบกลับ
-        image_id = cursor.lastrowid
-        cursor.execute("SELECT * FROM product_images WHERE image_id = %s", (image_id,))
+        cursor.execute(f"{PRODUCT_IMAGE_SELECT} WHERE pi.image_id = %s", (image_id,))
         new_image = cursor.fetchone()
 
     conn.close()
     return new_image
 
 
-# 🖼️ READ: Select Product Images ของสินค้าหนึ่ง ๆ
+# 🖼️ CREATE: Insert รูปภาพหลายรูปของสินค้าเดียวกันด้วย INSERT เดียว และ Return แถวที่เพิ่ง Insert (เรียงตาม sort_order)
+# รูปใหม่ต่อท้ายรูปเดิมตามลำดับใน list และถ้าสินค้ายังไม่มีรูปหลัก รูปแรกจะเป็นรูปหลัก
+def create_product_images(product_id: int, images: list):
+    if not images:
+        return []
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            # 🔒 ล็อกรูปของสินค้านี้ไว้ เพื่อให้ sort_order ไม่ชนกับการอัปโหลดพร้อมกัน
+            cursor.execute(
+                "SELECT COALESCE(MAX(sort_order), 0) AS max_order FROM product_images WHERE product_id = %s FOR UPDATE",
+                (product_id,)
+            )
+            max_order = cursor.fetchone()['max_order']
+            now = datetime.now()
+
+            rows = [
+                (
+                    product_id, image.image_url, image.blob_sha256, image.image_type,
+                    max_order + idx + 1, image.file_size, image.file_type, now, now
+                )
+                for idx, image in enumerate(images)
+            ]
+
+            # 🔗 เพิ่มจำนวนการอ้างอิงไฟล์ (ไฟล์ซ้ำกันใน batch เดียวกันจะถูกนับตามจำนวนครั้ง)
+            blobs = [
+                (image.blob_sha256, image.image_url, image.file_size, image.file_type)
+                for image in images if image.blob_sha256
+            ]
+            if blobs:
+                cursor.execute(
+                    f"""
+                    INSERT INTO image_blobs (sha256, image_url, file_size, file_type, ref_count)
+                    VALUES {', '.join(['(%s, %s, %s, %s, 1)'] * len(blobs))}
+                    ON DUPLICATE KEY UPDATE ref_count = ref_count + 1, released_at = NULL
+                    """,
+                    [value for blob in blobs for value in blob]
+                )
+
+            # 💾 Multi-row INSERT
+            cursor.execute(
+                f"""
+                INSERT INTO product_images (
+                    product_id, image_url, blob_sha256, image_type, sort_order,
+                    file_size, file_type, created_at, updated_at
+                )
+                VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(rows))}
+                """,
+                [value for row in rows for value in row]
+            )
+
+            # ⭐ ถ้ายังไม่มีรูปหลัก ให้รูปแรกของ batch เป็นรูปหลัก (LAST_INSERT_ID() คือ ID ของแถวแรกใน Multi-row INSERT)
+            cursor.execute(
+                "UPDATE products SET primary_image_id = LAST_INSERT_ID() WHERE product_id = %s AND primary_image_id IS NULL",
+                (product_id,)
+            )
+            touch_product(cursor, product_id)
+
+            cursor.execute(
+                f"{PRODUCT_IMAGE_SELECT} WHERE pi.product_id = %s AND pi.sort_order > %s ORDER BY pi.sort_order",
+                (product_id, max_order)
+            )
+            new_images = cursor.fetchall()
+        conn.commit()
+        catalog_cache.bump_version()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return new_images
+
+
+# 🖼️ READ: Select Product Images ของสินค้าหนึ่ง ๆ (Request ที่ขอสินค้าเดียวกันพร้อมกันใช้ Query เดียว)
+# อาจได้ผลของ Query ที่เริ่มก่อนการเขียนที่เพิ่ง commit หลังการเขียนหรือเมื่อ Cache ตาม version ให้ใช้ load_product_images
+@single_flight
 def get_product_images(product_id: int):
+    return load_product_images(product_id)
+
+
+# 🖼️ READ: Select Product Images ของสินค้าหนึ่ง ๆ จากฐานข้อมูลทุกครั้ง (ไม่ใช้ผลร่วมกับ Request อื่น)
+def load_product_images(product_id: int):
     conn = get_connection()
     with conn.cursor() as cursor:
-        sql = """
-            SELECT * FROM product_images 
-            WHERE product_id = %s
-            ORDER BY sort_order
-        """
+        sql = f"{PRODUCT_IMAGE_SELECT} WHERE pi.product_id = %s ORDER BY pi.sort_order"
         cursor.execute(sql, (product_id,))
         images = cursor.fetchall()
+        attach_variants(cursor, images)
 
     conn.close()
     return images
@@ -74,14 +177,81 @@ def get_product_images(product_id: int):
 def get_product_image_by_id(image_id: int):
     conn = get_connection()
     with conn.cursor() as cursor:
-        sql = "SELECT * FROM product_images WHERE image_id = %s"
+        sql = f"{PRODUCT_IMAGE_SELECT} WHERE pi.image_id = %s"
         cursor.execute(sql, (image_id,))
         image = cursor.fetchone()
+        attach_variants(cursor, [image])
 
     conn.close()
     return image
 
 
+# 🖼️ READ: ไฟล์ทุก Format ของรูปย่อยหนึ่งขนาด คืนค่า {file_type: image_url}
+# variant "original" จะรวมไฟล์ต้นฉบับจากตาราง product_images ด้วย
+def get_variant_files(image_id: int, variant: str):
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT file_type, image_url FROM product_image_variants WHERE image_id = %s AND variant = %s",
+            (image_id, variant)
+        )
+        files = {row['file_type']: row['image_url'] for row in cursor.fetchall()}
+
+        if variant == "original":
+            cursor.execute("SELECT file_type, image_url FROM product_images WHERE image_id = %s", (image_id,))
+            image = cursor.fetchone()
+            if image:
+                files.setdefault(image['file_type'], image['image_url'])
+
+    conn.close()
+    return files
+
+
+# 🖼️ READ: หารูปย่อยที่สร้างไว้แล้วซึ่งมีความกว้างและชนิดไฟล์ตรงกับที่ขอ
+def get_image_variant_by_width(image_id: int, width: int, file_type: str):
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        sql = """
+            SELECT * FROM product_image_variants
+            WHERE image_id = %s AND width = %s AND file_type = %s
+            LIMIT 1
+        """
+        cursor.execute(sql, (image_id, width, file_type))
+        variant = cursor.fetchone()
+
+    conn.close()
+    return variant
+
+
+# 🖼️ CREATE: บันทึกข้อมูลรูปย่อยที่สร้างเสร็จแล้ว (สร้างซ้ำได้ จะอัปเดตแถวเดิม)
+def save_image_variants(image_id: int, variants: list):
+    if not variants:
+        return
+
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        sql = """
+            INSERT INTO product_image_variants (image_id, variant, image_url, width, height, file_size, file_type)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                image_url = VALUES(image_url), width = VALUES(width),
+                height = VALUES(height), file_size = VALUES(file_size)
+        """
+        # รูปอาจถูกลบไปแล้วระหว่างที่กำลังสร้างรูปย่อย จึงเลือกเฉพาะรูปที่ยังอยู่
+        cursor.execute("SELECT product_id FROM product_images WHERE image_id = %s", (image_id,))
+        image = cursor.fetchone()
+        if image:
+            cursor.executemany(sql, [
+                (image_id, v['variant'], v['image_url'], v['width'], v['height'], v['file_size'], v['file_type'])
+                for v in variants
+            ])
+            touch_product(cursor, image['product_id'])
+            conn.commit()
+            catalog_cache.bump_version()
+
+    conn.close()
+
+
 # 🖼️ UPDATE: แก้ไขข้อมูล Product Image
 def update_product_image(image_id: int, image_data):
     conn = get_connection()
@@ -93,32 +263,38 @@ def update_product_image(image_id: int, image_data):
         if not current_image:
             conn.close()
             return None
-            
-        # ถ้าต้องการตั้งเป็นรูปหลัก ให้รีเซ็ตรูปอื่นก่อน
-        if image_data.is_primary:
-            cursor.execute(
-                "UPDATE product_images SET is_primary = 0 WHERE product_id = %s", 
-                (current_image['product_id'],)
-            )
         
         # 🔄 Update image
         sql = """
             UPDATE product_images 
-            SET image_type = %s, sort_order = %s, is_primary = %s, updated_at = %s
+            SET image_type = %s, sort_order = %s, updated_at = %s
             WHERE image_id = %s
         """
         now = datetime.now()
         cursor.execute(sql, (
             image_data.image_type if image_data.image_type is not None else current_image['image_type'],
             image_data.sort_order if image_data.sort_order is not None else current_image['sort_order'],
-            image_data.is_primary if image_data.is_primary is not None else current_image['is_primary'],
             now,
             image_id
         ))
+        
+        # ⭐ ตั้ง/ยกเลิกรูปหลัก ด้วยการเขียน products.primary_image_id แถวเดียว
+        if image_data.is_primary:
+            cursor.execute(
+                "UPDATE products SET primary_image_id = %s WHERE product_id = %s",
+                (image_id, current_image['product_id'])
+            )
+        elif image_data.is_primary is not None:
+            cursor.execute(
+                "UPDATE products SET primary_image_id = NULL WHERE product_id = %s AND primary_image_id = %s",
+                (current_image['product_id'], image_id)
+            )
+        touch_product(cursor, current_image['product_id'])
         conn.commit()
+        catalog_cache.bump_version()
         
         # 🔍 ดึงข้อมูลที่ถูก Update มาเพื่อตอบกลับ
-        cursor.execute("SELECT * FROM product_images WHERE image_id = %s", (image_id,))
+        cursor.execute(f"{PRODUCT_IMAGE_SELECT} WHERE pi.image_id = %s", (image_id,))
         updated_image = cursor.fetchone()
 
     conn.close()
@@ -129,21 +305,17 @@ def update_product_image(image_id: int, image_data):
 def set_primary_image(image_id: int, product_id: int):
     conn = get_connection()
     with conn.cursor() as cursor:
-        # รีเซ็ตรูปหลักเดิมก่อน
+        # ⭐ เปลี่ยนตัวชี้รูปหลักของสินค้า (เขียนแถวเดียว ไม่ต้องรีเซ็ตรูปอื่นทั้งหมด)
         cursor.execute(
-            "UPDATE product_images SET is_primary = 0 WHERE product_id = %s", 
-            (product_id,)
-        )
-        
-        # ตั้งรูปใหม่เป็นรูปหลัก
-        cursor.execute(
-            "UPDATE product_images SET is_primary = 1, updated_at = %s WHERE image_id = %s", 
-            (datetime.now(), image_id)
+            "UPDATE products SET primary_image_id = %s WHERE product_id = %s",
+            (image_id, product_id)
         )
+        touch_product(cursor, product_id)
         conn.commit()
+        catalog_cache.bump_version()
         
         # 🔍 ดึงข้อมูลที่ถูก Update มาเพื่อตอบกลับ
-        cursor.execute("SELECT * FROM product_images WHERE image_id = %s", (image_id,))
+        cursor.execute(f"{PRODUCT_IMAGE_SELECT} WHERE pi.image_id = %s", (image_id,))
         updated_image = cursor.fetchone()
 
     conn.close()
@@ -168,56 +340,279 @@ def reorder_images(product_id: int, image_ids_order: list):
             conn.close()
             return False
             
-        # อัปเดตลำดับ
-        now = datetime.now()
-        for idx, image_id in enumerate(image_ids_order, 1):  # เริ่มจาก 1
-            cursor.execute(
-                "UPDATE product_images SET sort_order = %s, updated_at = %s WHERE image_id = %s", 
-                (idx, now, image_id)
-            )
+        # อัปเดตลำดับทุกรูปด้วย UPDATE เดียว (CASE image_id WHEN ... THEN ลำดับใหม่ โดยเริ่มจาก 1)
+        cases = ' '.join(['WHEN %s THEN %s'] * len(image_ids_order))
+        sql = f"""
+            UPDATE product_images
+            SET sort_order = CASE image_id {cases} END, updated_at = %s
+            WHERE product_id = %s AND image_id IN ({placeholders})
+        """
+        order_params = [value for idx, image_id in enumerate(image_ids_order, 1) for value in (image_id, idx)]
+        cursor.execute(sql, order_params + [datetime.now(), product_id] + image_ids_order)
+        touch_product(cursor, product_id)
         
         conn.commit()
+        catalog_cache.bump_version()
         
         # 🔍 ดึงข้อมูลรูปภาพทั้งหมดของสินค้านี้มาเพื่อตอบกลับ
         cursor.execute(
-            "SELECT * FROM product_images WHERE product_id = %s ORDER BY sort_order", 
+            f"{PRODUCT_IMAGE_SELECT} WHERE pi.product_id = %s ORDER BY pi.sort_order", 
             (product_id,)
         )
         images = cursor.fetchall()
+        attach_variants(cursor, images)
 
     conn.close()
     return images
 
 
+# 🔗 ลดจำนวนการอ้างอิงไฟล์ของรูปที่กำลังจะถูกลบ (เรียกภายใน Transaction ของผู้เรียก)
+# Blob ที่ไม่มีรูปไหนอ้างถึงแล้วถูกบันทึก released_at ไว้ให้ Janitor ลบไฟล์ทีหลัง (ดู purge_released_blob)
+# เพราะการอัปโหลดเนื้อหาเดียวกันที่กำลังทำอยู่อาจใช้ไฟล์เดิมต่อ
+# คืนค่า list ของ image_url ของรูปเดิมที่ไม่ได้ใช้ไฟล์ร่วม ซึ่งผู้เรียกต้องลบไฟล์ออกจากดิสก์หลัง commit
+def release_image_blobs(cursor, images):
+    orphaned_urls = []
+    released = {}
+    for image in images:
+        if image.get('blob_sha256'):
+            released[image['blob_sha256']] = released.get(image['blob_sha256'], 0) + 1
+        else:
+            # รูปที่อัปโหลดก่อนมีตาราง image_blobs ไม่ได้ใช้ไฟล์ร่วมกับรูปอื่น
+            orphaned_urls.append(image['image_url'])
+
+    for sha256, count in released.items():
+        cursor.execute("SELECT ref_count FROM image_blobs WHERE sha256 = %s FOR UPDATE", (sha256,))
+        blob = cursor.fetchone()
+        if not blob:
+            continue
+
+        if blob['ref_count'] <= count:
+            cursor.execute(
+                "UPDATE image_blobs SET ref_count = 0, released_at = %s WHERE sha256 = %s",
+                (datetime.now(), sha256)
+            )
+        else:
+            cursor.execute("UPDATE image_blobs SET ref_count = ref_count - %s WHERE sha256 = %s", (count, sha256))
+
+    return orphaned_urls
+
+
+# 🔗 READ: sha256 ของ Blob ที่ไม่มีรูปไหนอ้างถึงตั้งแต่ก่อน released_before
+def list_released_blobs(released_before: datetime, limit: int = 100):
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT sha256 FROM image_blobs
+            WHERE ref_count = 0 AND released_at < %s
+            ORDER BY released_at LIMIT %s
+            """,
+            (released_before, limit)
+        )
+        rows = cursor.fetchall()
+
+    conn.close()
+    return [row['sha256'] for row in rows]
+
+
+# 🔗 DELETE: ลบ Blob ที่ยังไม่มีรูปไหนอ้างถึง โดยเรียก delete_files(image_url, released_at) ขณะถือ Lock ของแถว
+# การอัปโหลดที่ใช้ไฟล์เดียวกันต้องรอ Lock นี้ก่อนเพิ่ม ref_count จึงไม่มีรูปใหม่ที่ชี้ไปยังไฟล์ที่ถูกลบ
+# ถ้า delete_files คืน False (ไฟล์ถูกเขียนใหม่) จะเก็บแถวไว้และนับเวลาใหม่ คืนค่า True ถ้าลบแล้ว
+def purge_released_blob(sha256: str, released_before: datetime, delete_files):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT image_url, released_at FROM image_blobs
+                WHERE sha256 = %s AND ref_count = 0 AND released_at < %s
+                FOR UPDATE
+                """,
+                (sha256, released_before)
+            )
+            blob = cursor.fetchone()
+            if not blob:
+                conn.rollback()
+                return False  # ถูกใช้ใหม่หรือ Worker อื่นลบไปแล้ว
+
+            purged = delete_files(blob['image_url'], blob['released_at'])
+            if purged:
+                cursor.execute("DELETE FROM image_blobs WHERE sha256 = %s", (sha256,))
+            else:
+                cursor.execute("UPDATE image_blobs SET released_at = %s WHERE sha256 = %s", (datetime.now(), sha256))
+        conn.commit()
+        return purged
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# 🖼️ CREATE: คัดลอกรูปย่อยจากรูปอื่นที่ใช้ไฟล์เดียวกัน (ไม่ต้องสร้างรูปย่อยซ้ำ) คืนจำนวนแถวที่คัดลอก
+def copy_blob_variants(image_id: int):
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        sql = """
+            INSERT IGNORE INTO product_image_variants (image_id, variant, image_url, width, height, file_size, file_type)
+            SELECT pi.image_id, v.variant, v.image_url, v.width, v.height, v.file_size, v.file_type
+            FROM product_images pi
+            JOIN product_images other ON other.blob_sha256 = pi.blob_sha256 AND other.image_id <> pi.image_id
+            JOIN product_image_variants v ON v.image_id = other.image_id
+            WHERE pi.image_id = %s
+        """
+        cursor.execute(sql, (image_id,))
+        copied = cursor.rowcount
+        if copied:
+            cursor.execute("SELECT product_id FROM product_images WHERE image_id = %s", (image_id,))
+            touch_product(cursor, cursor.fetchone()['product_id'])
+        conn.commit()
+        catalog_cache.bump_version()
+
+    conn.close()
+    return copied
+
+
+# 🔀 ตารางที่เก็บ URL ของไฟล์รูป (ใช้ตอนย้ายไฟล์ไปโครงสร้างโฟลเดอร์ ab/cd)
+IMAGE_URL_TABLES = ("product_images", "product_image_variants", "image_blobs")
+# URL ที่ย้ายแล้วมีรูปแบบ /uploads/products/ab/cd/<name> หรือ /uploads/products/variants/ab/cd/<name>
+SHARDED_URL_PATTERNS = ("/uploads/products/__/__/%", "/uploads/products/variants/__/__/%")
+
+
+# 🔀 READ: URL ของไฟล์รูปที่ยังอยู่ในโครงสร้างแบบแบน (รวมทุกตาราง ไม่ซ้ำกัน)
+def get_unsharded_image_urls(limit: int):
+    not_sharded = " AND ".join(["image_url NOT LIKE %s"] * len(SHARDED_URL_PATTERNS))
+    union = " UNION ".join(
+        f"SELECT image_url FROM {table} WHERE image_url LIKE '/uploads/products/%%' AND {not_sharded}"
+        for table in IMAGE_URL_TABLES
+    )
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT image_url FROM ({union}) AS urls LIMIT %s", SHARDED_URL_PATTERNS * len(IMAGE_URL_TABLES) + (limit,))
+        urls = [row['image_url'] for row in cursor.fetchall()]
+
+    conn.close()
+    return urls
+
+
+# 🔀 UPDATE: เปลี่ยน URL เดิมเป็น URL ใหม่ในทุกตาราง ({old_url: new_url}) ใน Transaction เดียว
+def rewrite_image_urls(url_map: dict):
+    if not url_map:
+        return 0
+
+    updated = 0
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            for table in IMAGE_URL_TABLES:
+                cursor.executemany(
+                    f"UPDATE {table} SET image_url = %s WHERE image_url = %s",
+                    [(new_url, old_url) for old_url, new_url in url_map.items()]
+                )
+                updated += cursor.rowcount
+
+            # เอกสารของสินค้าที่มีรูปใช้ URL เหล่านี้ต้องสร้างใหม่
+            new_urls = list(url_map.values())
+            placeholders = ', '.join(['%s'] * len(new_urls))
+            cursor.execute(
+                f"""
+                SELECT product_id FROM product_images WHERE image_url IN ({placeholders})
+                UNION
+                SELECT pi.product_id FROM product_image_variants v
+                JOIN product_images pi ON pi.image_id = v.image_id
+                WHERE v.image_url IN ({placeholders})
+                """,
+                new_urls + new_urls
+            )
+            for row in cursor.fetchall():
+                touch_product(cursor, row['product_id'])
+        conn.commit()
+        catalog_cache.bump_version()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return updated
+
+
+# ⭐ ตรวจว่าตารางมีคอลัมน์นี้หรือยัง (ใช้ตอนอัปเกรดฐานข้อมูลเดิม)
+def _column_exists(cursor, table: str, column: str):
+    cursor.execute(
+        """
+        SELECT COUNT(*) AS count FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """,
+        (table, column)
+    )
+    return cursor.fetchone()['count'] > 0
+
+
+# ⭐ UPDATE: ย้ายรูปหลักของฐานข้อมูลเดิมจาก product_images.is_primary ไปเป็น products.primary_image_id
+# คัดลอกรูปหลักและ commit ก่อนลบคอลัมน์ is_primary เสมอ (ALTER TABLE commit เองทันที) รันซ้ำได้
+# คืนจำนวนสินค้าที่ได้รูปหลักจากคอลัมน์เดิม (0 ถ้าย้ายไปแล้ว)
+def migrate_primary_images():
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            if not _column_exists(cursor, 'products', 'primary_image_id'):
+                cursor.execute("ALTER TABLE products ADD COLUMN primary_image_id INT NULL AFTER stock_quantity")
+
+            if not _column_exists(cursor, 'product_images', 'is_primary'):
+                return 0
+
+            cursor.execute(
+                """
+                UPDATE products p
+                JOIN product_images pi ON pi.product_id = p.product_id AND pi.is_primary = 1
+                SET p.primary_image_id = pi.image_id
+                """
+            )
+            migrated = cursor.rowcount
+            conn.commit()
+
+            cursor.execute("ALTER TABLE product_images DROP COLUMN is_primary")
+        catalog_cache.bump_version()
+    finally:
+        conn.close()
+    return migrated
+
+
 # 🖼️ DELETE: ลบรูปภาพ
+# คืนค่า None ถ้าไม่พบรูป ไม่งั้นคืน list ของ URL ไฟล์ที่ไม่มีรูปไหนใช้แล้ว (ให้ผู้เรียกลบออกจากดิสก์)
 def delete_product_image(image_id: int):
     conn = get_connection()
     with conn.cursor() as cursor:
         # ตรวจสอบว่ามีภาพนี้หรือไม่
-        cursor.execute("SELECT * FROM product_images WHERE image_id = %s", (image_id,))
+        cursor.execute("SELECT * FROM product_images WHERE image_id = %s FOR UPDATE", (image_id,))
         image = cursor.fetchone()
         
         if not image:
+            conn.rollback()
             conn.close()
-            return False
+            return None
             
-        # ❌ ลบภาพ
+        # ❌ ลบภาพ และลดจำนวนการอ้างอิงไฟล์ใน Transaction เดียวกัน
         cursor.execute("DELETE FROM product_images WHERE image_id = %s", (image_id,))
-        conn.commit()
+        orphaned_urls = release_image_blobs(cursor, [image])
         
-        # ตรวจสอบว่าถ้าภาพที่ลบเป็นภาพหลัก ให้กำหนดภาพหลักใหม่
-        if image['is_primary']:
-            cursor.execute(
-                """
-                UPDATE product_images 
-                SET is_primary = 1, updated_at = %s
+        # ถ้าภาพที่ลบเป็นภาพหลัก ให้ภาพแรกตามลำดับที่เหลืออยู่เป็นภาพหลักแทน
+        cursor.execute(
+            """
+            UPDATE products
+            SET primary_image_id = (
+                SELECT image_id FROM product_images
                 WHERE product_id = %s
                 ORDER BY sort_order
                 LIMIT 1
-                """, 
-                (datetime.now(), image['product_id'])
             )
-            conn.commit()
+            WHERE product_id = %s AND primary_image_id = %s
+            """, 
+            (image['product_id'], image['product_id'], image_id)
+        )
+        touch_product(cursor, image['product_id'])
+        conn.commit()
+        catalog_cache.bump_version()
 
     conn.close()
-    return True
\ No newline at end of file
+    return orphaned_urls
@@ -1,9 +1,43 @@
 from database import get_connection
+from cache import TTLCache
 from passlib.context import CryptContext
+from concurrent.futures import ProcessPoolExecutor
+import pymysql
+import os
+import threading
 
 # ใช้ bcrypt ในการ Hash Password
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# 🔑 Field ที่มี UNIQUE Constraint ในตาราง users
+UNIQUE_USER_FIELDS = ('username', 'email', 'phone')
+MYSQL_DUPLICATE_ENTRY = 1062
+
+# 🪪 Cache ตัวตนของผู้ใช้ที่ Login (username → user_id, role) ลดการ Query ตาราง users ทุก Request
+IDENTITY_CACHE_TTL = float(os.environ.get('IDENTITY_CACHE_TTL', 60))
+IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 10000))
+_identity_cache = TTLCache(maxsize=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL)
+
+
+class DuplicateUserError(ValueError):
+    """ ⚠️ ข้อมูลซ้ำกับ UNIQUE Constraint ของตาราง users (field บอกว่าซ้ำที่คอลัมน์ไหน) """
+    def __init__(self, field: str):
+        self.field = field
+        super().__init__(f"{field.capitalize()} already registered")
+
+
+def _translate_integrity_error(error: pymysql.err.IntegrityError):
+    """ 🔄 แปลง IntegrityError จาก MySQL เป็น Error ที่ Router ใช้งานได้ """
+    code = error.args[0] if error.args else None
+    message = error.args[1] if len(error.args) > 1 else str(error)
+
+    if code == MYSQL_DUPLICATE_ENTRY:
+        # MySQL 5.7: "... for key 'email'" / MySQL 8: "... for key 'users.email'"
+        key = message.rsplit("for key ", 1)[-1].strip("'`").split(".")[-1]
+        return DuplicateUserError(key if key in UNIQUE_USER_FIELDS else "user")
+
+    return ValueError(message)
+
 def hash_password(password: str):
     """ 🔒 แปลงรหัสผ่านเป็น Hash ก่อนบันทึก """
     return pwd_context.hash(password)
@@ -12,6 +46,25 @@ def verify_password(plain_password, hashed_password):
     """ 🔍 ตรวจสอบรหัสผ่านที่ผู้ใช้กรอกกับ Hash ในฐานข้อมูล """
     return pwd_context.verify(plain_password, hashed_password)
 
+# 🧵 Process Pool สำหรับ Hash Password จำนวนมาก (bcrypt ใช้ CPU หนัก จึงกระจายไปทุก Core)
+PASSWORD_HASH_PROCESSES = int(os.environ.get('PASSWORD_HASH_PROCESSES', os.cpu_count() or 1))
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+def _get_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_PROCESSES)
+    return _hash_pool
+
+def hash_passwords(passwords: list):
+    """ 🔒 Hash Password หลายรายการพร้อมกันใน Process Pool (ลำดับผลลัพธ์ตรงกับลำดับที่ส่งเข้า) """
+    if not passwords:
+        return []
+    chunksize = max(1, len(passwords) // (PASSWORD_HASH_PROCESSES * 4))
+    return list(_get_hash_pool().map(hash_password, passwords, chunksize=chunksize))
+
 # 🚀 CREATE: Insert User และ Return User ที่เพิ่ง Insert
 def create_user(user):
     conn = get_connection()
@@ -21,16 +74,22 @@ def create_user(user):
             INSERT INTO users (first_name, last_name, email, phone, address, username, password, role)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """
-        cursor.execute(sql, (
-            user.first_name,
-            user.last_name,
-            user.email,
-            user.phone,
-            user.address,
-            user.username,
-            hash_password(user.password),  # 🔒 Hash Password ก่อนเก็บลงฐานข้อมูล
-            user.role
-        ))
+        try:
+            # ให้ UNIQUE Constraint ของฐานข้อมูลเป็นตัวตรวจข้อมูลซ้ำ (ไม่ต้อง SELECT ก่อน และไม่มี Race Condition)
+            cursor.execute(sql, (
+                user.first_name,
+                user.last_name,
+                user.email,
+                user.phone,
+                user.address,
+                user.username,
+                hash_password(user.password),  # 🔒 Hash Password ก่อนเก็บลงฐานข้อมูล
+                user.role
+            ))
+        except pymysql.err.IntegrityError as e:
+            conn.rollback()
+            conn.close()
+            raise _translate_integrity_error(e) from e
         conn.commit()
         
         # 🔍 ดึงข้อมูล User ที่เพิ่ง Insert มาเพื่อตอบกลับ
@@ -44,21 +103,125 @@ def create_user(user):
     conn.close()
     return new_user  # 🔥 Return ครบทุก Field
 
-# 🚀 READ: Select Users ทั้งหมด
-def get_users():
+# 📋 คอลัมน์สำหรับแสดงรายการผู้ใช้ (ไม่ดึง password และคำนวณ full_name ใน SQL)
+USER_LIST_COLUMNS = """
+    user_id, first_name, last_name, CONCAT(first_name, ' ', last_name) AS full_name,
+    email, phone, address, username, role, created_at
+"""
+
+def _escape_like(value: str):
+    """ 🔒 Escape อักขระพิเศษของ LIKE เพื่อให้ค้นหาแบบ Prefix ตามตัวอักษรจริง """
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# 🚀 READ: Select Users แบบแบ่งหน้า (Keyset Pagination ด้วย user_id) และค้นหาด้วย Prefix ของ username/email
+def list_users(limit: int = 50, after_id: int = None, search: str = None):
+    after_id = after_id or 0
     conn = get_connection()
     with conn.cursor() as cursor:
-        sql = "SELECT * FROM users"
-        cursor.execute(sql)
+        if search:
+            # แยกเป็น 2 Query เพื่อให้แต่ละฝั่งใช้ UNIQUE Index ของ username และ email ได้เต็มที่
+            prefix = _escape_like(search) + '%'
+            sql = f"""
+                (SELECT {USER_LIST_COLUMNS} FROM users
+                 WHERE username LIKE %s AND user_id > %s ORDER BY user_id LIMIT %s)
+                UNION
+                (SELECT {USER_LIST_COLUMNS} FROM users
+                 WHERE email LIKE %s AND user_id > %s ORDER BY user_id LIMIT %s)
+                ORDER BY user_id
+                LIMIT %s
+            """
+            cursor.execute(sql, (prefix, after_id, limit, prefix, after_id, limit, limit))
+        else:
+            sql = f"SELECT {USER_LIST_COLUMNS} FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s"
+            cursor.execute(sql, (after_id, limit))
         users = cursor.fetchall()
-        
-        # 🔥 คำนวณ full_name ในระดับ Model
-        for user in users:
-            user['full_name'] = f"{user['first_name']} {user['last_name']}"
 
     conn.close()
     return users
 
+# 🚀 CREATE: Insert Users จำนวนมากในครั้งเดียว (ใช้กับการนำเข้าผู้ใช้)
+# rows คือ list ของ (row_number, user) → คืนค่า (จำนวนที่เพิ่มสำเร็จ, รายการ error แยกตามแถว)
+def bulk_create_users(rows: list):
+    errors = []
+
+    # 1. ตัดแถวที่ข้อมูล UNIQUE ซ้ำกันเองภายในไฟล์ (เทียบแบบไม่สนตัวพิมพ์ตาม Collation ของตาราง)
+    seen = {field: set() for field in UNIQUE_USER_FIELDS}
+    candidates = []
+    for row_number, user in rows:
+        values = {field: (getattr(user, field) or '').lower() for field in UNIQUE_USER_FIELDS}
+        duplicate = next((field for field in UNIQUE_USER_FIELDS if values[field] and values[field] in seen[field]), None)
+        if duplicate:
+            errors.append({"row": row_number, "field": duplicate, "detail": f"{duplicate.capitalize()} duplicated in import file"})
+            continue
+        for field in UNIQUE_USER_FIELDS:
+            if values[field]:
+                seen[field].add(values[field])
+        candidates.append((row_number, user))
+
+    if not candidates:
+        return 0, errors
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            # 2. ตัดแถวที่ซ้ำกับข้อมูลในฐานข้อมูล (1 Query ต่อคอลัมน์ ใช้ UNIQUE Index)
+            existing = {}
+            for field in UNIQUE_USER_FIELDS:
+                values = list(seen[field])
+                if not values:
+                    existing[field] = set()
+                    continue
+                placeholders = ', '.join(['%s'] * len(values))
+                cursor.execute(f"SELECT {field} FROM users WHERE {field} IN ({placeholders})", values)
+                existing[field] = {row[field].lower() for row in cursor.fetchall()}
+
+            pending = []
+            for row_number, user in candidates:
+                duplicate = next(
+                    (field for field in UNIQUE_USER_FIELDS
+                     if getattr(user, field) and getattr(user, field).lower() in existing[field]),
+                    None
+                )
+                if duplicate:
+                    errors.append({"row": row_number, "field": duplicate, "detail": f"{duplicate.capitalize()} already registered"})
+                else:
+                    pending.append((row_number, user))
+
+            # 3. Hash Password เฉพาะแถวที่จะ Insert จริง กระจายไปใน Process Pool
+            hashed_passwords = hash_passwords([user.password for _, user in pending])
+            values = [
+                (user.first_name, user.last_name, user.email, user.phone, user.address, user.username, hashed, 'user')
+                for (_, user), hashed in zip(pending, hashed_passwords)
+            ]
+            sql = """
+                INSERT INTO users (first_name, last_name, email, phone, address, username, password, role)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """
+
+            # 4. Insert ทั้ง batch ใน Transaction เดียว (PyMySQL รวม executemany เป็น Multi-row INSERT)
+            try:
+                conn.begin()
+                cursor.executemany(sql, values)
+                conn.commit()
+                inserted = len(values)
+            except pymysql.err.IntegrityError:
+                # มีผู้ใช้ซ้ำถูกเพิ่มเข้ามาระหว่างนั้น → Insert ทีละแถวเพื่อรายงาน error ของแต่ละแถว
+                conn.rollback()
+                inserted = 0
+                for (row_number, _), row_values in zip(pending, values):
+                    try:
+                        cursor.execute(sql, row_values)
+                        conn.commit()
+                        inserted += 1
+                    except pymysql.err.IntegrityError as e:
+                        conn.rollback()
+                        error = _translate_integrity_error(e)
+                        errors.append({"row": row_number, "field": getattr(error, 'field', None), "detail": str(error)})
+    finally:
+        conn.close()
+
+    return inserted, errors
+
 # 🚀 READ: Select User โดยใช้ user_id
 def get_user_by_id(user_id: int):
     conn = get_connection()
@@ -88,28 +251,82 @@ def get_user_by_username(username: str):
     conn.close()
     return user
 
+# 🪪 READ: ดึงตัวตน (user_id, username, role) จาก username ผ่าน Cache (ใช้ยืนยันตัวตนทุก Request)
+def get_identity(username: str):
+    identity = _identity_cache.get(username)
+    if identity is None:
+        conn = get_connection()
+        with conn.cursor() as cursor:
+            sql = "SELECT user_id, username, role FROM users WHERE username = %s"
+            cursor.execute(sql, (username,))
+            identity = cursor.fetchone()
+
+        conn.close()
+        if not identity:
+            return None
+        _identity_cache.set(username, identity)
+
+    return dict(identity)  # คืนสำเนา เพื่อไม่ให้ผู้เรียกแก้ไขค่าใน Cache
+
+# 🪪 ล้าง Cache ตัวตนของผู้ใช้ (เรียกเมื่อข้อมูลผู้ใช้เปลี่ยนหรือถูกลบ)
+def invalidate_identity(*usernames):
+    for username in usernames:
+        if username:
+            _identity_cache.pop(username)
+
+# 🚀 READ: ตรวจสอบว่า username / email / phone ยังว่างอยู่หรือไม่ (ใช้ UNIQUE Index ทั้งหมดในคำสั่งเดียว)
+def check_availability(username: str = None, email: str = None, phone: str = None):
+    checks = {
+        field: value
+        for field, value in (('username', username), ('email', email), ('phone', phone))
+        if value
+    }
+    if not checks:
+        return {}
+
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        selects = ", ".join(
+            f"NOT EXISTS(SELECT 1 FROM users WHERE {field} = %s) AS {field}" for field in checks
+        )
+        cursor.execute(f"SELECT {selects}", list(checks.values()))
+        row = cursor.fetchone()
+
+    conn.close()
+    return {field: bool(row[field]) for field in checks}
+
 # 🚀 UPDATE: แก้ไขข้อมูล User โดยใช้ user_id
 def update_user(user_id: int, user):
     conn = get_connection()
     with conn.cursor() as cursor:
+        # username เดิมใช้ล้าง Cache ตัวตน (username อาจถูกเปลี่ยนในการอัปเดตนี้)
+        cursor.execute("SELECT username FROM users WHERE user_id = %s", (user_id,))
+        previous = cursor.fetchone()
+
         # 🔄 Update User
         sql = """
             UPDATE users 
             SET first_name = %s, last_name = %s, email = %s, phone = %s, address = %s, username = %s, password = %s, role = %s
             WHERE user_id = %s
         """
-        cursor.execute(sql, (
-            user.first_name,
-            user.last_name,
-            user.email,
-            user.phone,
-            user.address,
-            user.username,
-            hash_password(user.password),  # 🔒 Hash Password ใหม่ (ถ้ามีการอัปเดต)
-            user.role,
-            user_id
-        ))
+        try:
+            cursor.execute(sql, (
+                user.first_name,
+                user.last_name,
+                user.email,
+                user.phone,
+                user.address,
+                user.username,
+                hash_password(user.password),  # 🔒 Hash Password ใหม่ (ถ้ามีการอัปเดต)
+                user.role,
+                user_id
+            ))
+        except pymysql.err.IntegrityError as e:
+            conn.rollback()
+            conn.close()
+            raise _translate_integrity_error(e) from e
         conn.commit()
+        invalidate_identity(previous and previous['username'], user.username)
         
         # 🔍 ดึงข้อมูล User ที่ถูก Update มาเพื่อตอบกลับ
         cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
@@ -126,10 +343,14 @@ def update_user(user_id: int, user):
 def delete_user(user_id: int):
     conn = get_connection()
     with conn.cursor() as cursor:
+        cursor.execute("SELECT username FROM users WHERE user_id = %s", (user_id,))
+        previous = cursor.fetchone()
+
         # ❌ ลบ User
         sql = "DELETE FROM users WHERE user_id = %s"
         cursor.execute(sql, (user_id,))
         conn.commit()
+        invalidate_identity(previous and previous['username'])
 
         # 🔄 ตรวจสอบว่ามีการลบหรือไม่
         affected_rows = cursor.rowcount
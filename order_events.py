@@ -0,0 +1,218 @@
+# order_events.py
+"""
+📣 กระจายเหตุการณ์ของ Order (สร้างใหม่ / เปลี่ยนสถานะ) ไปยังหน้า Dashboard ของ Admin ผ่าน Server-Sent Events
+
+- models/order เรียก publish() หลัง commit (เรียกจาก Thread ใดก็ได้ เช่น Threadpool ของ Route แบบ sync)
+- Order ที่ถูก publish ใกล้ ๆ กันถูกรวมเป็นชุดเดียว และอ่านจากฐานข้อมูลครั้งเดียวต่อชุด
+  แล้วส่งผลลัพธ์เดียวกันให้ผู้ติดตาม (Admin ที่เปิดหน้า Dashboard) ทุกคน
+- ถ้าไม่มีผู้ติดตาม publish() ไม่ทำอะไรเลย
+- publish() เห็นเฉพาะ Order ที่เปลี่ยนใน Worker นี้ ระหว่างที่มีผู้ติดตาม Worker นี้จึงอ่านตัวนับ order_counters
+  (Trigger เพิ่มเมื่อสร้าง Order หรือเปลี่ยนสถานะ) ทุก ORDER_EVENTS_POLL_INTERVAL วินาที และอ่าน Order ที่ updated_at เปลี่ยน
+  เฉพาะเมื่อตัวนับเปลี่ยน (ครั้งเดียวต่อ Worker ไม่ใช่ต่อผู้ติดตาม) เพื่อรับการเปลี่ยนจาก Worker อื่นและสคริปต์
+  Order ที่ส่งไปแล้ว (สถานะและ updated_at เดิม) ไม่ถูกส่งซ้ำ
+"""
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from database import get_connection
+
+ORDER_EVENTS_QUEUE_SIZE = int(os.environ.get('ORDER_EVENTS_QUEUE_SIZE', 100))
+ORDER_EVENTS_KEEPALIVE = int(os.environ.get('ORDER_EVENTS_KEEPALIVE', 15))  # วินาที
+ORDER_EVENTS_POLL_INTERVAL = float(os.environ.get('ORDER_EVENTS_POLL_INTERVAL', 2))  # วินาที
+# updated_at ถูกกำหนดก่อน commit จึงย้อนอ่านเผื่อ Transaction ที่ commit ช้ากว่าเวลาที่บันทึก
+ORDER_EVENTS_POLL_LAG = timedelta(seconds=float(os.environ.get('ORDER_EVENTS_POLL_LAG', 5)))
+ORDER_EVENTS_POLL_LIMIT = 500
+ORDER_STATUSES = ('pending', 'completed', 'cancelled')
+
+ORDER_CREATED = "created"
+ORDER_STATUS_CHANGED = "status_changed"
+
+
+def load_orders(order_ids: list):
+    """ 🔍 อ่าน Order หลายรายการด้วย Query เดียว (เรียงจากเก่าไปใหม่ Dashboard แทรกทีละรายการไว้บนสุด อันใหม่สุดจึงอยู่บน) """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            placeholders = ', '.join(['%s'] * len(order_ids))
+            cursor.execute(
+                f"SELECT * FROM orders WHERE order_id IN ({placeholders}) ORDER BY created_at, order_id",
+                order_ids
+            )
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def load_order_changes():
+    """ 🔖 จำนวนการสร้าง/เปลี่ยนสถานะ Order ทั้งหมด (อ่าน 16 แถวของ order_counters ไม่ต้องแตะตาราง orders) """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COALESCE(SUM(changes), 0) AS changes FROM order_counters")
+            return int(cursor.fetchone()['changes'])
+    finally:
+        conn.close()
+
+
+def load_changed_orders(since: datetime):
+    """ 🔍 Order ที่ updated_at ตั้งแต่ since (ระบุทุกสถานะเพื่อให้ใช้ Index (status, updated_at) ได้) """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            placeholders = ', '.join(['%s'] * len(ORDER_STATUSES))
+            cursor.execute(
+                f"""
+                SELECT * FROM orders
+                WHERE status IN ({placeholders}) AND updated_at >= %s
+                ORDER BY updated_at, order_id LIMIT %s
+                """,
+                (*ORDER_STATUSES, since, ORDER_EVENTS_POLL_LIMIT)
+            )
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def format_sse(event: str, data: str):
+    """ 📨 จัดข้อความตามรูปแบบ text/event-stream (ข้อมูลหลายบรรทัดต้องขึ้นต้นทุกบรรทัดด้วย data:) """
+    lines = "".join(f"data: {line}\n" for line in data.splitlines() or [""])
+    return f"event: {event}\n{lines}\n"
+
+
+class OrderEventBroadcaster:
+    """ 📣 รวม Order ที่เปลี่ยน อ่านจากฐานข้อมูลครั้งเดียว แล้วส่งให้ทุกคิวของผู้ติดตาม """
+
+    def __init__(self, loader=load_orders, queue_size: int = ORDER_EVENTS_QUEUE_SIZE,
+                 poller=None, poll_interval: float = ORDER_EVENTS_POLL_INTERVAL, change_counter=None):
+        self._loader = loader
+        self._poller = poller
+        self._change_counter = change_counter  # None = อ่าน Order ที่เปลี่ยนทุกรอบ
+        self._poll_interval = poll_interval
+        self._poll_task = None
+        self._sent = {}  # order_id -> (status, updated_at) ที่ส่งไปแล้ว (เฉพาะในช่วงที่ยังย้อนอ่าน)
+        self._queue_size = queue_size
+        self._subscribers = set()
+        self._pending = {}
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+        self._loop = None
+        self._tasks = set()
+        self._metrics = {"published": 0, "batches": 0, "polls": 0, "order_loads": 0, "polled_events": 0, "dropped": 0}
+
+    def publish(self, order_id: int, event: str):
+        """ ส่งเหตุการณ์ของ Order (Thread-safe) ถ้าสร้างแล้วเปลี่ยนสถานะในชุดเดียวกันจะนับเป็นการสร้าง """
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+
+        with self._lock:
+            self._metrics["published"] += 1
+            if self._pending.get(order_id) != ORDER_CREATED:
+                self._pending[order_id] = event
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+
+        try:
+            loop.call_soon_threadsafe(self._schedule_flush)
+        except RuntimeError:
+            # Event Loop ปิดไปแล้ว (แอปกำลัง Shutdown)
+            with self._lock:
+                self._flush_scheduled = False
+
+    def _schedule_flush(self):
+        task = self._loop.create_task(self._flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flush_scheduled = False
+        if not pending or not self._subscribers:
+            return
+
+        try:
+            orders = await run_in_threadpool(self._loader, list(pending))
+        except Exception as e:
+            print(f"Error loading order events: {str(e)}")
+            return
+
+        events = [(pending[order['order_id']], order) for order in orders]
+        self._metrics["batches"] += 1
+        self._deliver(events)
+
+    async def _poll(self):
+        since = datetime.now() - ORDER_EVENTS_POLL_LAG
+        changes = None
+        while self._subscribers:
+            await asyncio.sleep(self._poll_interval)
+            started = datetime.now()
+            try:
+                self._metrics["polls"] += 1
+                if self._change_counter is not None:
+                    previous, changes = changes, await run_in_threadpool(self._change_counter)
+                    if changes == previous:
+                        # ไม่มี Order ถูกสร้าง/เปลี่ยนสถานะตั้งแต่รอบก่อน ไม่ต้องอ่านตาราง orders
+                        since = started - ORDER_EVENTS_POLL_LAG
+                        continue
+                orders = await run_in_threadpool(self._poller, since)
+            except Exception as e:
+                print(f"Error polling order events: {str(e)}")
+                continue
+
+            self._metrics["order_loads"] += 1
+            events = []
+            for order in orders:
+                if self._sent.get(order['order_id']) == (order['status'], order['updated_at']):
+                    continue
+                # Order ที่ไม่เคยส่งและสร้างภายในช่วงที่อ่าน นับเป็นการสร้าง (แม้จะเปลี่ยนสถานะแล้วก็ตาม)
+                created = order['order_id'] not in self._sent and order['created_at'] >= since
+                events.append((ORDER_CREATED if created else ORDER_STATUS_CHANGED, order))
+            self._metrics["polled_events"] += len(events)
+            self._deliver(events)
+
+            since = started - ORDER_EVENTS_POLL_LAG
+            self._sent = {
+                order_id: sent for order_id, sent in self._sent.items()
+                if sent[1] is not None and sent[1] >= since
+            }
+
+    def _deliver(self, events):
+        if not events:
+            return
+        for _, order in events:
+            self._sent[order['order_id']] = (order.get('status'), order.get('updated_at'))
+        for queue in list(self._subscribers):
+            if queue.full():
+                # ผู้ติดตามที่อ่านไม่ทัน: ทิ้งชุดที่เก่าที่สุดแทนการให้คิวโตไม่จำกัด
+                queue.get_nowait()
+                self._metrics["dropped"] += 1
+            queue.put_nowait(events)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """ 📥 คิวที่ได้รับ list ของ (event, order) ทุกครั้งที่มี Order เปลี่ยน จนกว่าจะออกจาก with """
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers.add(queue)
+        if self._poller is not None and (self._poll_task is None or self._poll_task.done()):
+            self._poll_task = self._loop.create_task(self._poll())
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+            if not self._subscribers and self._poll_task is not None:
+                self._poll_task.cancel()
+                self._poll_task = None
+
+    def stats(self):
+        """ 📊 จำนวนผู้ติดตามและสถิติสะสม """
+        return {"subscribers": len(self._subscribers), **self._metrics}
+
+
+broadcaster = OrderEventBroadcaster(poller=load_changed_orders, change_counter=load_order_changes)
+publish = broadcaster.publish
@@ -0,0 +1,24 @@
+# rebuild_product_documents.py
+"""
+📄 สร้างเอกสาร JSON ของสินค้าทุกตัวในตาราง product_documents ใหม่
+
+ใช้ครั้งแรกหลังเพิ่มตาราง product_documents ให้ฐานข้อมูลเดิม หรือหลังเปลี่ยนรูปแบบเอกสาร
+(การเขียนสินค้า รูปภาพ และสต็อกหลังจากนั้นจะสร้างเอกสารใหม่เองใน Transaction เดียวกัน):
+
+    python rebuild_product_documents.py --batch-size 200
+"""
+import argparse
+from models import product_document as document_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the precomputed catalog product documents")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    rebuilt = document_model.rebuild_all_product_documents(batch_size=args.batch_size)
+    print(f"📄 Rebuilt {rebuilt} product documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,22 @@
 # Admin product routes for template rendering
-from fastapi import APIRouter, Request, Depends, HTTPException, status, Form, File, UploadFile, Path
+from fastapi import APIRouter, Request, Depends, HTTPException, status, Form, File, UploadFile, Path, BackgroundTasks
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
 import os
-import shutil
-import uuid
-from auth import get_current_user
+from html import escape
+from auth import get_admin_identity_from_cookie
+import image_processing
+import file_uploads
+import templating
+import catalog_cache
+from templating import templates
 from database import get_connection
 from schemas import product as product_schema
 from schemas import product_image as image_schema
 from models import product as product_model
 from models import product_image as image_model
 
-# Templates setup
-templates = Jinja2Templates(directory="templates")
-
 # Router for admin products
 router = APIRouter(
     prefix="/admin/products",
@@ -26,6 +27,32 @@ router = APIRouter(
 DEFAULT_PAGE = 1
 DEFAULT_PER_PAGE = 10
 
+# Cached fragments (keyed by product_id and products.version, see templating.py)
+PRODUCT_IMAGES_TEMPLATE = "admin/products/_product_images.html"
+PRODUCT_ROW_TEMPLATE = "admin/products/_product_row.html"
+
+# Render the image gallery, reusing the cached HTML until the product or its images change
+async def render_product_images(product: dict, upload_errors: Optional[list] = None):
+    product_id = product['product_id']
+    if upload_errors:
+        # Per-request error messages are never cached
+        product_images = await run_in_threadpool(image_model.load_product_images, product_id)
+        html = templating.env.get_template(PRODUCT_IMAGES_TEMPLATE).render(
+            product=product, product_images=product_images, upload_errors=upload_errors
+        )
+        return HTMLResponse(content=html)
+    
+    # Read the version before the images so cached HTML is never older than its key
+    # (load_product_images always queries, it never joins a read that started before this request's write)
+    version = await run_in_threadpool(product_model.get_product_version, product_id)
+    html = await run_in_threadpool(
+        templating.cached_fragment,
+        PRODUCT_IMAGES_TEMPLATE,
+        (product_id, version),
+        lambda: {"product": product, "product_images": image_model.load_product_images(product_id)}
+    )
+    return HTMLResponse(content=html)
+
 # Admin product list page
 @router.get("", response_class=HTMLResponse)
 async def admin_products_list(
@@ -37,99 +64,33 @@ async def admin_products_list(
     max_price: Optional[float] = None,
     stock_status: Optional[str] = None,
     sort: Optional[str] = None,
-    reverse: bool = False
+    reverse: bool = False,
+    pagination: Optional[str] = None,
+    user: dict = Depends(get_admin_identity_from_cookie)
 ):
-    # Get connection
-    conn = get_connection()
-    
-    # Build SQL query with filters
-    sql_query = "SELECT p.*, COUNT(pi.image_id) AS image_count FROM products p "
-    sql_query += "LEFT JOIN product_images pi ON p.product_id = pi.product_id "
-    where_clauses = []
-    params = []
-    
-    # Apply search filter
-    if search:
-        where_clauses.append("(p.name LIKE %s OR p.description LIKE %s)")
-        search_param = f"%{search}%"
-        params.extend([search_param, search_param])
-    
-    # Apply price filters
-    if min_price is not None:
-        where_clauses.append("p.price >= %s")
-        params.append(min_price)
-    if max_price is not None:
-        where_clauses.append("p.price <= %s")
-        params.append(max_price)
-    
-    # Apply stock status filter
-    if stock_status:
-        if stock_status == "in_stock":
-            where_clauses.append("p.stock_quantity > 0")
-        elif stock_status == "low_stock":
-            where_clauses.append("p.stock_quantity > 0 AND p.stock_quantity < 10")
-        elif stock_status == "out_of_stock":
-            where_clauses.append("p.stock_quantity = 0")
-    
-    # Combine where clauses
-    if where_clauses:
-        sql_query += "WHERE " + " AND ".join(where_clauses) + " "
-    
-    # Group by product_id to handle the LEFT JOIN
-    sql_query += "GROUP BY p.product_id "
-    
-    # Count total products for pagination
-    count_query = f"SELECT COUNT(*) as count FROM ({sql_query}) AS filtered_products"
-    
-    # Apply sorting
-    order_column = "p.created_at"  # Default sort
-    order_dir = "DESC"
-    
-    if sort:
-        if sort == "id":
-            order_column = "p.product_id"
-        elif sort == "name":
-            order_column = "p.name"
-        elif sort == "price":
-            order_column = "p.price"
-        elif sort == "stock":
-            order_column = "p.stock_quantity"
-        elif sort == "created_at":
-            order_column = "p.created_at"
-    
-    if reverse:
-        order_dir = "ASC" if order_dir == "DESC" else "DESC"
-    
-    sql_query += f"ORDER BY {order_column} {order_dir} "
-    
-    # Apply pagination
+    # Normalize filters so equivalent requests share one cached result
+    filters = product_model.normalize_product_filters(
+        search, min_price, max_price, stock_status, sort, reverse, page, per_page, pagination
+    )
+    page, per_page, pagination = filters[-3:]
     offset = (page - 1) * per_page
-    sql_query += "LIMIT %s OFFSET %s"
-    params.extend([per_page, offset])
     
-    try:
-        with conn.cursor() as cursor:
-            # Get total count for pagination
-            cursor.execute(count_query, params[:-2] if params else [])
-            total_count = cursor.fetchone()['count']
-            
-            # Get products
-            cursor.execute(sql_query, params)
-            products = cursor.fetchall()
-            
-            # Get primary images for each product
-            for product in products:
-                cursor.execute(
-                    "SELECT * FROM product_images WHERE product_id = %s AND is_primary = 1", 
-                    (product['product_id'],)
-                )
-                primary_image = cursor.fetchone()
-                product['primary_image'] = primary_image
-    finally:
-        conn.close()
+    # Cached for a short time and invalidated by any product, image or stock write (see catalog_cache.py)
+    result = await catalog_cache.cached_search(filters, product_model.search_products)
+    total_count = result['total_count']
+    
+    # Reuse cached rows for products that haven't changed since they were last rendered
+    products = []
+    for cached_product in result['products']:
+        product = dict(cached_product)
+        key = (product['product_id'], product['version'])
+        product['row_html'] = templating.get_fragment(PRODUCT_ROW_TEMPLATE, key)
+        if product['row_html'] is None:
+            product['row_html'] = templating.render_fragment(PRODUCT_ROW_TEMPLATE, key, {"product": product})
+        products.append(product)
     
-    # Calculate pagination values
-    total_pages = (total_count + per_page - 1) // per_page
+    # Calculate pagination values ("next" pagination never counts, so there are no page numbers)
+    total_pages = (total_count + per_page - 1) // per_page if total_count is not None else None
     
     # Render template with data
     return templates.TemplateResponse(
@@ -138,6 +99,9 @@ async def admin_products_list(
             "request": request,
             "products": products,
             "total_products": total_count,
+            "total_exact": result['total_exact'],
+            "has_next": result['has_next'],
+            "pagination": pagination,
             "page": page,
             "per_page": per_page,
             "total_pages": total_pages,
@@ -149,25 +113,29 @@ async def admin_products_list(
             "sort": sort,
             "reverse": reverse,
             "active_page": "products",
-            "user": {"username": "admin", "role": "admin"}  # Temporary hardcoded user, should be from token
+            "user": user
         }
     )
 
 # Add product page
 @router.get("/add", response_class=HTMLResponse)
-async def add_product_page(request: Request):
+async def add_product_page(request: Request, user: dict = Depends(get_admin_identity_from_cookie)):
     return templates.TemplateResponse(
         "admin/products/form.html",
         {
             "request": request,
             "active_page": "products",
-            "user": {"username": "admin", "role": "admin"}  # Temporary hardcoded user, should be from token
+            "user": user
         }
     )
 
 # Edit product page
 @router.get("/edit/{product_id}", response_class=HTMLResponse)
-async def edit_product_page(request: Request, product_id: int = Path(..., gt=0)):
+async def edit_product_page(
+    request: Request,
+    product_id: int = Path(..., gt=0),
+    user: dict = Depends(get_admin_identity_from_cookie)
+):
     # Get product data
     conn = get_connection()
     
@@ -180,12 +148,13 @@ async def edit_product_page(request: Request, product_id: int = Path(..., gt=0))
             if not product:
                 return HTMLResponse(status_code=404, content="Product not found")
             
-            # Get product images
+            # Get product images (with derivative URLs)
             cursor.execute(
-                "SELECT * FROM product_images WHERE product_id = %s ORDER BY sort_order", 
+                f"{image_model.PRODUCT_IMAGE_SELECT} WHERE pi.product_id = %s ORDER BY pi.sort_order", 
                 (product_id,)
             )
             product_images = cursor.fetchall()
+            image_model.attach_variants(cursor, product_images)
     finally:
         conn.close()
     
@@ -196,7 +165,7 @@ async def edit_product_page(request: Request, product_id: int = Path(..., gt=0))
             "product": product,
             "product_images": product_images,
             "active_page": "products",
-            "user": {"username": "admin", "role": "admin"}  # Temporary hardcoded user, should be from token
+            "user": user
         }
     )
 
@@ -204,11 +173,13 @@ async def edit_product_page(request: Request, product_id: int = Path(..., gt=0))
 @router.post("", response_class=HTMLResponse)
 async def create_product(
     request: Request,
+    background_tasks: BackgroundTasks,
     name: str = Form(...),
     description: Optional[str] = Form(None),
     price: float = Form(...),
     stock_quantity: int = Form(...),
-    temp_images: Optional[List[str]] = Form(None)
+    temp_images: Optional[List[str]] = Form(None),
+    user: dict = Depends(get_admin_identity_from_cookie)
 ):
     # Validate form inputs
     validation_errors = {}
@@ -242,7 +213,7 @@ async def create_product(
                     "stock_quantity": stock_quantity
                 },
                 "active_page": "products",
-                "user": {"username": "admin", "role": "admin"}
+                "user": user
             },
             status_code=422
         )
@@ -269,58 +240,43 @@ async def create_product(
             # Ensure destination directory exists
             os.makedirs(dest_dir, exist_ok=True)
             
-            # Get connection for database operations
-            conn = get_connection()
-            
             try:
                 for idx, temp_image in enumerate(temp_images if isinstance(temp_images, list) else [temp_images]):
-                    temp_path = os.path.join(temp_dir, temp_image)
+                    temp_path = os.path.join(temp_dir, os.path.basename(temp_image))
                     
                     # Skip if file doesn't exist
                     if not os.path.exists(temp_path):
                         continue
                     
-                    # Move file from temp to permanent location
-                    dest_path = os.path.join(dest_dir, temp_image)
-                    shutil.move(temp_path, dest_path)
-                    
-                    # Determine content type based on extension
-                    file_ext = temp_image.split('.')[-1].lower()
-                    content_type = {
-                        'jpg': 'image/jpeg',
-                        'jpeg': 'image/jpeg',
-                        'png': 'image/png',
-                        'gif': 'image/gif',
-                        'webp': 'image/webp'
-                    }.get(file_ext, 'application/octet-stream')
+                    # Move file from temp to content-addressed permanent storage
+                    saved = await run_in_threadpool(file_uploads.promote_file, temp_path, dest_dir)
                     
                     # Create image data object
                     image_data = image_schema.ProductImageCreate(
                         product_id=product_id,
-                        image_url=f"/uploads/products/{temp_image}",
+                        image_url=f"/uploads/products/{saved['relative_path']}",
                         image_type=image_schema.ImageType.gallery,
                         is_primary=(idx == 0),  # First image is primary
-                        file_size=os.path.getsize(dest_path),
-                        file_type=content_type
+                        file_size=saved['file_size'],
+                        file_type=saved['file_type'],
+                        blob_sha256=saved['sha256']
                     )
                     
                     # Save to database
-                    image_model.create_product_image(image_data)
+                    new_image = image_model.create_product_image(image_data)
+                    
+                    # Generate derivatives in the background after the response is sent
+                    background_tasks.add_task(
+                        image_processing.process_uploaded_image, new_image['image_id'], new_image['image_url']
+                    )
             except Exception as e:
                 print(f"Error processing temporary images: {str(e)}")
             finally:
                 # Get all images for the product
                 try:
-                    with conn.cursor() as cursor:
-                        cursor.execute(
-                            "SELECT * FROM product_images WHERE product_id = %s ORDER BY sort_order", 
-                            (product_id,)
-                        )
-                        product_images = cursor.fetchall()
+                    product_images = image_model.load_product_images(product_id)
                 except Exception as e:
                     print(f"Error fetching product images: {str(e)}")
-                finally:
-                    conn.close()
         
         # Return success response
         return templates.TemplateResponse(
@@ -331,7 +287,7 @@ async def create_product(
                 "product_images": product_images,
                 "success": "Product created successfully!",
                 "active_page": "products",
-                "user": {"username": "admin", "role": "admin"}
+                "user": user
             }
         )
     except ValueError as ve:
@@ -348,7 +304,7 @@ async def create_product(
                     "stock_quantity": stock_quantity
                 },
                 "active_page": "products",
-                "user": {"username": "admin", "role": "admin"}
+                "user": user
             },
             status_code=422
         )
@@ -366,7 +322,7 @@ async def create_product(
                     "stock_quantity": stock_quantity
                 },
                 "active_page": "products",
-                "user": {"username": "admin", "role": "admin"}
+                "user": user
             },
             status_code=500
         )
@@ -379,7 +335,8 @@ async def update_product(
     name: str = Form(...),
     description: Optional[str] = Form(None),
     price: float = Form(...),
-    stock_quantity: int = Form(...)
+    stock_quantity: int = Form(...),
+    user: dict = Depends(get_admin_identity_from_cookie)
 ):
     # Validate form inputs
     validation_errors = {}
@@ -407,22 +364,13 @@ async def update_product(
                 "request": request,
                 "error": "Product not found",
                 "active_page": "products",
-                "user": {"username": "admin", "role": "admin"}
+                "user": user
             },
             status_code=404
         )
     
     # Get product images
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "SELECT * FROM product_images WHERE product_id = %s ORDER BY sort_order", 
-                (product_id,)
-            )
-            product_images = cursor.fetchall()
-    finally:
-        conn.close()
+    product_images = image_model.load_product_images(product_id)
         
     # If validation errors exist, return them
     if validation_errors:
@@ -441,7 +389,7 @@ async def update_product(
                     "stock_quantity": stock_quantity
                 },
                 "active_page": "products",
-                "user": {"username": "admin", "role": "admin"}
+                "user": user
             },
             status_code=422
         )
@@ -467,7 +415,7 @@ async def update_product(
                 "product_images": product_images,
                 "success": "Product updated successfully!",
                 "active_page": "products",
-                "user": {"username": "admin", "role": "admin"}
+                "user": user
             }
         )
     except ValueError as ve:
@@ -480,7 +428,7 @@ async def update_product(
                 "product": product,
                 "product_images": product_images,
                 "active_page": "products",
-                "user": {"username": "admin", "role": "admin"}
+                "user": user
             },
             status_code=422
         )
@@ -494,7 +442,7 @@ async def update_product(
                 "product": product,
                 "product_images": product_images,
                 "active_page": "products",
-                "user": {"username": "admin", "role": "admin"}
+                "user": user
             },
             status_code=500
         )
@@ -503,7 +451,8 @@ async def update_product(
 @router.delete("/{product_id}", response_class=HTMLResponse)
 async def delete_product(
     request: Request,
-    product_id: int = Path(..., gt=0)
+    product_id: int = Path(..., gt=0),
+    user: dict = Depends(get_admin_identity_from_cookie)
 ):
     try:
         # Check if product exists
@@ -511,32 +460,20 @@ async def delete_product(
         if not product:
             return HTMLResponse(status_code=404, content="Product not found")
         
-        # Delete product images from filesystem
-        conn = get_connection()
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT image_url FROM product_images WHERE product_id = %s", 
-                    (product_id,)
-                )
-                images = cursor.fetchall()
-                
-                for image in images:
-                    image_path = os.path.join(".", image['image_url'].lstrip('/'))
-                    if os.path.exists(image_path):
-                        os.remove(image_path)
-        finally:
-            conn.close()
+        # Delete product from database (image references are released in the same transaction)
+        orphaned_urls = product_model.delete_product(product_id) or []
         
-        # Delete product from database
-        product_model.delete_product(product_id)
+        # Delete image files that no other product image shares
+        for image_url in orphaned_urls:
+            image_processing.delete_image_files(image_url)
         
         # Return to the admin product list
         # HTMX will only update the container, not do a full page redirect
         return await admin_products_list(
             request=request,
             page=DEFAULT_PAGE,
-            per_page=DEFAULT_PER_PAGE
+            per_page=DEFAULT_PER_PAGE,
+            user=user
         )
     except Exception as e:
         # Return error
@@ -549,63 +486,52 @@ async def delete_product(
 @router.post("/upload-temp/images", response_class=HTMLResponse)
 async def upload_temp_image(
     request: Request,
-    file: UploadFile = File(...)
+    files: List[UploadFile] = File(...),
+    user: dict = Depends(get_admin_identity_from_cookie)
 ):
-    # Validate image file
-    allowed_types = ["image/jpeg", "image/png", "image/gif", "image/webp"]
-    if file.content_type not in allowed_types:
+    # Stream all files to disk concurrently (size limit and magic-byte type check happen while copying)
+    try:
+        saved_files, errors = await file_uploads.save_uploads(files, "uploads/products/temp", content_addressed=False)
+    except file_uploads.UploadError as e:
         return HTMLResponse(
-            status_code=400,
-            content="<div class='col-span-full text-center text-red-500 py-4'>Invalid file type. Only JPEG, PNG, GIF, and WEBP are allowed.</div>"
+            status_code=e.status_code,
+            content=f"<div class='col-span-full text-center text-red-500 py-4'>{e}</div>"
         )
     
-    # Create directory if it doesn't exist
-    upload_dir = "uploads/products/temp"
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Generate unique filename
-    file_ext = file.filename.split(".")[-1].lower()
-    new_filename = f"{uuid.uuid4()}.{file_ext}"
-    file_path = os.path.join(upload_dir, new_filename)
-    
-    # Save the file
-    with open(file_path, "wb") as f:
-        contents = await file.read()
-        f.write(contents)
-    
-    # Return HTML for temporary image
-    return HTMLResponse(
-        content=f"""
+    # Return HTML for each temporary image
+    content = "".join(
+        f"""
         <div class="col-span-full flex justify-center my-4">
             <div class="relative rounded-lg overflow-hidden border border-green-200 bg-green-50">
-                <img src="/uploads/products/temp/{new_filename}" alt="Temporary product image" class="w-full h-32 object-cover">
+                <img src="/uploads/products/temp/{saved['filename']}" alt="Temporary product image" class="w-full h-32 object-cover">
                 <div class="absolute inset-0 bg-black bg-opacity-0 hover:bg-opacity-10 transition-all">
                     <div class="absolute bottom-0 left-0 right-0 bg-white bg-opacity-90 p-2 text-center text-xs text-gray-600">
                         <p>Image uploaded successfully</p>
                         <p class="text-xs mt-1">Save the product to keep this image</p>
                     </div>
                 </div>
-                <input type="hidden" name="temp_images" value="{new_filename}">
+                <input type="hidden" name="temp_images" value="{saved['filename']}">
             </div>
         </div>
         """
+        for saved in saved_files
     )
+    content += "".join(
+        f"<div class='col-span-full text-center text-red-500 py-2'>{escape(error['filename'] or '')}: {error['detail']}</div>"
+        for error in errors
+    )
+    # Always 200: HTMX only swaps 2xx responses, and the per-file errors must replace the gallery even when nothing was saved
+    return HTMLResponse(content=content)
 
 # Upload product image
 @router.post("/{product_id}/images", response_class=HTMLResponse)
 async def upload_product_image(
     request: Request,
+    background_tasks: BackgroundTasks,
     product_id: int = Path(..., gt=0),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    user: dict = Depends(get_admin_identity_from_cookie)
 ):
-    # Validate image file
-    allowed_types = ["image/jpeg", "image/png", "image/gif", "image/webp"]
-    if file.content_type not in allowed_types:
-        return HTMLResponse(
-            status_code=400,
-            content="<div class='col-span-full text-center text-red-500 py-4'>Invalid file type. Only JPEG, PNG, GIF, and WEBP are allowed.</div>"
-        )
-    
     # Check if product exists
     product = product_model.get_product_by_id(product_id)
     if not product:
@@ -614,75 +540,89 @@ async def upload_product_image(
             content="<div class='col-span-full text-center text-red-500 py-4'>Product not found</div>"
         )
     
-    # Create directory if it doesn't exist
-    upload_dir = "uploads/products"
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Generate unique filename
-    file_ext = file.filename.split(".")[-1].lower()
-    new_filename = f"{uuid.uuid4()}.{file_ext}"
-    file_path = os.path.join(upload_dir, new_filename)
-    
-    # Save the file
-    with open(file_path, "wb") as f:
-        contents = await file.read()
-        f.write(contents)
-        file_size = len(contents)
+    # Stream the file to disk (size limit and magic-byte type check happen while copying)
+    try:
+        saved = await file_uploads.save_upload(file, "uploads/products")
+    except file_uploads.UploadError as e:
+        return HTMLResponse(
+            status_code=e.status_code,
+            content=f"<div class='col-span-full text-center text-red-500 py-4'>{e}</div>"
+        )
     
     # Create image record in database
     image_data = image_schema.ProductImageCreate(
         product_id=product_id,
-        image_url=f"/uploads/products/{new_filename}",
+        image_url=f"/uploads/products/{saved['relative_path']}",
         image_type=image_schema.ImageType.gallery,
-        is_primary=False,  # Will be set to primary automatically if it's the first image
-        file_size=file_size,
-        file_type=file.content_type
+        file_size=saved['file_size'],
+        file_type=saved['file_type'],
+        blob_sha256=saved['sha256']
     )
     
-    # Get all product images first to check if it's the first one
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) as count FROM product_images WHERE product_id = %s", (product_id,))
-            image_count = cursor.fetchone()['count']
-            
-            # If it's the first image, set it as primary
-            if image_count == 0:
-                image_data.is_primary = True
-    finally:
-        conn.close()
+    # Save image to database (becomes the primary image when the product has none, same rule as the batch upload)
+    new_image = (await run_in_threadpool(image_model.create_product_images, product_id, [image_data]))[0]
     
-    # Save image to database
-    image_model.create_product_image(image_data)
+    # Generate derivatives in the background after the response is sent
+    background_tasks.add_task(image_processing.process_uploaded_image, new_image['image_id'], new_image['image_url'])
     
-    # Get all product images to return
-    conn = get_connection()
+    # Return updated images HTML
+    return await render_product_images(product)
+
+# Upload many product images at once
+@router.post("/{product_id}/images/batch", response_class=HTMLResponse)
+async def upload_product_images_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    product_id: int = Path(..., gt=0),
+    files: List[UploadFile] = File(...),
+    user: dict = Depends(get_admin_identity_from_cookie)
+):
+    # Check if product exists
+    product = await run_in_threadpool(product_model.get_product_by_id, product_id)
+    if not product:
+        return HTMLResponse(
+            status_code=404,
+            content="<div class='col-span-full text-center text-red-500 py-4'>Product not found</div>"
+        )
+    
+    # Validate and write all files concurrently; invalid files are reported without failing the rest
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "SELECT * FROM product_images WHERE product_id = %s ORDER BY sort_order", 
-                (product_id,)
-            )
-            product_images = cursor.fetchall()
-    finally:
-        conn.close()
+        saved_files, errors = await file_uploads.save_uploads(files, "uploads/products")
+    except file_uploads.UploadError as e:
+        return HTMLResponse(
+            status_code=e.status_code,
+            content=f"<div class='col-span-full text-center text-red-500 py-4'>{e}</div>"
+        )
     
-    # Return updated images HTML
-    return templates.TemplateResponse(
-        "admin/products/_product_images.html",
-        {
-            "request": request,
-            "product": product,
-            "product_images": product_images
-        }
-    )
+    images_data = [
+        image_schema.ProductImageCreate(
+            product_id=product_id,
+            image_url=f"/uploads/products/{saved['relative_path']}",
+            image_type=image_schema.ImageType.gallery,
+            file_size=saved['file_size'],
+            file_type=saved['file_type'],
+            blob_sha256=saved['sha256']
+        )
+        for saved in saved_files
+    ]
+    
+    # Insert all rows in one statement (appended after existing images, first becomes primary if none yet)
+    new_images = await run_in_threadpool(image_model.create_product_images, product_id, images_data)
+    
+    # Generate derivatives in the background after the response is sent
+    for new_image in new_images:
+        background_tasks.add_task(image_processing.process_uploaded_image, new_image['image_id'], new_image['image_url'])
+    
+    # Render the gallery once for the whole batch
+    return await render_product_images(product, upload_errors=errors)
 
 # Set image as primary
 @router.put("/{product_id}/images/{image_id}/set-primary", response_class=HTMLResponse)
 async def set_primary_image(
     request: Request,
     product_id: int = Path(..., gt=0),
-    image_id: int = Path(..., gt=0)
+    image_id: int = Path(..., gt=0),
+    user: dict = Depends(get_admin_identity_from_cookie)
 ):
     # Check if product exists
     product = product_model.get_product_by_id(product_id)
@@ -713,34 +653,16 @@ async def set_primary_image(
     # Set image as primary
     image_model.set_primary_image(image_id, product_id)
     
-    # Get all product images to return
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "SELECT * FROM product_images WHERE product_id = %s ORDER BY sort_order", 
-                (product_id,)
-            )
-            product_images = cursor.fetchall()
-    finally:
-        conn.close()
-    
     # Return updated images HTML
-    return templates.TemplateResponse(
-        "admin/products/_product_images.html",
-        {
-            "request": request,
-            "product": product,
-            "product_images": product_images
-        }
-    )
+    return await render_product_images(product)
 
 # Delete product image
 @router.delete("/{product_id}/images/{image_id}", response_class=HTMLResponse)
 async def delete_product_image(
     request: Request,
     product_id: int = Path(..., gt=0),
-    image_id: int = Path(..., gt=0)
+    image_id: int = Path(..., gt=0),
+    user: dict = Depends(get_admin_identity_from_cookie)
 ):
     # Check if product exists
     product = product_model.get_product_by_id(product_id)
@@ -765,44 +687,23 @@ async def delete_product_image(
                     status_code=404,
                     content="<div class='col-span-full text-center text-red-500 py-4'>Image not found</div>"
                 )
-            
-            # Delete image file
-            image_path = os.path.join(".", image['image_url'].lstrip('/'))
-            if os.path.exists(image_path):
-                os.remove(image_path)
     finally:
         conn.close()
     
-    # Delete image from database
-    image_model.delete_product_image(image_id)
-    
-    # Get all product images to return
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "SELECT * FROM product_images WHERE product_id = %s ORDER BY sort_order", 
-                (product_id,)
-            )
-            product_images = cursor.fetchall()
-    finally:
-        conn.close()
+    # Delete image from database, then remove its files once no other image shares them
+    orphaned_urls = image_model.delete_product_image(image_id) or []
+    for image_url in orphaned_urls:
+        image_processing.delete_image_files(image_url)
     
     # Return updated images HTML
-    return templates.TemplateResponse(
-        "admin/products/_product_images.html",
-        {
-            "request": request,
-            "product": product,
-            "product_images": product_images
-        }
-    )
+    return await render_product_images(product)
 
 # Show reorder images UI
 @router.get("/{product_id}/images/reorder-ui", response_class=HTMLResponse)
 async def reorder_images_ui(
     request: Request,
-    product_id: int = Path(..., gt=0)
+    product_id: int = Path(..., gt=0),
+    user: dict = Depends(get_admin_identity_from_cookie)
 ):
     # Check if product exists
     product = product_model.get_product_by_id(product_id)
@@ -813,16 +714,7 @@ async def reorder_images_ui(
         )
     
     # Get all product images
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "SELECT * FROM product_images WHERE product_id = %s ORDER BY sort_order", 
-                (product_id,)
-            )
-            product_images = cursor.fetchall()
-    finally:
-        conn.close()
+    product_images = image_model.load_product_images(product_id)
     
     # Return reorder modal HTML
     return templates.TemplateResponse(
@@ -839,7 +731,8 @@ async def reorder_images_ui(
 async def reorder_images(
     request: Request,
     product_id: int = Path(..., gt=0),
-    image_ids: List[int] = Form(...)
+    image_ids: List[int] = Form(...),
+    user: dict = Depends(get_admin_identity_from_cookie)
 ):
     # Check if product exists
     product = product_model.get_product_by_id(product_id)
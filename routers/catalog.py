@@ -0,0 +1,75 @@
+from fastapi import APIRouter, HTTPException, status, Path, Query, Response
+from typing import List, Optional
+import catalog_snapshot
+from models import product_document as document_model
+from schemas import product as product_schema
+
+# 📦 สร้าง Router สำหรับหน้าร้าน (อ่านอย่างเดียว จาก Read Model product_documents)
+router = APIRouter(
+    prefix="/catalog",
+    tags=["Catalog"]
+)
+
+JSON_MEDIA_TYPE = "application/json"
+SNAPSHOT_VERSION_HEADER = "X-Catalog-Snapshot-Version"
+
+
+def _require_snapshot(response: Response):
+    snapshot = catalog_snapshot.get_snapshot()
+    if snapshot is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Catalog snapshot is not ready")
+    response.headers[SNAPSHOT_VERSION_HEADER] = str(snapshot.version)
+    return snapshot
+
+
+# 🔥 Endpoint สำหรับดึงสินค้าพร้อมรูปภาพ (ส่ง JSON ที่เก็บไว้ตรง ๆ ไม่ต้อง JOIN หรือแปลงใหม่)
+@router.get("/products/{product_id}")
+def read_catalog_product(product_id: int = Path(..., gt=0)):
+    document = document_model.get_product_document(product_id)
+    if document is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    return Response(content=document, media_type=JSON_MEDIA_TYPE)
+
+
+# 🔥 Endpoint สำหรับดึงข้อมูลสรุปของสินค้าแบบกรองได้จาก Snapshot ที่ใช้ร่วมกันทุก Worker (อาจช้ากว่าฐานข้อมูลไม่เกินรอบการสร้าง)
+@router.get("/product-summaries", response_model=List[product_schema.ProductSummary])
+def read_product_summaries(
+    response: Response,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    stock_status: Optional[str] = Query(None, description="in_stock, low_stock หรือ out_of_stock"),
+    after_id: int = Query(0, ge=0, description="product_id สุดท้ายของหน้าก่อนหน้า"),
+    limit: int = Query(20, ge=1, le=catalog_snapshot.MAX_SUMMARIES_PER_PAGE)
+):
+    if stock_status is not None and stock_status not in catalog_snapshot.STOCK_PREDICATES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"stock_status must be one of {', '.join(catalog_snapshot.STOCK_PREDICATES)}"
+        )
+    snapshot = _require_snapshot(response)
+    return snapshot.search(min_price, max_price, stock_status, after_id, limit)
+
+
+# 🔥 Endpoint สำหรับดึงข้อมูลสรุปของสินค้าตาม ID จาก Snapshot
+@router.get("/product-summaries/{product_id}", response_model=product_schema.ProductSummary)
+def read_product_summary(response: Response, product_id: int = Path(..., gt=0)):
+    summary = _require_snapshot(response).get(product_id)
+    if summary is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    return summary
+
+
+# 🔥 Endpoint สำหรับดึงรายการสินค้าทีละหน้า (ส่ง next_after_id กลับไปเพื่อขอหน้าถัดไป)
+@router.get("/products")
+def read_catalog_products(
+    after_id: int = Query(0, ge=0, description="product_id สุดท้ายของหน้าก่อนหน้า"),
+    limit: int = Query(20, ge=1, le=document_model.MAX_DOCUMENTS_PER_PAGE)
+):
+    rows = document_model.list_product_documents(after_id, limit)
+    next_after_id = rows[-1]['product_id'] if len(rows) == limit else None
+    # ประกอบ JSON จากเอกสารที่แปลงไว้แล้ว (ไม่ Parse แล้ว Serialize ซ้ำ)
+    content = '{"products":[%s],"next_after_id":%s}' % (
+        ",".join(row['document'] for row in rows),
+        "null" if next_after_id is None else next_after_id
+    )
+    return Response(content=content, media_type=JSON_MEDIA_TYPE)
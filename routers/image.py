@@ -0,0 +1,94 @@
+from fastapi import APIRouter, HTTPException, status, Path, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from typing import Optional
+import os
+import image_processing
+from models import product_image as image_model
+
+# 📦 สร้าง Router สำหรับรูปภาพที่ย่อตามขนาดที่ขอ (Responsive Images)
+router = APIRouter(
+    prefix="/img",
+    tags=["Images"]
+)
+
+RESIZED_CACHE_CONTROL = "public, max-age=86400"
+
+
+# 🔥 Endpoint สำหรับขอรูปตามความกว้าง เช่น /img/12?w=480&fmt=webp
+@router.get("/{image_id}", response_class=FileResponse)
+async def get_resized_image(
+    request: Request,
+    image_id: int = Path(..., gt=0),
+    w: int = Query(..., description="ความกว้าง (ต้องอยู่ในรายการขนาดที่อนุญาต)"),
+    fmt: Optional[str] = Query(None, description="jpeg, png, webp หรือ avif (ไม่ระบุจะเลือกตาม Header Accept)")
+):
+    if w not in image_processing.RESIZE_WIDTHS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Width must be one of {', '.join(map(str, image_processing.RESIZE_WIDTHS))}"
+        )
+    if fmt is not None and fmt not in image_processing.RESIZE_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Format must be one of {', '.join(image_processing.RESIZE_FORMATS)}"
+        )
+
+    image = await run_in_threadpool(image_model.get_product_image_by_id, image_id)
+    if not image:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    headers = {"Cache-Control": RESIZED_CACHE_CONTROL}
+    if fmt is None:
+        fmt = image_processing.negotiate_resize_format(request.headers.get("accept"), image['file_type'])
+        headers["Vary"] = "Accept"
+    content_type = image_processing.RESIZE_FORMATS[fmt][2]
+
+    # ถ้ารูปย่อยที่สร้างไว้ตอนอัปโหลดมีขนาดตรงกันอยู่แล้ว ส่งไฟล์นั้นได้เลย
+    variant = await run_in_threadpool(image_model.get_image_variant_by_width, image_id, w, content_type)
+    path = image_processing.url_to_path(variant['image_url']) if variant else None
+
+    if not path or not os.path.exists(path):
+        try:
+            path = await image_processing.get_resized_image(image['image_url'], w, fmt)
+        except FileNotFoundError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image file not found")
+
+    return FileResponse(path, media_type=content_type, headers=headers)
+
+
+# 🔥 Endpoint สำหรับรูปย่อยที่สร้างไว้ตอนอัปโหลด เช่น /img/12/thumbnail
+# เลือกส่ง AVIF / WebP / ต้นฉบับ ตามที่ Client รองรับ (Header Accept)
+@router.get("/{image_id}/{variant}", response_class=FileResponse)
+async def get_image_variant(
+    request: Request,
+    image_id: int = Path(..., gt=0),
+    variant: str = Path(..., description="thumbnail, medium, large หรือ original")
+):
+    if variant not in image_processing.DERIVATIVE_SIZES and variant != image_processing.ORIGINAL_VARIANT:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Variant not found")
+
+    files = await run_in_threadpool(image_model.get_variant_files, image_id, variant)
+    if not files:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    modern_types = [image_processing.RESIZE_FORMATS[fmt][2] for fmt in image_processing.TRANSCODE_FORMATS]
+    content_type = image_processing.negotiate_format(
+        request.headers.get("accept"), [t for t in modern_types if t in files]
+    )
+    if content_type is None:
+        # Client ไม่รองรับ Format สมัยใหม่ ส่ง Format ตั้งต้น (JPEG/PNG/...) แทน
+        fallback = [t for t in files if t not in modern_types]
+        if not fallback:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+        content_type = fallback[0]
+
+    path = image_processing.url_to_path(files[content_type])
+    if not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image file not found")
+
+    return FileResponse(
+        path,
+        media_type=content_type,
+        headers={"Cache-Control": RESIZED_CACHE_CONTROL, "Vary": "Accept"}
+    )
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Path
 from typing import List
-from auth import get_current_user
+from auth import get_current_identity
 from schemas import order as order_schema
 from models import order as order_model
 from models import user as user_model
@@ -13,19 +13,16 @@ router = APIRouter(
 
 # 🛒 Endpoint สำหรับสร้าง Order ใหม่
 @router.post("/", response_model=order_schema.OrderDetailResponse, status_code=status.HTTP_201_CREATED)
-def create_order(order: order_schema.OrderCreate, current_user: dict = Depends(get_current_user)):
+def create_order(order: order_schema.OrderCreate, current_user: dict = Depends(get_current_identity)):
     # ตรวจสอบว่า user_id ใน order ตรงกับ user ที่ login หรือไม่ หรือเป็น admin
-    username = current_user.get("sub")
-    user = user_model.get_user_by_username(username)
-    if current_user.get("role") != "admin" and order.user_id != user["user_id"]:
+    if current_user.get("role") != "admin" and order.user_id != current_user["user_id"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can only create orders for yourself"
         )
     
-    # ตรวจสอบว่ามี User นี้หรือไม่
-    user = user_model.get_user_by_id(order.user_id)
-    if not user:
+    # ตรวจสอบว่ามี User นี้หรือไม่ (ถ้าสั่งให้ตัวเอง ตัวตนจาก Token ยืนยันแล้วว่ามีอยู่)
+    if order.user_id != current_user["user_id"] and not user_model.get_user_by_id(order.user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
@@ -44,7 +41,7 @@ def create_order(order: order_schema.OrderCreate, current_user: dict = Depends(g
 
 # 🛒 Endpoint สำหรับดึงข้อมูล Orders ทั้งหมด
 @router.get("/", response_model=List[order_schema.OrderResponse])
-def read_orders(current_user: dict = Depends(get_current_user)):
+def read_orders(current_user: dict = Depends(get_current_identity)):
     # ตรวจสอบสิทธิ์ (เฉพาะ admin เท่านั้นที่ดูได้ทุก order)
     if current_user.get("role") != "admin":
         raise HTTPException(
@@ -58,7 +55,7 @@ def read_orders(current_user: dict = Depends(get_current_user)):
 
 # 🛒 Endpoint สำหรับดึงข้อมูล Order ตาม ID
 @router.get("/{order_id}", response_model=order_schema.OrderDetailResponse)
-def read_order(order_id: int = Path(..., gt=0), current_user: dict = Depends(get_current_user)):
+def read_order(order_id: int = Path(..., gt=0), current_user: dict = Depends(get_current_identity)):
     # ดึงข้อมูล order
     order = order_model.get_order_with_items(order_id)
     if not order:
@@ -68,9 +65,7 @@ def read_order(order_id: int = Path(..., gt=0), current_user: dict = Depends(get
         )
     
     # ตรวจสอบสิทธิ์ (เฉพาะ admin หรือเจ้าของ order เท่านั้นที่ดูได้)
-    username = current_user.get("sub")
-    user = user_model.get_user_by_username(username)
-    if current_user.get("role") != "admin" and order['user_id'] != user["user_id"]:
+    if current_user.get("role") != "admin" and order['user_id'] != current_user["user_id"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can only view your own orders"
@@ -84,7 +79,7 @@ def read_order(order_id: int = Path(..., gt=0), current_user: dict = Depends(get
 def update_order(
     order_id: int = Path(..., gt=0),
     order_update: order_schema.OrderUpdate = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_identity)
 ):
     # ดึงข้อมูล order
     order = order_model.get_order_with_items(order_id)
@@ -101,31 +96,40 @@ def update_order(
             detail="Permission denied. Only admin can update order status."
         )
     
-    # อัปเดตสถานะ
+    # Order ที่ถูกย้ายไป Archive แล้วเป็นข้อมูลประวัติ ไม่สามารถแก้ไขสถานะได้
+    if order.get('archived'):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Archived orders cannot be updated"
+        )
+    
+    # อัปเดตสถานะ (None = Order ถูกย้ายไป Archive หลังตรวจสอบด้านบน)
     updated_order = order_model.update_order_status(order_id, order_update.status)
+    if updated_order is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Archived orders cannot be updated"
+        )
     return updated_order
 
 
 # 🛒 Endpoint สำหรับดึงประวัติการสั่งซื้อของ User
 @router.get("/users/{user_id}/orders", response_model=List[order_schema.OrderResponse], tags=["Users"])
-def read_user_orders(user_id: int = Path(..., gt=0), current_user: dict = Depends(get_current_user)):
-    # ตรวจสอบว่ามี User นี้หรือไม่
-    user = user_model.get_user_by_id(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
+def read_user_orders(user_id: int = Path(..., gt=0), current_user: dict = Depends(get_current_identity)):
     # ตรวจสอบสิทธิ์ (เฉพาะ admin หรือเจ้าของข้อมูลเท่านั้นที่ดูได้)
-    username = current_user.get("sub")
-    current_user_obj = user_model.get_user_by_username(username)
-    if current_user.get("role") != "admin" and user_id != current_user_obj["user_id"]:
+    if current_user.get("role") != "admin" and user_id != current_user["user_id"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can only view your own order history"
         )
     
+    # ตรวจสอบว่ามี User นี้หรือไม่ (ถ้าดูของตัวเอง ตัวตนจาก Token ยืนยันแล้วว่ามีอยู่)
+    if user_id != current_user["user_id"] and not user_model.get_user_by_id(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
     # ดึงประวัติการสั่งซื้อ
     orders = order_model.get_user_orders(user_id)
     return orders
\ No newline at end of file
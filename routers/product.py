@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form
 from typing import List, Optional
-from auth import get_current_user
+from auth import get_current_identity
+import image_processing
 from schemas import product as product_schema
 from models import product as product_model
 
@@ -12,7 +13,7 @@ router = APIRouter(
 
 # 🔥 Endpoint สำหรับสร้าง Product ใหม่
 @router.post("/", response_model=product_schema.ProductResponse, status_code=status.HTTP_201_CREATED)
-def create_product(product: product_schema.ProductCreate, current_user: dict = Depends(get_current_user)):
+def create_product(product: product_schema.ProductCreate, current_user: dict = Depends(get_current_identity)):
     # ตรวจสอบสิทธิ์ (เฉพาะ admin เท่านั้นที่สร้าง product ได้)
     if current_user.get("role") != "admin":
         raise HTTPException(
@@ -32,10 +33,10 @@ def read_products():
     return products
 
 
-# 🔥 Endpoint สำหรับดึงข้อมูล Product ตาม ID
+# 🔥 Endpoint สำหรับดึงข้อมูล Product ตาม ID (Request พร้อมกันของสินค้าเดียวกันรอ Query เดียวบน Event Loop)
 @router.get("/{product_id}", response_model=product_schema.ProductResponse)
-def read_product(product_id: int):
-    product = product_model.get_product_by_id(product_id)
+async def read_product(product_id: int):
+    product = await product_model.get_product_by_id.aio(product_id)
     if product is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     return product
@@ -46,7 +47,7 @@ def read_product(product_id: int):
 def update_product(
     product_id: int, 
     product_update: product_schema.ProductUpdate, 
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_identity)
 ):
     # ตรวจสอบสิทธิ์ (เฉพาะ admin เท่านั้นที่อัปเดต product ได้)
     if current_user.get("role") != "admin":
@@ -67,7 +68,7 @@ def update_product(
 
 # 🔥 Endpoint สำหรับลบ Product
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(product_id: int, current_user: dict = Depends(get_current_user)):
+def delete_product(product_id: int, current_user: dict = Depends(get_current_identity)):
     # ตรวจสอบสิทธิ์ (เฉพาะ admin เท่านั้นที่ลบ product ได้)
     if current_user.get("role") != "admin":
         raise HTTPException(
@@ -80,6 +81,8 @@ def delete_product(product_id: int, current_user: dict = Depends(get_current_use
     if existing_product is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
         
-    # ลบ Product
-    product_model.delete_product(product_id)
+    # ลบ Product (รูปภาพถูกลบตาม) แล้วลบไฟล์รูปที่ไม่มีสินค้าอื่นใช้ร่วม
+    orphaned_urls = product_model.delete_product(product_id) or []
+    for image_url in orphaned_urls:
+        image_processing.delete_image_files(image_url)
     return None
\ No newline at end of file
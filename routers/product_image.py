@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Path
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Path, BackgroundTasks
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
 import os
-import shutil
-import uuid
-from auth import get_current_user
+from auth import get_current_identity
+import image_processing
+import file_uploads
 from schemas import product_image as image_schema
 from models import product_image as image_model
 from models import product as product_model
@@ -17,49 +18,22 @@ router = APIRouter(
 
 # กำหนดการตั้งค่าเกี่ยวกับ Images
 UPLOAD_DIR = "uploads/products"
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
-ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp"}
+MAX_FILE_SIZE = file_uploads.MAX_FILE_SIZE  # 5MB
 
 
 # สร้างโฟลเดอร์เก็บรูปหากยังไม่มี
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
-# ฟังก์ชันตรวจสอบไฟล์
-def validate_image(file: UploadFile):
-    # ตรวจสอบนามสกุลไฟล์
-    ext = file.filename.split(".")[-1].lower()
-    if ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File extension must be one of {', '.join(ALLOWED_EXTENSIONS)}"
-        )
-    
-    # ถ้าไฟล์ใหญ่เกินไป FastAPI จะ raise HTTPException เอง
-    # แต่เราสามารถตรวจสอบเพิ่มเติมได้ที่นี่
-    file_size = 0
-    chunk_size = 1024  # 1KB
-    while chunk := file.file.read(chunk_size):
-        file_size += len(chunk)
-        if file_size > MAX_FILE_SIZE:
-            file.file.seek(0)  # reset file pointer
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File size exceeds the limit of {MAX_FILE_SIZE / (1024 * 1024)}MB"
-            )
-    
-    file.file.seek(0)  # reset file pointer
-    return file_size
-
-
 # 🔥 Endpoint สำหรับอัปโหลดรูปภาพสินค้า
 @router.post("/{product_id}/images", response_model=image_schema.ProductImageResponse)
 async def upload_product_image(
+    background_tasks: BackgroundTasks,
     product_id: int = Path(..., gt=0),
     file: UploadFile = File(...),
     image_type: image_schema.ImageType = Form(image_schema.ImageType.gallery),
     is_primary: bool = Form(False),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_identity)
 ):
     # ตรวจสอบสิทธิ์ (เฉพาะ admin เท่านั้นที่อัปโหลดรูปได้)
     if current_user.get("role") != "admin":
@@ -76,39 +50,87 @@ async def upload_product_image(
             detail="Product not found"
         )
     
-    # ตรวจสอบความถูกต้องของไฟล์
-    file_size = validate_image(file)
-    
-    # สร้างชื่อไฟล์ใหม่ด้วย UUID เพื่อป้องกันการซ้ำ
-    filename = file.filename
-    ext = filename.split(".")[-1]
-    new_filename = f"{uuid.uuid4()}.{ext}"
-    file_path = os.path.join(UPLOAD_DIR, new_filename)
-    
-    # บันทึกไฟล์
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    # 📤 บันทึกไฟล์แบบ Streaming รอบเดียว (ตรวจขนาดและชนิดไฟล์จาก Magic Bytes ไปพร้อมกัน)
+    try:
+        saved = await file_uploads.save_upload(file, UPLOAD_DIR, MAX_FILE_SIZE)
+    except file_uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     
     # สร้างข้อมูลสำหรับบันทึกลงฐานข้อมูล
     image_data = image_schema.ProductImageCreate(
         product_id=product_id,
-        image_url=f"/uploads/products/{new_filename}",
+        image_url=f"/uploads/products/{saved['relative_path']}",
         image_type=image_type,
         is_primary=is_primary,
-        file_size=file_size,
-        file_type=f"image/{ext}"
+        file_size=saved['file_size'],
+        file_type=saved['file_type'],
+        blob_sha256=saved['sha256']
     )
     
     # บันทึกลงฐานข้อมูล
     new_image = image_model.create_product_image(image_data)
+
+    # 🏭 สร้างรูปย่อย (thumbnail / medium / large) เบื้องหลังหลังตอบ Response แล้ว
+    background_tasks.add_task(image_processing.process_uploaded_image, new_image['image_id'], new_image['image_url'])
     return new_image
 
 
-# 🔥 Endpoint สำหรับดึงรูปภาพทั้งหมดของสินค้า
+# 🔥 Endpoint สำหรับอัปโหลดรูปภาพหลายรูปพร้อมกัน (ตรวจสอบและเขียนไฟล์ขนานกัน แล้ว Insert ด้วยคำสั่งเดียว)
+@router.post("/{product_id}/images/batch", response_model=image_schema.ProductImageBatchResponse)
+async def upload_product_images_batch(
+    background_tasks: BackgroundTasks,
+    product_id: int = Path(..., gt=0),
+    files: List[UploadFile] = File(...),
+    image_type: image_schema.ImageType = Form(image_schema.ImageType.gallery),
+    current_user: dict = Depends(get_current_identity)
+):
+    # ตรวจสอบสิทธิ์ (เฉพาะ admin เท่านั้นที่อัปโหลดรูปได้)
+    if current_user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Permission denied. Only admin can upload product images."
+        )
+    
+    # ตรวจสอบว่ามี Product นี้หรือไม่
+    product = await run_in_threadpool(product_model.get_product_by_id, product_id)
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    
+    # 📤 บันทึกทุกไฟล์พร้อมกัน (ไฟล์ที่ไม่ผ่านจะอยู่ใน errors โดยไม่กระทบไฟล์อื่น)
+    try:
+        saved_files, errors = await file_uploads.save_uploads(files, UPLOAD_DIR, MAX_FILE_SIZE)
+    except file_uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    images_data = [
+        image_schema.ProductImageCreate(
+            product_id=product_id,
+            image_url=f"/uploads/products/{saved['relative_path']}",
+            image_type=image_type,
+            file_size=saved['file_size'],
+            file_type=saved['file_type'],
+            blob_sha256=saved['sha256']
+        )
+        for saved in saved_files
+    ]
+    
+    # บันทึกลงฐานข้อมูลด้วย INSERT เดียว (sort_order ต่อท้ายรูปเดิม และรูปแรกเป็นรูปหลักถ้ายังไม่มี)
+    new_images = await run_in_threadpool(image_model.create_product_images, product_id, images_data)
+
+    # 🏭 สร้างรูปย่อยเบื้องหลังหลังตอบ Response แล้ว
+    for new_image in new_images:
+        background_tasks.add_task(image_processing.process_uploaded_image, new_image['image_id'], new_image['image_url'])
+    return {"images": new_images, "errors": errors}
+
+
+# 🔥 Endpoint สำหรับดึงรูปภาพทั้งหมดของสินค้า (Request พร้อมกันของสินค้าเดียวกันรอ Query เดียวบน Event Loop)
 @router.get("/{product_id}/images", response_model=List[image_schema.ProductImageResponse])
-def get_product_images(product_id: int = Path(..., gt=0)):
+async def get_product_images(product_id: int = Path(..., gt=0)):
     # ตรวจสอบว่ามี Product นี้หรือไม่
-    product = product_model.get_product_by_id(product_id)
+    product = await product_model.get_product_by_id.aio(product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -116,7 +138,7 @@ def get_product_images(product_id: int = Path(..., gt=0)):
         )
     
     # ดึงรูปภาพทั้งหมด
-    images = image_model.get_product_images(product_id)
+    images = await image_model.get_product_images.aio(product_id)
     return images
 
 
@@ -148,7 +170,7 @@ def update_product_image(
     product_id: int = Path(..., gt=0),
     image_id: int = Path(..., gt=0),
     image_update: image_schema.ProductImageUpdate = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_identity)
 ):
     # ตรวจสอบสิทธิ์ (เฉพาะ admin เท่านั้นที่อัปเดตรูปได้)
     if current_user.get("role") != "admin":
@@ -183,7 +205,7 @@ def update_product_image(
 def set_primary_image(
     product_id: int = Path(..., gt=0),
     image_id: int = Path(..., gt=0),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_identity)
 ):
     # ตรวจสอบสิทธิ์ (เฉพาะ admin เท่านั้นที่ตั้งรูปหลักได้)
     if current_user.get("role") != "admin":
@@ -218,7 +240,7 @@ def set_primary_image(
 def reorder_images(
     product_id: int = Path(..., gt=0),
     image_order: image_schema.ImageReorder = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_identity)
 ):
     # ตรวจสอบสิทธิ์ (เฉพาะ admin เท่านั้นที่จัดลำดับรูปได้)
     if current_user.get("role") != "admin":
@@ -251,7 +273,7 @@ def reorder_images(
 def delete_product_image(
     product_id: int = Path(..., gt=0),
     image_id: int = Path(..., gt=0),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_identity)
 ):
     # ตรวจสอบสิทธิ์ (เฉพาะ admin เท่านั้นที่ลบรูปได้)
     if current_user.get("role") != "admin":
@@ -276,12 +298,11 @@ def delete_product_image(
             detail="Image not found for this product"
         )
     
-    # ลบไฟล์จากดิสก์ (ถ้ามี)
-    image_path = os.path.join(".", image['image_url'].lstrip('/'))
-    if os.path.exists(image_path):
-        os.remove(image_path)
+    # ลบข้อมูลจากฐานข้อมูล (ได้รายการไฟล์ที่ไม่มีรูปอื่นใช้ร่วมแล้วกลับมา)
+    orphaned_urls = image_model.delete_product_image(image_id) or []
     
-    # ลบข้อมูลจากฐานข้อมูล
-    image_model.delete_product_image(image_id)
+    # ลบไฟล์ต้นฉบับและรูปย่อยจากดิสก์ เฉพาะเมื่อไม่มีรูปอื่นอ้างถึงไฟล์เดียวกัน
+    for image_url in orphaned_urls:
+        image_processing.delete_image_files(image_url)
     
     return None
\ No newline at end of file
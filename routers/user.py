@@ -1,9 +1,14 @@
 # routers/user.py
 
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from auth import create_access_token, verify_password
-from typing import List
+from pydantic import ValidationError
+from auth import create_access_token, decode_access_token, revoke_token, revoke_user_tokens, verify_password_async, get_current_identity
+from typing import List, Optional
+import codecs
+import csv
+import json
 from schemas import user as user_schema
 from models import user as user_model
 
@@ -15,12 +20,38 @@ router = APIRouter(
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# จำนวนแถวต่อ 1 batch ในการนำเข้าผู้ใช้ (1 batch = 1 Transaction)
+USER_IMPORT_BATCH_SIZE = 500
+
+
+def _iter_import_rows(file: UploadFile):
+    """ 📥 อ่านไฟล์นำเข้าแบบ Streaming ทีละแถว (CSV หรือ NDJSON) คืนค่า (row_number, dict หรือ Exception) """
+    filename = (file.filename or "").lower()
+    is_ndjson = filename.endswith((".ndjson", ".jsonl")) or "ndjson" in (file.content_type or "")
+    # ถอดรหัสทีละบรรทัดจากไฟล์ Binary (TextIOWrapper ครอบ SpooledTemporaryFile ไม่ได้บน Python 3.10)
+    text = codecs.iterdecode(file.file, "utf-8-sig")
+
+    if is_ndjson:
+        for row_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                yield row_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, e
+    else:
+        # แถวที่ 1 เป็น Header จึงเริ่มนับข้อมูลที่แถว 2 ให้ตรงกับที่เห็นในไฟล์
+        for row_number, row in enumerate(csv.DictReader(text), 2):
+            yield row_number, {key: (value or None) for key, value in row.items()}
+
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """ ตรวจสอบ Username/Password และคืนค่า JWT Token """
-    user = next((u for u in user_model.get_users() if u["username"] == form_data.username), None)
+    # 🔍 ค้นหาด้วย Unique Index ของ username (ไม่ต้องโหลดผู้ใช้ทั้งหมด)
+    user = await run_in_threadpool(user_model.get_user_by_username, form_data.username)
 
-    if not user or not verify_password(form_data.password, user["password"]):
+    # 🔐 bcrypt รันใน Worker Pool ที่จำกัดจำนวน (ตอบ 503 ถ้าคิวเต็ม)
+    if not user or not await verify_password_async(form_data.password, user["password"]):
         raise HTTPException(status_code=400, detail="Incorrect username or password")
 
     # สร้าง JWT Token
@@ -29,24 +60,102 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(token: str = Depends(oauth2_scheme)):
+    """ เพิกถอน JWT Token ที่ใช้อยู่ (Token นี้จะใช้งานไม่ได้อีก) """
+    revoke_token(decode_access_token(token))
+    return None
+
+
 # 🎨 Endpoint สำหรับ Insert User
 @router.post("/", response_model=user_schema.UserResponse, status_code=status.HTTP_201_CREATED)
 def create_user(user: user_schema.UserCreate):
-    # 🔍 ตรวจสอบ Email ซ้ำ
-    existing_users = user_model.get_users()
-    for u in existing_users:
-        if u['email'] == user.email:
-            raise HTTPException(status_code=400, detail="Email already registered")
-
-    # 💾 Insert ข้อมูลและ Return User ที่เพิ่งสร้าง
-    new_user = user_model.create_user(user)
+    # 💾 Insert ข้อมูลและ Return User ที่เพิ่งสร้าง (ข้อมูลซ้ำตรวจด้วย UNIQUE Constraint ของฐานข้อมูล)
+    try:
+        new_user = user_model.create_user(user)
+    except user_model.DuplicateUserError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     return new_user  # 🔥 Return User ที่มีครบทุก Field
 
 
-# 🎨 Endpoint สำหรับ Get Users ทั้งหมด
+# 🎨 Endpoint สำหรับนำเข้าผู้ใช้จำนวนมากจากไฟล์ CSV / NDJSON (เฉพาะ admin)
+@router.post("/import", response_model=user_schema.UserImportResult)
+def import_users(file: UploadFile = File(...), current_user: dict = Depends(get_current_identity)):
+    if current_user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Permission denied. Only admin can import users."
+        )
+
+    inserted = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        batch_inserted, batch_errors = user_model.bulk_create_users(batch)
+        inserted += batch_inserted
+        errors.extend(batch_errors)
+        batch.clear()
+
+    for row_number, data in _iter_import_rows(file):
+        if isinstance(data, Exception):
+            errors.append({"row": row_number, "field": None, "detail": f"Invalid JSON: {data}"})
+            continue
+
+        try:
+            batch.append((row_number, user_schema.UserCreate(**data)))
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = str(error["loc"][0]) if error.get("loc") else None
+            errors.append({"row": row_number, "field": field, "detail": error["msg"]})
+        except TypeError:
+            errors.append({"row": row_number, "field": None, "detail": "Row must be an object"})
+        except (AttributeError, ValueError) as e:
+            # แถวที่เสียต้องไม่ทำให้ทั้ง Request ล้มหลังจาก batch ก่อนหน้า commit ไปแล้ว
+            errors.append({"row": row_number, "field": None, "detail": str(e)})
+
+        if len(batch) >= USER_IMPORT_BATCH_SIZE:
+            flush()
+
+    if batch:
+        flush()
+
+    errors.sort(key=lambda error: error["row"])
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
+
+
+# 🎨 Endpoint สำหรับตรวจสอบว่า username / email / phone ยังว่างอยู่หรือไม่ (ใช้กับ Form Validation แบบ Live)
+@router.get("/availability", response_model=user_schema.UserAvailabilityResponse, response_model_exclude_none=True)
+def check_availability(
+    username: Optional[str] = Query(None, max_length=50),
+    email: Optional[str] = Query(None, max_length=100),
+    phone: Optional[str] = Query(None, max_length=15)
+):
+    if not (username or email or phone):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide at least one of username, email or phone"
+        )
+    return user_model.check_availability(username=username, email=email, phone=phone)
+
+
+# 🎨 Endpoint สำหรับ Get Users แบบแบ่งหน้า
+# ส่ง Header X-Next-Cursor กลับไปเมื่อยังมีหน้าถัดไป (นำไปใช้เป็นค่า after ของ Request ถัดไป)
 @router.get("/", response_model=List[user_schema.UserResponse])
-def read_users():
-    users = user_model.get_users()
+def read_users(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    after: Optional[int] = Query(None, ge=0, description="user_id สุดท้ายของหน้าก่อนหน้า"),
+    search: Optional[str] = Query(None, min_length=1, max_length=100, description="ค้นหาด้วย Prefix ของ username หรือ email")
+):
+    # ดึงเกินมา 1 แถวเพื่อตรวจว่ามีหน้าถัดไปหรือไม่ โดยไม่ต้อง COUNT ทั้งตาราง
+    users = user_model.list_users(limit=limit + 1, after_id=after, search=search)
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = str(users[-1]["user_id"])
     return users
 
 
@@ -67,7 +176,12 @@ def update_user(user_id: int, user_update: user_schema.UserUpdate):
         raise HTTPException(status_code=404, detail="User not found")
 
     # 💾 Update ข้อมูล
-    updated_user = user_model.update_user(user_id, user_update)
+    try:
+        updated_user = user_model.update_user(user_id, user_update)
+    except user_model.DuplicateUserError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     return updated_user  # 🔥 Return User ที่อัปเดตแล้ว
 
 
@@ -79,6 +193,7 @@ def delete_user(user_id: int):
     if existing_user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # ❌ ลบ User
+    # ❌ ลบ User และเพิกถอน Token ทั้งหมดของผู้ใช้นี้ (กันกรณีมีการสร้าง username เดิมขึ้นมาใหม่)
     user_model.delete_user(user_id)
+    revoke_user_tokens(existing_user["username"])
     return None  # 🔥 ไม่มี Response Body
\ No newline at end of file
@@ -16,6 +16,15 @@ CREATE TABLE IF NOT EXISTS users (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 )CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
+-- สร้างตาราง revoked_tokens (รายการ Token ที่ถูกเพิกถอน: 'jti:<id>' รายตัว หรือ 'sub:<username>' ทั้งผู้ใช้)
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    token_key VARCHAR(100) PRIMARY KEY,
+    issued_before BIGINT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_revoked_tokens_expires_at (expires_at)
+)CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
 -- สร้างตาราง products
 CREATE TABLE IF NOT EXISTS products (
     product_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -23,8 +32,87 @@ CREATE TABLE IF NOT EXISTS products (
     description TEXT,
     price DECIMAL(10, 2) NOT NULL,
     stock_quantity INT NOT NULL DEFAULT 0,
+    primary_image_id INT NULL,  -- รูปหลักของสินค้า (image_id ใน product_images) เปลี่ยนรูปหลักได้ด้วยการเขียนแถวเดียว
+    version INT NOT NULL DEFAULT 1,  -- เพิ่มขึ้นทุกครั้งที่สินค้าหรือรูปของสินค้าเปลี่ยน (ใช้เป็น Key ของ Fragment Cache)
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_products_price (price),
+    INDEX idx_products_stock_quantity (stock_quantity)
+)CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+-- สร้างตาราง product_counters (จำนวนสินค้าทั้งหมดและตามสถานะสต็อก สำหรับแบ่งหน้าโดยไม่ต้อง COUNT(*))
+-- แบ่งเป็น 16 แถวตาม product_id % 16 เพื่อไม่ให้ทุก Transaction ต้องรอล็อกแถวเดียวกัน (อ่านด้วย SUM)
+-- ค่าถูกดูแลโดย Trigger ด้านล่าง เงื่อนไขต้องตรงกับ PRODUCT_STOCK_FILTERS ใน models/product.py
+-- changes นับการเพิ่ม/ลบสินค้า และการแก้ที่เพิ่ม products.version (SUM(changes) คือ catalog version ที่ทุก Worker เห็นตรงกัน ดู catalog_cache.py)
+CREATE TABLE IF NOT EXISTS product_counters (
+    slot TINYINT UNSIGNED PRIMARY KEY,
+    total INT NOT NULL DEFAULT 0,
+    in_stock INT NOT NULL DEFAULT 0,
+    low_stock INT NOT NULL DEFAULT 0,
+    out_of_stock INT NOT NULL DEFAULT 0,
+    changes BIGINT NOT NULL DEFAULT 0
+)CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO product_counters (slot)
+VALUES (0), (1), (2), (3), (4), (5), (6), (7), (8), (9), (10), (11), (12), (13), (14), (15);
+
+-- ฐานข้อมูลเดิมที่มีสินค้าอยู่แล้ว: นับตัวนับใหม่จาก products (ฐานข้อมูลใหม่ยังไม่มีสินค้า คำสั่งนี้จึงไม่ทำอะไร)
+-- รันตอนที่ไม่มีการเขียนสินค้า เพราะการเขียนระหว่างนับอาจถูกนับซ้ำโดย Trigger
+INSERT INTO product_counters (slot, total, in_stock, low_stock, out_of_stock)
+SELECT product_id % 16, COUNT(*),
+       SUM(stock_quantity > 0),
+       SUM(stock_quantity > 0 AND stock_quantity < 10),
+       SUM(stock_quantity = 0)
+FROM products GROUP BY product_id % 16
+ON DUPLICATE KEY UPDATE
+    total = VALUES(total),
+    in_stock = VALUES(in_stock),
+    low_stock = VALUES(low_stock),
+    out_of_stock = VALUES(out_of_stock);
+
+DROP TRIGGER IF EXISTS trg_products_count_insert;
+CREATE TRIGGER trg_products_count_insert AFTER INSERT ON products FOR EACH ROW
+    UPDATE product_counters SET
+        total = total + 1,
+        in_stock = in_stock + (NEW.stock_quantity > 0),
+        low_stock = low_stock + (NEW.stock_quantity > 0 AND NEW.stock_quantity < 10),
+        out_of_stock = out_of_stock + (NEW.stock_quantity = 0),
+        changes = changes + 1
+    WHERE slot = NEW.product_id % 16;
+
+-- การแก้ที่ไม่เปลี่ยนสต็อกหรือ version (เช่นเขียน primary_image_id ก่อน touch_product) ไม่ล็อกแถวของตัวนับ
+DROP TRIGGER IF EXISTS trg_products_count_update;
+CREATE TRIGGER trg_products_count_update AFTER UPDATE ON products FOR EACH ROW
+    UPDATE product_counters SET
+        in_stock = in_stock + (NEW.stock_quantity > 0) - (OLD.stock_quantity > 0),
+        low_stock = low_stock + (NEW.stock_quantity > 0 AND NEW.stock_quantity < 10) - (OLD.stock_quantity > 0 AND OLD.stock_quantity < 10),
+        out_of_stock = out_of_stock + (NEW.stock_quantity = 0) - (OLD.stock_quantity = 0),
+        changes = changes + (NEW.version <> OLD.version)
+    WHERE slot = NEW.product_id % 16
+        AND (NEW.stock_quantity <> OLD.stock_quantity OR NEW.version <> OLD.version);
+
+DROP TRIGGER IF EXISTS trg_products_count_delete;
+CREATE TRIGGER trg_products_count_delete AFTER DELETE ON products FOR EACH ROW
+    UPDATE product_counters SET
+        total = total - 1,
+        in_stock = in_stock - (OLD.stock_quantity > 0),
+        low_stock = low_stock - (OLD.stock_quantity > 0 AND OLD.stock_quantity < 10),
+        out_of_stock = out_of_stock - (OLD.stock_quantity = 0),
+        changes = changes + 1
+    WHERE slot = OLD.product_id % 16;
+
+-- สร้างตาราง image_blobs (ไฟล์รูปที่เก็บตาม SHA-256 ของเนื้อหา ไฟล์เดียวกันถูกใช้ร่วมกันได้หลายรูปสินค้า)
+-- ref_count = จำนวนแถวใน product_images ที่อ้างถึงไฟล์นี้ เมื่อเหลือ 0 จะบันทึก released_at
+-- แล้ว Janitor ลบไฟล์และแถวหลัง IMAGE_BLOB_RELEASE_GRACE วินาที (ถ้าไม่ถูกอัปโหลดซ้ำก่อน)
+CREATE TABLE IF NOT EXISTS image_blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    image_url VARCHAR(255) NOT NULL,
+    file_size INT NOT NULL,
+    file_type VARCHAR(50) NOT NULL,
+    ref_count INT NOT NULL DEFAULT 0,
+    released_at TIMESTAMP NULL DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    INDEX idx_image_blobs_released (ref_count, released_at)
 )CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
 -- สร้างตาราง product_images
@@ -32,13 +120,40 @@ CREATE TABLE IF NOT EXISTS product_images (
     image_id INT AUTO_INCREMENT PRIMARY KEY,
     product_id INT NOT NULL,
     image_url VARCHAR(255) NOT NULL,
+    blob_sha256 CHAR(64) NULL,
     image_type ENUM('main', 'thumbnail', 'gallery') DEFAULT 'gallery',
     sort_order INT DEFAULT 0,
-    is_primary BOOLEAN DEFAULT FALSE,
     file_size INT NOT NULL,
     file_type VARCHAR(50) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_product_images_blob (blob_sha256),
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+)CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+-- สร้างตาราง product_image_variants (รูปย่อยที่สร้างจากรูปต้นฉบับ: thumbnail / medium / large / original)
+-- แต่ละขนาดมีได้หลาย Format (JPEG/PNG, WebP, AVIF) แยกกันด้วย file_type
+CREATE TABLE IF NOT EXISTS product_image_variants (
+    variant_id INT AUTO_INCREMENT PRIMARY KEY,
+    image_id INT NOT NULL,
+    variant VARCHAR(20) NOT NULL,
+    image_url VARCHAR(255) NOT NULL,
+    width INT NOT NULL,
+    height INT NOT NULL,
+    file_size INT NOT NULL,
+    file_type VARCHAR(50) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_product_image_variants (image_id, variant, file_type),
+    FOREIGN KEY (image_id) REFERENCES product_images(image_id) ON DELETE CASCADE
+)CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+-- สร้างตาราง product_documents (Read Model ของหน้าร้าน: JSON ของสินค้าพร้อมรูปภาพที่แปลงไว้ล่วงหน้า)
+-- เขียนใหม่ใน Transaction เดียวกับการเปลี่ยนสินค้า รูปภาพ หรือสต็อก (models/product_document.py)
+CREATE TABLE IF NOT EXISTS product_documents (
+    product_id INT PRIMARY KEY,
+    version INT NOT NULL,
+    document MEDIUMTEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
 )CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
@@ -50,9 +165,29 @@ CREATE TABLE IF NOT EXISTS orders (
     status ENUM('pending', 'completed', 'cancelled') DEFAULT 'pending',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_orders_created_at (created_at),
+    INDEX idx_orders_status_updated_at (status, updated_at),
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 )CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
+-- สร้างตาราง order_counters (นับการสร้าง Order และการเปลี่ยนสถานะ ให้ Dashboard ของทุก Worker รู้ว่าต้องอ่าน Order ใหม่ ดู order_events.py)
+-- แบ่งเป็น 16 แถวตาม order_id % 16 เหมือน product_counters
+CREATE TABLE IF NOT EXISTS order_counters (
+    slot TINYINT UNSIGNED PRIMARY KEY,
+    changes BIGINT NOT NULL DEFAULT 0
+)CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO order_counters (slot)
+VALUES (0), (1), (2), (3), (4), (5), (6), (7), (8), (9), (10), (11), (12), (13), (14), (15);
+
+DROP TRIGGER IF EXISTS trg_orders_count_insert;
+CREATE TRIGGER trg_orders_count_insert AFTER INSERT ON orders FOR EACH ROW
+    UPDATE order_counters SET changes = changes + 1 WHERE slot = NEW.order_id % 16;
+
+DROP TRIGGER IF EXISTS trg_orders_count_update;
+CREATE TRIGGER trg_orders_count_update AFTER UPDATE ON orders FOR EACH ROW
+    UPDATE order_counters SET changes = changes + 1 WHERE slot = NEW.order_id % 16 AND NEW.status <> OLD.status;
+
 -- สร้างตาราง order_items
 CREATE TABLE IF NOT EXISTS order_items (
     order_item_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -65,6 +200,31 @@ CREATE TABLE IF NOT EXISTS order_items (
     FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE RESTRICT
 );
 
+-- สร้างตาราง orders_archive (เก็บ Order ที่ปิดแล้วและเก่ากว่าที่กำหนด เพื่อให้ตาราง orders เล็กอยู่เสมอ)
+CREATE TABLE IF NOT EXISTS orders_archive (
+    order_id INT PRIMARY KEY,
+    user_id INT NOT NULL,
+    total_amount DECIMAL(10, 2) NOT NULL,
+    status ENUM('pending', 'completed', 'cancelled') NOT NULL,
+    created_at TIMESTAMP NULL,
+    updated_at TIMESTAMP NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_orders_archive_user_created (user_id, created_at),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+)CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+-- สร้างตาราง order_items_archive (เก็บชื่อสินค้า ณ เวลาที่ย้าย เพราะสินค้าอาจถูกลบภายหลัง)
+CREATE TABLE IF NOT EXISTS order_items_archive (
+    order_item_id INT PRIMARY KEY,
+    order_id INT NOT NULL,
+    product_id INT NOT NULL,
+    product_name VARCHAR(100),
+    quantity INT NOT NULL,
+    price_at_time DECIMAL(10, 2) NOT NULL,
+    subtotal DECIMAL(10, 2) NOT NULL,
+    FOREIGN KEY (order_id) REFERENCES orders_archive(order_id) ON DELETE CASCADE
+)CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
 -- เพิ่มข้อมูล User ตัวอย่าง
 -- เพิ่ม User ตัวอย่าง
 -- หมายเหตุ: รหัสผ่านถูกเข้ารหัสด้วย bcrypt
@@ -79,4 +239,6 @@ INSERT INTO products (name, description, price, stock_quantity, created_at, upda
 ('แล็ปท็อป ABC', 'แล็ปท็อปประสิทธิภาพสูงสำหรับทำงานและเล่นเกม', 35000.00, 20, NOW(), NOW()),
 ('หูฟังไร้สาย', 'หูฟังไร้สายเสียงคุณภาพสูง แบตเตอรี่อายุการใช้งานยาวนาน', 3500.00, 100, NOW(), NOW()),
 ('กล้องถ่ายรูป', 'กล้องถ่ายรูปความละเอียดสูง 24MP', 28000.00, 15, NOW(), NOW()),
-('สมาร์ทวอทช์', 'นาฬิกาอัจฉริยะติดตามสุขภาพและการออกกำลังกาย', 6500.00, 30, NOW(), NOW());
\ No newline at end of file
+('สมาร์ทวอทช์', 'นาฬิกาอัจฉริยะติดตามสุขภาพและการออกกำลังกาย', 6500.00, 30, NOW(), NOW());
+
+-- เอกสารของสินค้าตัวอย่างใน product_documents สร้างด้วย python rebuild_product_documents.py (รูปแบบเดียวกับ API เสมอ)
@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field, model_validator, validator
 from typing import Optional, List
 from datetime import datetime
 from decimal import Decimal
+from schemas.product_image import ProductImageResponse
 
 # 🚀 Schema สำหรับ Create (POST)
 class ProductCreate(BaseModel):
@@ -39,8 +40,27 @@ class ProductResponse(BaseModel):
     description: Optional[str]
     price: Decimal
     stock_quantity: int
+    primary_image_id: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# 📄 เอกสารสินค้าของหน้าร้าน (เก็บเป็น JSON ไว้ล่วงหน้าในตาราง product_documents)
+class ProductDocument(ProductResponse):
+    version: int
+    images: List[ProductImageResponse] = Field(default_factory=list)
+    primary_image: Optional[ProductImageResponse] = None
+
+
+# 🗂️ ข้อมูลสรุปของสินค้าจาก Catalog Snapshot (ดู catalog_snapshot.py)
+class ProductSummary(BaseModel):
+    product_id: int
+    name: str
+    price: Decimal
+    stock_quantity: int
+    created_at: datetime
+    version: int
+    primary_image_id: Optional[int] = None
+    primary_image_url: Optional[str] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -18,6 +18,7 @@ class ProductImageCreate(BaseModel):
     is_primary: bool = Field(default=False)
     file_size: int = Field(..., gt=0)  # ขนาดไฟล์ต้องมากกว่า 0
     file_type: str = Field(..., max_length=50)
+    blob_sha256: Optional[str] = Field(default=None, min_length=64, max_length=64)  # SHA-256 ของไฟล์ (ไฟล์ที่เนื้อหาเหมือนกันใช้ร่วมกัน)
     
     @validator('file_type')
     def validate_file_type(cls, v):
@@ -49,10 +50,22 @@ class ProductImageResponse(BaseModel):
     file_type: str
     created_at: datetime
     updated_at: Optional[datetime]
+    blob_sha256: Optional[str] = None
+    variants: Dict[str, str] = Field(default_factory=dict)  # URL ของรูปย่อย เช่น {"thumbnail": "/img/12/thumbnail"}
 
     class Config:
         from_attributes = True
 
+# 🚀 Schema สำหรับไฟล์ที่อัปโหลดไม่สำเร็จใน Batch
+class ProductImageUploadError(BaseModel):
+    filename: Optional[str] = None
+    detail: str
+
+# 🚀 Schema สำหรับผลการอัปโหลดหลายรูปพร้อมกัน
+class ProductImageBatchResponse(BaseModel):
+    images: List[ProductImageResponse]
+    errors: List[ProductImageUploadError] = Field(default_factory=list)
+
 # 🚀 Schema สำหรับการจัดลำดับรูปภาพ
 class ImageReorder(BaseModel):
     image_ids: List[int] = Field(..., description="List of image IDs in the desired order")
\ No newline at end of file
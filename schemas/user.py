@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, model_validator, EmailStr
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 # 🚀 Schema สำหรับ Create (POST)
@@ -15,8 +15,9 @@ class UserCreate(BaseModel):
     # ✨ Custom Validation: เช็คว่าชื่อห้ามเป็น "admin"
     @model_validator(mode='before')
     def validate_username(cls, values):
-        # 🔥 เช็คว่า username ห้ามเป็น "admin"
-        if values.get('username', '').lower() == 'admin':
+        # 🔥 เช็คว่า username ห้ามเป็น "admin" (ค่าว่าง/ไม่ใช่ข้อความ ให้ Field Validation แจ้งเอง)
+        username = values.get('username') if isinstance(values, dict) else None
+        if isinstance(username, str) and username.lower() == 'admin':
             raise ValueError('Username cannot be "admin"')
         return values
 
@@ -61,3 +62,22 @@ class UserResponse(BaseModel):
         from_attributes = True  # 🔥 แก้ไขจาก orm_mode เป็น from_attributes (Pydantic V2)
 
 
+# 🚀 Schema สำหรับผลการตรวจสอบว่า username / email / phone ยังว่างหรือไม่
+class UserAvailabilityResponse(BaseModel):
+    username: Optional[bool] = None
+    email: Optional[bool] = None
+    phone: Optional[bool] = None
+
+
+# 🚀 Schema สำหรับ error ของแต่ละแถวในการนำเข้าผู้ใช้
+class UserImportError(BaseModel):
+    row: int
+    field: Optional[str] = None
+    detail: str
+
+
+# 🚀 Schema สำหรับผลการนำเข้าผู้ใช้จำนวนมาก
+class UserImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[UserImportError]
@@ -0,0 +1,105 @@
+# static_files.py
+"""
+🗂️ เสิร์ฟไฟล์ใน /uploads ให้ Browser และ CDN Cache ได้เต็มที่
+
+- ไฟล์ที่ชื่อเป็น SHA-256 ของเนื้อหา (Fingerprinted URL) เนื้อหาไม่มีวันเปลี่ยน
+  จึงตอบ Cache-Control แบบ immutable อายุ 1 ปี และใช้ Hash ในชื่อไฟล์เป็น Strong ETag
+  (เปิดหน้าเดิมซ้ำแล้ว Browser ไม่ต้องส่ง Request มาอีก)
+- ไฟล์อื่น ๆ (เช่น รูปชั่วคราว) ให้ Browser ตรวจกับ Server ทุกครั้งด้วย ETag (ตอบ 304 ถ้าไม่เปลี่ยน)
+- รองรับ Range Request (ส่งเฉพาะช่วงที่ขอ) จาก FileResponse ของ Starlette
+- ถ้า Server รองรับ ASGI extension "http.response.pathsend" จะให้ Server ส่งไฟล์เอง (sendfile แบบ zero-copy)
+- ไฟล์ข้อความ/SVG ที่มีไฟล์บีบอัดไว้ล่วงหน้า (.br / .gz) จะส่งไฟล์บีบอัดตาม Accept-Encoding
+- URL แบบแบนเดิมที่ไฟล์ถูกย้ายไปโฟลเดอร์ย่อย ab/cd แล้ว ยังเปิดได้ (ดู migrate_upload_layout.py)
+"""
+import os
+import re
+from mimetypes import guess_type
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+import file_uploads
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# <sha256> หรือรูปย่อย <sha256>_<variant>-<variant_tag> (variant_tag คือ Hash ของขนาด/Format/คุณภาพ ดู image_processing.variant_tag)
+# รูปย่อยแบบเดิมที่ไม่มี variant_tag อาจถูกสร้างใหม่ทับชื่อเดิมเมื่อเปลี่ยนการตั้งค่า จึงไม่นับเป็น Fingerprint
+FINGERPRINT_PATTERN = re.compile(r"^([0-9a-f]{64})(_[A-Za-z0-9]+-[0-9a-f]{8})?$")
+FILE_CHUNK_SIZE = 256 * 1024
+
+# ชนิดไฟล์ที่บีบอัดได้ (รูปภาพ JPEG/PNG/WebP บีบอัดมาแล้วในตัว จึงไม่ต้องมี Sidecar)
+COMPRESSIBLE_TYPES = {"image/svg+xml", "application/json", "application/javascript", "text/javascript"}
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def fingerprint(path: str):
+    """ 🔍 คืนค่า Fingerprint จากชื่อไฟล์ (<sha256> หรือ <sha256>_<variant>-<variant_tag>) หรือ None ถ้าไม่ใช่ไฟล์แบบ Content-addressed """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem if FINGERPRINT_PATTERN.match(stem) else None
+
+
+class SendfileResponse(FileResponse):
+    """ 📨 FileResponse ที่ให้ ASGI Server ส่งไฟล์เองเมื่อรองรับ pathsend (ไม่ต้องอ่านไฟล์ผ่าน Python) """
+    chunk_size = FILE_CHUNK_SIZE
+
+    async def __call__(self, scope, receive, send):
+        can_pathsend = "http.response.pathsend" in scope.get("extensions", {})
+        is_full_get = scope["method"] == "GET" and "range" not in Headers(scope=scope)
+        if not (can_pathsend and is_full_get) or self.stat_result is None:
+            await super().__call__(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+        if self.background is not None:
+            await self.background()
+
+
+class CachedStaticFiles(StaticFiles):
+    """ 🗂️ StaticFiles ที่ตั้ง Header สำหรับ Cache ตามชนิดของ URL (ใช้แทน StaticFiles ของ /uploads) """
+
+    def lookup_path(self, path: str):
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is None:
+            # URL แบบแบนเดิม (dir/name) ที่ไฟล์ถูกย้ายไปโฟลเดอร์ ab/cd แล้ว ยังเปิดได้ระหว่าง/หลัง Migration
+            full_path, stat_result = super().lookup_path(file_uploads.sharded_url(path))
+        return full_path, stat_result
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        media_type = guess_type(full_path)[0] or "text/plain"
+        headers = {}
+
+        file_path, file_stat, encoding = self._precompressed(full_path, stat_result, media_type, request_headers)
+        if encoding:
+            headers["content-encoding"] = encoding
+        if media_type in COMPRESSIBLE_TYPES or media_type.startswith("text/"):
+            headers["vary"] = "Accept-Encoding"
+
+        file_fingerprint = fingerprint(full_path)
+        if file_fingerprint:
+            headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+            headers["etag"] = f'"{file_fingerprint}{"-" + encoding if encoding else ""}"'
+        else:
+            headers["cache-control"] = REVALIDATE_CACHE_CONTROL
+
+        response = SendfileResponse(
+            file_path, status_code=status_code, headers=headers, media_type=media_type, stat_result=file_stat
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def _precompressed(self, full_path, stat_result, media_type: str, request_headers: Headers):
+        """ เลือกไฟล์ .br / .gz ที่บีบอัดไว้แล้ว ถ้า Client รองรับและมีไฟล์อยู่ """
+        if media_type not in COMPRESSIBLE_TYPES and not media_type.startswith("text/"):
+            return full_path, stat_result, None
+
+        accepted = {value.split(";")[0].strip() for value in request_headers.get("accept-encoding", "").split(",")}
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            if encoding in accepted:
+                try:
+                    return f"{full_path}{suffix}", os.stat(f"{full_path}{suffix}"), encoding
+                except FileNotFoundError:
+                    continue
+        return full_path, stat_result, None
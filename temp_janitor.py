@@ -0,0 +1,144 @@
+# temp_janitor.py
+"""
+🧹 ลบไฟล์ชั่วคราวใน uploads/products/temp ที่ค้างอยู่เกินเวลาที่กำหนด
+
+ไฟล์ชั่วคราวถูกสร้างตอน Admin แนบรูปในฟอร์มสร้างสินค้า และจะถูกย้ายออกเมื่อบันทึกสินค้าเท่านั้น
+ฟอร์มที่ถูกทิ้งไว้จึงเหลือไฟล์ค้าง งานนี้รันตามรอบภายในแอป (ดู lifespan ใน main.py) หรือรันเองได้
+รอบที่รันในแอปลบไฟล์รูปที่ไม่มีรูปสินค้าไหนอ้างถึงแล้ว (ดู image_processing.purge_released_blobs)
+และรายการ Token ที่ถูกเพิกถอนซึ่งหมดอายุแล้ว (ดู auth.purge_expired_revocations ทำแค่ Worker เดียวต่อรอบ) ด้วย
+
+
+    python temp_janitor.py --max-age-hours 24
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+from fastapi.concurrency import run_in_threadpool
+import auth
+import image_processing
+
+TEMP_DIR = "uploads/products/temp"
+TEMP_FILE_MAX_AGE = int(os.environ.get('TEMP_FILE_MAX_AGE', 24 * 60 * 60))  # วินาที
+TEMP_JANITOR_INTERVAL = int(os.environ.get('TEMP_JANITOR_INTERVAL', 60 * 60))  # วินาที
+TEMP_JANITOR_BATCH_SIZE = int(os.environ.get('TEMP_JANITOR_BATCH_SIZE', 500))
+
+# 📊 สถิติสะสมตั้งแต่เริ่ม Process (แสดงที่ /admin/metrics)
+_metrics = {
+    "runs": 0,
+    "files_scanned": 0,
+    "files_deleted": 0,
+    "bytes_reclaimed": 0,
+    "errors": 0,
+    "blobs_purged": 0,
+    "revocations_purged": 0,
+    "last_run_at": None,
+    "last_run_seconds": None,
+}
+_metrics_lock = threading.Lock()
+
+
+def _delete_batch(batch):
+    deleted = 0
+    reclaimed = 0
+    errors = 0
+    for path, size in batch:
+        try:
+            os.remove(path)
+            deleted += 1
+            reclaimed += size
+        except FileNotFoundError:
+            # ถูกย้ายออก (บันทึกสินค้า) หรือ Worker อื่นลบไปแล้ว
+            pass
+        except OSError:
+            errors += 1
+    return deleted, reclaimed, errors
+
+
+def sweep_temp_files(max_age: int = TEMP_FILE_MAX_AGE, batch_size: int = TEMP_JANITOR_BATCH_SIZE, directory: str = TEMP_DIR):
+    """ 🧹 ลบไฟล์ที่แก้ไขล่าสุดเก่ากว่า max_age วินาที โดยอ่านโฟลเดอร์ด้วย os.scandir และลบทีละ batch
+    (ไม่โหลดรายชื่อไฟล์ทั้งหมดเข้าหน่วยความจำ) คืนค่าสถิติของรอบนี้
+    """
+    started = time.monotonic()
+    cutoff = time.time() - max_age
+    result = {"files_scanned": 0, "files_deleted": 0, "bytes_reclaimed": 0, "errors": 0}
+
+    batch = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                result["files_scanned"] += 1
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat_result = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+
+                if stat_result.st_mtime < cutoff:
+                    batch.append((entry.path, stat_result.st_size))
+                if len(batch) >= batch_size:
+                    deleted, reclaimed, errors = _delete_batch(batch)
+                    result["files_deleted"] += deleted
+                    result["bytes_reclaimed"] += reclaimed
+                    result["errors"] += errors
+                    batch = []
+    except FileNotFoundError:
+        pass
+
+    deleted, reclaimed, errors = _delete_batch(batch)
+    result["files_deleted"] += deleted
+    result["bytes_reclaimed"] += reclaimed
+    result["errors"] += errors
+
+    with _metrics_lock:
+        _metrics["runs"] += 1
+        for key in ("files_scanned", "files_deleted", "bytes_reclaimed", "errors"):
+            _metrics[key] += result[key]
+        _metrics["last_run_at"] = time.time()
+        _metrics["last_run_seconds"] = round(time.monotonic() - started, 3)
+
+    return result
+
+
+def get_metrics():
+    """ 📊 สถิติสะสมของ Janitor ใน Process นี้ """
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+async def run_periodically(interval: int = TEMP_JANITOR_INTERVAL, max_age: int = TEMP_FILE_MAX_AGE):
+    """ ⏰ วนลบไฟล์ชั่วคราวทุก interval วินาที (รันเป็น Task ตลอดอายุของแอป) """
+    while True:
+        try:
+            await run_in_threadpool(sweep_temp_files, max_age)
+        except Exception as e:
+            print(f"Error sweeping temp uploads: {str(e)}")
+        try:
+            purged = await run_in_threadpool(image_processing.purge_released_blobs)
+            with _metrics_lock:
+                _metrics["blobs_purged"] += purged
+        except Exception as e:
+            print(f"Error purging released image blobs: {str(e)}")
+        try:
+            purged = await run_in_threadpool(auth.purge_expired_revocations, interval / 2)
+            with _metrics_lock:
+                _metrics["revocations_purged"] += purged or 0
+        except Exception as e:
+            print(f"Error purging expired token revocations: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete abandoned temporary product image uploads")
+    parser.add_argument("--max-age-hours", type=float, default=TEMP_FILE_MAX_AGE / 3600)
+    parser.add_argument("--batch-size", type=int, default=TEMP_JANITOR_BATCH_SIZE)
+    args = parser.parse_args()
+
+    result = sweep_temp_files(max_age=int(args.max_age_hours * 3600), batch_size=args.batch_size)
+    print(f"🧹 Deleted {result['files_deleted']} of {result['files_scanned']} temp files, reclaimed {result['bytes_reclaimed']} bytes")
+
+
+if __name__ == "__main__":
+    main()
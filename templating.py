@@ -0,0 +1,54 @@
+# templating.py
+"""
+🎨 Jinja2 Environment เดียวที่ใช้ร่วมกันทั้งแอป (main.py และ routers ของหน้า Admin)
+
+- Template ที่ Compile แล้วถูกเก็บเป็น Bytecode บนดิสก์ (FileSystemBytecodeCache)
+  Worker ใหม่หรือแอปที่เพิ่ง Restart จึงไม่ต้อง Compile Template ใหม่ทั้งหมด
+- Fragment Cache: HTML ของส่วนที่เรนเดอร์หนัก (แกลเลอรีรูปสินค้า, แถวในตารางสินค้า) ถูกเก็บตาม
+  (ชื่อ Template, product_id, products.version) ค่า version เพิ่มขึ้นทุกครั้งที่สินค้าหรือรูปของสินค้าเปลี่ยน
+  Key เดิมจึงไม่ถูกใช้อีกหลังข้อมูลเปลี่ยน (ไม่ต้องลบ Cache เอง)
+"""
+import os
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+from cache import TTLCache
+
+TEMPLATE_DIR = "templates"
+# ไม่ระบุจะใช้โฟลเดอร์ชั่วคราวของระบบ (ใช้ร่วมกันได้ทุก Worker บนเครื่องเดียวกัน)
+TEMPLATE_BYTECODE_DIR = os.environ.get('TEMPLATE_BYTECODE_DIR')
+FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 2048))
+FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 60 * 60))  # วินาที
+
+if TEMPLATE_BYTECODE_DIR:
+    os.makedirs(TEMPLATE_BYTECODE_DIR, exist_ok=True)
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(),
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_BYTECODE_DIR),
+    auto_reload=True
+)
+templates = Jinja2Templates(env=env)
+
+fragment_cache = TTLCache(maxsize=FRAGMENT_CACHE_SIZE, ttl=FRAGMENT_CACHE_TTL)
+
+
+def get_fragment(template_name: str, key: tuple):
+    """ 🔍 HTML ที่เรนเดอร์ไว้แล้วของ (template, *key) หรือ None ถ้ายังไม่มี """
+    return fragment_cache.get((template_name, *key))
+
+
+def render_fragment(template_name: str, key: tuple, context: dict):
+    """ 🧩 เรนเดอร์ Template แล้วเก็บผลไว้ตาม key (เช่น (product_id, version)) คืนค่าเป็น Markup ใส่ใน Template อื่นได้ทันที """
+    html = Markup(env.get_template(template_name).render(context))
+    fragment_cache.set((template_name, *key), html)
+    return html
+
+
+def cached_fragment(template_name: str, key: tuple, context_factory):
+    """ 🧩 ใช้ HTML จาก Cache ถ้ามี ไม่งั้นเรียก context_factory() (เช่น อ่านฐานข้อมูล) แล้วเรนเดอร์ """
+    html = get_fragment(template_name, key)
+    if html is None:
+        html = render_fragment(template_name, key, context_factory())
+    return html
@@ -0,0 +1,74 @@
+import os
+import sys
+import pytest
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCursor:
+    """ Cursor ที่ตอบผลลัพธ์ตามลำดับ Query และจำคำสั่งที่ถูกเรียก (commit บันทึกเป็น "COMMIT") """
+
+    def __init__(self, results=(), rowcount=0):
+        self.results = list(results)
+        self.executed = []
+        self.rowcount = rowcount
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def executemany(self, sql, seq_of_params):
+        self.executed.append((sql, list(seq_of_params)))
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+    def statements(self, prefix):
+        """ คำสั่งที่ขึ้นต้นด้วย prefix (ไม่สนช่องว่างนำหน้า) ตามลำดับที่ถูกเรียก """
+        return [(sql, params) for sql, params in self.executed if sql.strip().startswith(prefix)]
+
+
+class FakeConnection:
+    """ Connection ที่ทุก cursor() ใช้ FakeCursor ตัวเดียวกัน """
+
+    def __init__(self, cursor):
+        self.fake_cursor = cursor
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self.fake_cursor
+
+    def __exit__(self, *exc):
+        return False
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        self.commits += 1
+        self.fake_cursor.executed.append(("COMMIT", None))
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """ ให้ get_connection() ของ module คืนฐานข้อมูลปลอม: conn = fake_db(module, results, rowcount=...) """
+
+    def install(module, results=(), rowcount=0):
+        conn = FakeConnection(FakeCursor(results, rowcount))
+        monkeypatch.setattr(module, "get_connection", lambda: conn)
+        return conn
+
+    return install
@@ -0,0 +1,26 @@
+import os
+import sys
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth
+
+
+def test_expired_revocations_are_purged_by_one_worker_per_round(tmp_path, fake_db):
+    """Test that the janitor purge deletes expired revocations once and skips while the last purge is recent."""
+    conn = fake_db(auth, rowcount=3)
+    lock_path = str(tmp_path / "purge.lock")
+
+    assert auth.purge_expired_revocations(min_age=60, lock_path=lock_path) == 3
+    assert auth.purge_expired_revocations(min_age=60, lock_path=lock_path) is None
+
+    deletes = conn.fake_cursor.statements("DELETE")
+    assert len(deletes) == 1 and deletes[0][0].startswith("DELETE FROM revoked_tokens")
+    assert conn.commits == 1
+
+
+def test_revocation_purge_lock_is_not_under_the_public_uploads_directory():
+    """Test that the default purge lock lives outside the /uploads static mount."""
+    uploads = os.path.abspath("uploads")
+    assert not os.path.abspath(auth.REVOCATION_PURGE_LOCK_PATH).startswith(uploads + os.sep)
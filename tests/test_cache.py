@@ -0,0 +1,164 @@
+import asyncio
+import os
+import sys
+import time
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrent.futures import ThreadPoolExecutor
+from cache import TTLCache, BloomFilter, DiskLRUCache, AsyncSingleFlight, single_flight
+import catalog_cache
+
+def test_ttl_cache_evicts_least_recently_used():
+    """Test that the cache keeps at most maxsize entries, dropping the least recently used."""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" becomes most recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+def test_ttl_cache_expires_entries():
+    """Test that entries are not returned after their TTL has passed."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("short", "value", ttl=0.01)
+    cache.set("long", "value")
+    time.sleep(0.02)
+
+    assert cache.get("short") is None
+    assert cache.get("long") == "value"
+
+def test_bloom_filter_has_no_false_negatives():
+    """Test that every added key is reported as possibly present."""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f"jti:{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other:{i}" in bloom for i in range(1000))
+    assert false_positives < 50
+
+def test_disk_lru_cache_evicts_oldest_files(tmp_path):
+    """Test that the disk cache deletes least recently used files once over its byte limit."""
+    cache = DiskLRUCache(str(tmp_path), max_bytes=20)
+    for name in ("a", "b"):
+        (tmp_path / name).write_bytes(b"x" * 8)
+        cache.add(name)
+    assert cache.get("a") is not None  # "a" becomes most recently used
+    (tmp_path / "c").write_bytes(b"x" * 8)
+    cache.add("c")
+
+    assert cache.get("b") is None
+    assert not (tmp_path / "b").exists()
+    assert cache.get("a") is not None
+    assert cache.total_bytes == 16
+
+def test_disk_lru_cache_limit_covers_every_worker(tmp_path):
+    """Test that caches sharing a directory keep the directory, not each process, under the byte limit."""
+    first = DiskLRUCache(str(tmp_path), max_bytes=20, scan_interval=0)
+    second = DiskLRUCache(str(tmp_path), max_bytes=20, scan_interval=0)
+    for age, name in ((30, "a"), (20, "b")):
+        (tmp_path / name).write_bytes(b"x" * 8)
+        os.utime(tmp_path / name, (time.time() - age, time.time() - age))
+        first.add(name)
+    (tmp_path / "c").write_bytes(b"x" * 8)
+    second.add("c")
+
+    assert sorted(os.listdir(tmp_path)) == ["b", "c"]
+    assert first.get("a") is None
+    assert second.total_bytes == 16
+
+def test_async_single_flight_runs_once_for_concurrent_calls():
+    """Test that concurrent calls with the same key share a single execution."""
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", work, 21) for _ in range(5)))
+
+    assert asyncio.run(run()) == [42] * 5
+    assert calls == [21]
+
+def test_async_single_flight_survives_a_cancelled_leader():
+    """Test that cancelling the first caller (client disconnect) does not cancel the callers waiting on it."""
+    flight = AsyncSingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    assert asyncio.run(run()) == ("done", True)
+    assert flight.stats()["executions"] == 1
+
+def test_catalog_search_is_coalesced_and_invalidated_by_version(monkeypatch):
+    """Test that identical concurrent searches share one query and a write bumps them out of the cache."""
+    calls = []
+    shared_version = [0]
+    monkeypatch.setattr(catalog_cache, "load_shared_version", lambda: shared_version[0])
+    monkeypatch.setattr(catalog_cache, "CATALOG_VERSION_CHECK_INTERVAL", 0)
+
+    def loader(*filters):
+        calls.append(filters)
+        time.sleep(0.05)
+        return {"products": [], "total_count": len(calls)}
+
+    filters = ("mug-test", None, None, None, None, False, 1, 10)
+
+    async def search_twice():
+        return await asyncio.gather(
+            catalog_cache.cached_search(filters, loader),
+            catalog_cache.cached_search(filters, loader)
+        )
+
+    first, second = asyncio.run(search_twice())
+    assert first is second
+    assert asyncio.run(catalog_cache.cached_search(filters, loader)) is first
+    assert len(calls) == 1
+
+    catalog_cache.bump_version()
+    assert asyncio.run(catalog_cache.cached_search(filters, loader))["total_count"] == 2
+
+    # เขียนจาก Worker อื่น (ไม่ได้เรียก bump_version ใน Process นี้) แต่ Trigger เพิ่ม version ที่ใช้ร่วมกัน
+    shared_version[0] += 1
+    assert asyncio.run(catalog_cache.cached_search(filters, loader))["total_count"] == 3
+
+def test_single_flight_coalesces_threads_and_async_callers():
+    """Test that concurrent identical calls from threads or coroutines share one execution."""
+    calls = []
+
+    @single_flight
+    def load(product_id):
+        calls.append(product_id)
+        time.sleep(0.05)
+        return {"product_id": product_id}
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(load, [7] * 5))
+    assert all(result is results[0] for result in results)
+    assert calls == [7]
+
+    async def run():
+        return await asyncio.gather(*(load.aio(8) for _ in range(5)))
+
+    assert asyncio.run(run()) == [{"product_id": 8}] * 5
+    assert calls == [7, 8]
+    stats = load.stats()
+    assert stats["threads"]["coalesced"] == 4 and stats["async"]["coalesced"] == 4
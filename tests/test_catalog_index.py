@@ -0,0 +1,74 @@
+import os
+import sys
+from datetime import datetime
+import pytest
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("numpy")
+import catalog_index
+
+
+def _row(product_id, name, price, stock, day, updated_at=None):
+    return {
+        "product_id": product_id, "name": name, "price": price, "stock_quantity": stock,
+        "created_at": datetime(2024, 1, day), "updated_at": updated_at or datetime(2024, 1, day)
+    }
+
+
+def test_catalog_index_filters_sorts_and_updates_in_place():
+    """Test that the columnar index matches the SQL ordering and applies row changes."""
+    index = catalog_index.CatalogIndex.from_rows([
+        _row(1, "banana", 50, 0, 1),
+        _row(2, "Apple", 120, 5, 3),
+        _row(3, "cherry", 80, 30, 2),
+    ])
+
+    assert index.query() == ([2, 3, 1], 3)  # created_at จากใหม่ไปเก่า
+    assert index.query(sort="name", reverse=True) == ([2, 1, 3], 3)
+    assert index.query(min_price=60, sort="price", reverse=True) == ([3, 2], 2)
+    assert index.query(stock_status="low_stock") == ([2], 1)
+    assert index.query(page=2, per_page=2) == ([1], 3)
+
+    updated = index.updated([_row(1, "banana", 50, 7, 1)])
+    assert updated.query(stock_status="low_stock", sort="id", reverse=True) == ([1, 2], 2)
+    assert index.query(stock_status="low_stock") == ([2], 1)  # Index เดิมไม่ถูกแก้
+    assert index.updated([_row(9, "new", 10, 1, 4)]) is None
+
+
+def test_catalog_index_follows_other_workers_by_delta(monkeypatch):
+    """Test that writes seen only through the shared catalog version (no mark_dirty) are applied as a delta,
+    and that an added product forces a full rebuild."""
+    products = {1: _row(1, "banana", 50, 0, 1), 2: _row(2, "apple", 20, 8, 2)}
+    shared_version = [10]
+    delta_queries = []
+
+    def load_rows(product_ids=None, updated_since=None):
+        rows = list(products.values())
+        if updated_since is not None:
+            delta_queries.append(updated_since)
+            rows = [row for row in rows if row["updated_at"] >= updated_since]
+        counters = {"changes": shared_version[0], "total": len(products)}
+        return counters, rows
+
+    monkeypatch.setattr(catalog_index, "_load_rows", load_rows)
+    monkeypatch.setattr(catalog_index.catalog_cache, "load_shared_version", lambda: shared_version[0])
+    monkeypatch.setattr(catalog_index, "CATALOG_INDEX_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(catalog_index, "_index", None)
+
+    assert catalog_index.query(stock_status="in_stock") == ([2], 1)
+    builds = catalog_index.stats()["builds"]
+    assert catalog_index.query() == ([2, 1], 2)
+    assert delta_queries == []  # version เดิม ไม่ต้องอ่านอะไรเพิ่ม
+
+    products[1] = _row(1, "banana", 50, 4, 1, updated_at=datetime(2024, 2, 1))
+    shared_version[0] += 1
+    assert catalog_index.query(stock_status="in_stock", sort="id", reverse=True) == ([1, 2], 2)
+    assert catalog_index.stats()["builds"] == builds
+    assert delta_queries == [datetime(2024, 1, 2) - catalog_index.CATALOG_INDEX_DELTA_LAG]
+
+    products[3] = _row(3, "cherry", 80, 30, 3, updated_at=datetime(2024, 2, 2))
+    shared_version[0] += 1
+    assert catalog_index.query(stock_status="in_stock") == ([3, 2, 1], 3)
+    assert catalog_index.stats()["builds"] == builds + 1
@@ -0,0 +1,40 @@
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog_snapshot
+
+
+def _row(product_id, name, price, stock, image_url=None):
+    return {
+        "product_id": product_id, "name": name, "price": Decimal(price), "stock_quantity": stock,
+        "created_at": datetime(2024, 1, product_id), "version": 1,
+        "primary_image_id": product_id * 10 if image_url else None, "primary_image_url": image_url
+    }
+
+
+def test_snapshot_lookup_filter_and_swap(tmp_path):
+    """Test that a written snapshot is readable by id, filterable, and replaced atomically."""
+    path = str(tmp_path / "catalog.snapshot")
+    catalog_snapshot.write_snapshot([
+        _row(1, "แก้วกาแฟ", "120.50", 3, "/uploads/products/ab/cd/a.jpg"),
+        _row(2, "Plate", "80.00", 0),
+        _row(5, "Bowl", "200.00", 25),
+    ], path, version=1)
+
+    snapshot = catalog_snapshot.CatalogSnapshot(path)
+    assert snapshot.get(1)["name"] == "แก้วกาแฟ"
+    assert snapshot.get(1)["price"] == Decimal("120.50")
+    assert snapshot.get(1)["primary_image_url"] == "/uploads/products/ab/cd/a.jpg"
+    assert snapshot.get(3) is None
+    assert [p["product_id"] for p in snapshot.search(min_price=100)] == [1, 5]
+    assert [p["product_id"] for p in snapshot.search(stock_status="low_stock")] == [1]
+    assert [p["product_id"] for p in snapshot.search(after_id=1, limit=1)] == [2]
+
+    catalog_snapshot.write_snapshot([_row(1, "Mug", "99.00", 1)], path, version=2)
+    assert snapshot.get(5)["name"] == "Bowl"  # ผู้อ่านเดิมยังเห็นไฟล์เดิม
+    assert catalog_snapshot.CatalogSnapshot(path).version == 2
@@ -0,0 +1,81 @@
+import io
+import os
+import sys
+import asyncio
+import hashlib
+import pytest
+from fastapi import UploadFile
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_uploads import stream_to_disk, save_uploads, detect_image_type, UploadError
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+def test_detect_image_type_uses_magic_bytes():
+    """Test that image types are detected from file signatures."""
+    assert detect_image_type(b"\xff\xd8\xff\xe0" + b"\x00" * 8) == ("jpg", "image/jpeg")
+    assert detect_image_type(PNG_BYTES[:12]) == ("png", "image/png")
+    assert detect_image_type(b"GIF89a" + b"\x00" * 6) == ("gif", "image/gif")
+    assert detect_image_type(b"RIFF\x00\x00\x00\x00WEBP") == ("webp", "image/webp")
+    assert detect_image_type(b"<?php echo 1;") is None
+
+def test_stream_to_disk_hashes_and_counts_in_one_pass(tmp_path):
+    """Test that the saved file is named by detected type and reports size and sha256."""
+    saved = stream_to_disk(io.BytesIO(PNG_BYTES), str(tmp_path))
+
+    assert saved["extension"] == "png"
+    assert saved["file_size"] == len(PNG_BYTES)
+    assert saved["sha256"] == hashlib.sha256(PNG_BYTES).hexdigest()
+    sha256 = saved["sha256"]
+    assert saved["filename"] == f"{sha256}.png"
+    assert saved["relative_path"] == f"{sha256[:2]}/{sha256[2:4]}/{sha256}.png"
+    assert os.listdir(tmp_path / sha256[:2] / sha256[2:4]) == [saved["filename"]]
+
+    # Uploading the same content again reuses the stored file
+    again = stream_to_disk(io.BytesIO(PNG_BYTES), str(tmp_path))
+    assert again["path"] == saved["path"]
+    assert os.listdir(tmp_path / sha256[:2] / sha256[2:4]) == [saved["filename"]]
+
+def test_stream_to_disk_rejects_oversized_and_unknown_files(tmp_path):
+    """Test that rejected uploads leave no files behind."""
+    with pytest.raises(UploadError) as too_large:
+        stream_to_disk(io.BytesIO(PNG_BYTES), str(tmp_path), max_size=50)
+    assert too_large.value.status_code == 413
+
+    with pytest.raises(UploadError) as bad_type:
+        stream_to_disk(io.BytesIO(b"not an image at all"), str(tmp_path))
+    assert bad_type.value.status_code == 400
+
+    assert os.listdir(tmp_path) == []
+
+def test_save_uploads_reports_bad_files_without_failing_the_batch(tmp_path):
+    """Test that a batch keeps valid files and lists the rejected ones."""
+    files = [
+        UploadFile(io.BytesIO(PNG_BYTES), filename="a.png"),
+        UploadFile(io.BytesIO(b"not an image at all"), filename="notes.txt"),
+    ]
+    saved, errors = asyncio.run(save_uploads(files, str(tmp_path)))
+
+    assert [item["sha256"] for item in saved] == [hashlib.sha256(PNG_BYTES).hexdigest()]
+    assert [error["filename"] for error in errors] == ["notes.txt"]
+
+def test_released_blob_file_survives_a_reupload(tmp_path, monkeypatch):
+    """Test that the janitor keeps a released blob file that was uploaded again, and deletes a stale one."""
+    import image_processing
+    from datetime import datetime, timedelta
+
+    saved = stream_to_disk(io.BytesIO(PNG_BYTES), str(tmp_path))
+    monkeypatch.setattr(image_processing, "url_to_path", lambda image_url: saved["path"])
+    monkeypatch.setattr(image_processing, "VARIANTS_DIR", str(tmp_path / "variants"))
+
+    released_at = datetime.now() - timedelta(minutes=5)
+    stream_to_disk(io.BytesIO(PNG_BYTES), str(tmp_path))  # อัปโหลดซ้ำหลังรูปสุดท้ายถูกลบ
+    assert image_processing.delete_released_blob_files("/uploads/x.png", released_at) is False
+    assert os.path.exists(saved["path"])
+
+    os.utime(saved["path"], (0, 0))
+    assert image_processing.delete_released_blob_files("/uploads/x.png", released_at) is True
+    assert not os.path.exists(saved["path"])
+    assert os.listdir(os.path.dirname(saved["path"])) == []
@@ -0,0 +1,34 @@
+import os
+import sys
+from PIL import Image
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_processing
+
+SHA = "cd" * 32
+
+
+def _variants(tmp_path, source_format, ext):
+    source = tmp_path / f"{SHA}.{ext}"
+    Image.new("RGB", (300, 200), "red").save(source, source_format)
+    derivatives = image_processing.generate_derivatives(str(source), str(tmp_path / "variants"))
+    return {item["variant"]: item["file_type"] for item in derivatives}
+
+
+def test_webp_uploads_get_a_full_size_fallback_for_older_clients(tmp_path):
+    """Test that a WebP upload gets a JPEG 'original' while a JPEG upload is served as uploaded."""
+    webp = _variants(tmp_path, "WEBP", "webp")
+    assert webp[image_processing.ORIGINAL_VARIANT] == "image/jpeg"
+    assert set(webp.values()) == {"image/jpeg"}
+
+    jpeg = _variants(tmp_path, "JPEG", "jpg")
+    assert image_processing.ORIGINAL_VARIANT not in jpeg
+
+
+def test_resize_without_modern_format_support_never_answers_webp():
+    """Test that /img?w= picks a format the client can open when it does not list WebP or AVIF."""
+    assert image_processing.negotiate_resize_format("image/*", "image/webp") == "png"
+    assert image_processing.negotiate_resize_format("image/webp,image/*", "image/jpeg") == "webp"
+    assert image_processing.negotiate_resize_format("image/*", "image/jpeg") == "jpeg"
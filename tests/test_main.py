@@ -2,11 +2,13 @@ from fastapi.testclient import TestClient
 import pytest
 import os
 import sys
+from datetime import datetime
 
 # Add the parent directory to the path so we can import from the main app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app
+import templating
 
 # Create a test client
 client = TestClient(app)
@@ -33,4 +35,64 @@ def test_api_endpoints_exist():
     
     # Check for key endpoints
     assert "/users/login" in paths
-    assert "/products/" in paths
\ No newline at end of file
+    assert "/products/" in paths
+
+def test_product_row_fragment_is_cached_per_version():
+    """Test that a product row renders once per version and escapes product data."""
+    product = {
+        "product_id": 987654, "version": 1, "name": "<b>Mug</b>", "description": None,
+        "price": 120, "stock_quantity": 3, "created_at": datetime(2024, 1, 1), "primary_image": None
+    }
+    renders = []
+
+    def context():
+        renders.append(product["version"])
+        return {"product": product}
+
+    first = templating.cached_fragment("admin/products/_product_row.html", (987654, 1), context)
+    again = templating.cached_fragment("admin/products/_product_row.html", (987654, 1), context)
+    product["version"] = 2
+    templating.cached_fragment("admin/products/_product_row.html", (987654, 2), context)
+
+    assert again == first
+    assert renders == [1, 2]
+    assert "&lt;b&gt;Mug&lt;/b&gt;" in first
+
+def test_user_import_reports_blank_username_instead_of_failing():
+    """Test that a CSV row with an empty username cell is reported per row, not a 500."""
+    from auth import get_current_identity
+    app.dependency_overrides[get_current_identity] = lambda: {"sub": "root", "role": "admin"}
+    try:
+        csv_body = "first_name,last_name,email,phone,address,username,password\nSom,Chai,som@example.com,,,,password123\n"
+        response = client.post("/users/import", files={"file": ("users.csv", csv_body, "text/csv")})
+    finally:
+        app.dependency_overrides.pop(get_current_identity, None)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["inserted"] == 0 and body["failed"] == 1
+    assert body["errors"][0]["row"] == 2 and body["errors"][0]["field"] == "username"
+
+def test_temp_upload_with_only_rejected_files_returns_a_swappable_fragment():
+    """Test that the temp upload answers 200 with the per-file errors so HTMX swaps them in."""
+    from auth import get_admin_identity_from_cookie
+    app.dependency_overrides[get_admin_identity_from_cookie] = lambda: {"sub": "root", "role": "admin"}
+    try:
+        response = client.post(
+            "/admin/products/upload-temp/images",
+            files={"files": ("notes.jpg", b"not an image", "image/jpeg")}
+        )
+    finally:
+        app.dependency_overrides.pop(get_admin_identity_from_cookie, None)
+
+    assert response.status_code == 200
+    assert "notes.jpg" in response.text and "text-red-500" in response.text
+
+def test_admin_pages_redirect_to_login_without_a_session():
+    """Test that admin pages send browsers a real redirect and HTMX requests an HX-Redirect header."""
+    response = client.get("/admin/metrics", follow_redirects=False)
+    assert response.status_code == 303 and response.headers["location"] == "/admin/login"
+
+    response = client.get("/admin/metrics", headers={"HX-Request": "true"}, follow_redirects=False)
+    assert response.status_code == 200 and response.headers["HX-Redirect"] == "/admin/login"
+    assert response.text == ""
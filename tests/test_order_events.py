@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_events import OrderEventBroadcaster, ORDER_CREATED, ORDER_STATUS_CHANGED, format_sse
+
+def test_events_are_loaded_once_and_fanned_out():
+    """Test that orders published from worker threads are read once per batch and sent to every subscriber."""
+    loads = []
+
+    def loader(order_ids):
+        loads.append(sorted(order_ids))
+        return [{"order_id": order_id, "status": "pending"} for order_id in sorted(order_ids)]
+
+    broadcaster = OrderEventBroadcaster(loader=loader)
+
+    async def scenario():
+        async with broadcaster.subscribe() as first, broadcaster.subscribe() as second:
+            publishers = [
+                threading.Thread(target=broadcaster.publish, args=(1, ORDER_CREATED)),
+                threading.Thread(target=broadcaster.publish, args=(1, ORDER_STATUS_CHANGED)),
+                threading.Thread(target=broadcaster.publish, args=(2, ORDER_STATUS_CHANGED)),
+            ]
+            for thread in publishers:
+                thread.start()
+            for thread in publishers:
+                thread.join()
+            return await asyncio.wait_for(first.get(), 5), await asyncio.wait_for(second.get(), 5)
+
+    first_events, second_events = asyncio.run(scenario())
+
+    assert loads == [[1, 2]]
+    assert first_events is second_events
+    assert [(event, order["order_id"]) for event, order in first_events] == [
+        (ORDER_CREATED, 1), (ORDER_STATUS_CHANGED, 2)
+    ]
+    assert broadcaster.stats()["subscribers"] == 0
+
+def test_publish_without_subscribers_is_a_no_op():
+    """Test that publishing with nobody listening never touches the database."""
+    broadcaster = OrderEventBroadcaster(loader=lambda order_ids: 1 / 0)
+    broadcaster.publish(1, ORDER_CREATED)
+    assert broadcaster.stats()["published"] == 0
+
+def test_format_sse_prefixes_every_line():
+    """Test that multi-line HTML is framed as a single SSE event."""
+    assert format_sse("order", "<div>\n</div>") == "event: order\ndata: <div>\ndata: </div>\n\n"
+
+def test_orders_changed_by_other_workers_are_polled_once():
+    """Test that orders seen only through polling are delivered once, with new orders reported as created,
+    and that the orders table is only read when the shared change counter moves."""
+    now = datetime.now()
+    changed = [
+        {"order_id": 7, "status": "pending", "created_at": now, "updated_at": now},
+        {"order_id": 3, "status": "completed", "created_at": now - timedelta(days=1), "updated_at": now},
+    ]
+    polls = []
+
+    def poller(since):
+        polls.append(since)
+        return list(changed)
+
+    broadcaster = OrderEventBroadcaster(
+        loader=lambda order_ids: [], poller=poller, poll_interval=0.01, change_counter=lambda: 7
+    )
+
+    async def scenario():
+        async with broadcaster.subscribe() as queue:
+            first = await asyncio.wait_for(queue.get(), 5)
+            while broadcaster.stats()["polls"] < 3:
+                await asyncio.sleep(0.01)
+            return first, queue.empty()
+
+    events, nothing_else = asyncio.run(scenario())
+
+    assert [(event, order["order_id"]) for event, order in events] == [(ORDER_CREATED, 7), (ORDER_STATUS_CHANGED, 3)]
+    assert nothing_else
+    assert broadcaster.stats()["polled_events"] == 2
+    assert len(polls) == 1 and broadcaster.stats()["order_loads"] == 1
@@ -0,0 +1,66 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from auth import get_current_identity
+from models import order as order_model
+
+NOW = datetime(2024, 7, 1, 12, 0, 0)
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+def test_archive_orders_moves_closed_orders_in_batches_before_the_cutoff(fake_db, monkeypatch):
+    """Test that each batch copies then deletes its orders in one transaction and stops on a short batch."""
+    monkeypatch.setattr(order_model, "datetime", FrozenDatetime)
+    conn = fake_db(order_model, [[{"order_id": 1}, {"order_id": 2}], [{"order_id": 3}]])
+
+    assert order_model.archive_orders(older_than_days=30, batch_size=2) == 3
+
+    statements = [sql.split()[0:3] for sql, params in conn.fake_cursor.executed]
+    batch = [
+        ["SELECT", "order_id", "FROM"],
+        ["INSERT", "INTO", "orders_archive"],
+        ["INSERT", "INTO", "order_items_archive"],
+        ["DELETE", "FROM", "order_items"],
+        ["DELETE", "FROM", "orders"],
+        ["COMMIT"],
+    ]
+    assert statements == batch + batch
+
+    select_sql, select_params = conn.fake_cursor.executed[0]
+    # Order ที่อัปเดตตรงเวลา cutoff พอดียังไม่ถูกย้าย (updated_at < cutoff)
+    assert "updated_at < %s" in select_sql
+    assert select_params == ("completed", "cancelled", NOW - timedelta(days=30), 2)
+    assert conn.fake_cursor.executed[1][1] == [NOW, 1, 2]
+    assert conn.fake_cursor.executed[10][1] == [3]
+
+
+def test_archive_orders_stops_when_nothing_is_old_enough(fake_db):
+    """Test that an empty batch ends the run without writing."""
+    conn = fake_db(order_model, [[]])
+
+    assert order_model.archive_orders() == 0
+    assert len(conn.fake_cursor.executed) == 1 and conn.commits == 0 and conn.rollbacks == 1
+
+
+def test_update_of_an_order_archived_after_the_check_is_a_conflict(monkeypatch):
+    """Test that an order archived between the lookup and the update returns 409 instead of a server error."""
+    monkeypatch.setattr(order_model, "get_order_with_items", lambda order_id: {"order_id": order_id, "archived": False})
+    monkeypatch.setattr(order_model, "update_order_status", lambda order_id, status: None)
+    app.dependency_overrides[get_current_identity] = lambda: {"user_id": 1, "role": "admin"}
+    try:
+        response = TestClient(app).put("/orders/5", json={"status": "completed"})
+    finally:
+        app.dependency_overrides.pop(get_current_identity, None)
+
+    assert response.status_code == 409
@@ -0,0 +1,71 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import product_document
+from tests.conftest import FakeCursor
+
+
+def test_rebuild_product_document_stores_images_primary_and_variants():
+    """Test that a product document embeds its images, primary image and variant URLs."""
+    now = datetime(2024, 1, 1)
+    product = {
+        "product_id": 7, "name": "Mug", "description": None, "price": "120.00", "stock_quantity": 3,
+        "primary_image_id": 12, "version": 4, "created_at": now, "updated_at": now
+    }
+    image = {
+        "image_id": 12, "product_id": 7, "image_url": "/uploads/products/ab/cd/x.jpg", "image_type": "main",
+        "sort_order": 1, "is_primary": 1, "file_size": 100, "file_type": "image/jpeg",
+        "created_at": now, "updated_at": now, "blob_sha256": None
+    }
+    cursor = FakeCursor([product, [image], [{"image_id": 12, "variant": "thumbnail"}]])
+
+    document = json.loads(product_document.rebuild_product_document(cursor, 7))
+
+    assert document["version"] == 4
+    assert document["primary_image"]["image_id"] == 12
+    assert document["images"][0]["variants"] == {"thumbnail": "/img/12/thumbnail"}
+    sql, params = cursor.executed[-1]
+    assert "INSERT INTO product_documents" in sql and params[:2] == (7, 4)
+
+
+def test_missing_document_is_built_from_the_live_product(fake_db):
+    """Test that a product without a stored document is built from the live rows without writing it."""
+    now = datetime(2024, 1, 1)
+    product = {
+        "product_id": 3, "name": "Lamp", "description": "Desk lamp", "price": "990.00", "stock_quantity": 0,
+        "primary_image_id": None, "version": 1, "created_at": now, "updated_at": now
+    }
+    conn = fake_db(product_document, [None, product, []])
+
+    document = json.loads(product_document.get_product_document(3))
+
+    assert document["product_id"] == 3 and document["images"] == [] and document["primary_image"] is None
+    assert conn.commits == 0
+    assert all(sql.strip().startswith("SELECT") for sql, params in conn.fake_cursor.executed)
+
+    fake_db(product_document, [None, None])
+    assert product_document.get_product_document(99) is None
+
+
+def test_product_list_includes_products_without_a_document(fake_db):
+    """Test that the catalog page keeps products whose document is missing, built from the live rows."""
+    now = datetime(2024, 1, 1)
+    product = {
+        "product_id": 5, "name": "Desk", "description": None, "price": "2500.00", "stock_quantity": 2,
+        "primary_image_id": None, "version": 2, "created_at": now, "updated_at": now
+    }
+    page = [{"product_id": 4, "document": '{"product_id":4}'}, {"product_id": 5, "document": None}]
+    conn = fake_db(product_document, [page, product, []])
+
+    rows = product_document.list_product_documents(after_id=3, limit=2)
+
+    assert [row["product_id"] for row in rows] == [4, 5]
+    assert rows[0]["document"] == '{"product_id":4}'
+    assert json.loads(rows[1]["document"])["name"] == "Desk"
+    assert "LEFT JOIN product_documents" in conn.fake_cursor.executed[0][0]
+    assert conn.commits == 0 and conn.fake_cursor.statements("INSERT") == []
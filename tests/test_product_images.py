@@ -0,0 +1,87 @@
+import os
+import sys
+from types import SimpleNamespace
+import pytest
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import product_document
+from models import product_image as image_model
+
+
+@pytest.fixture(autouse=True)
+def no_document_rebuild(monkeypatch):
+    # เอกสารสินค้ามีเทสของตัวเอง (test_product_documents.py) ที่นี่ดูเฉพาะคำสั่งของรูปภาพ
+    monkeypatch.setattr(product_document, "rebuild_product_document", lambda cursor, product_id: None)
+
+
+def test_reorder_images_updates_every_sort_order_in_one_statement(fake_db):
+    """Test that reordering issues a single CASE update that numbers the images from 1."""
+    conn = fake_db(image_model, [{"count": 3}, []])
+
+    assert image_model.reorder_images(7, [5, 3, 9]) == []
+
+    updates = conn.fake_cursor.statements("UPDATE product_images")
+    assert len(updates) == 1
+    sql, params = updates[0]
+    assert "CASE image_id WHEN %s THEN %s WHEN %s THEN %s WHEN %s THEN %s END" in sql
+    assert params[:6] == [5, 1, 3, 2, 9, 3]
+    assert params[7:] == [7, 5, 3, 9]
+    assert conn.commits == 1
+
+    conn = fake_db(image_model, [{"count": 2}])
+    assert image_model.reorder_images(7, [5, 3, 4]) is False
+    assert conn.fake_cursor.statements("UPDATE") == [] and conn.commits == 0
+
+
+def test_set_primary_image_writes_only_the_product_pointer(fake_db):
+    """Test that changing the primary image rewrites products.primary_image_id and no image rows."""
+    conn = fake_db(image_model, [{"image_id": 12, "product_id": 7, "is_primary": 1}])
+
+    assert image_model.set_primary_image(12, 7)["is_primary"] == 1
+
+    cursor = conn.fake_cursor
+    assert cursor.statements("UPDATE product_images") == []
+    assert cursor.statements("UPDATE products SET primary_image_id") == [
+        ("UPDATE products SET primary_image_id = %s WHERE product_id = %s", (12, 7))
+    ]
+
+
+def test_first_image_of_a_batch_becomes_primary_when_none_is_set(fake_db):
+    """Test that a batch insert appends after the current images and points an unset primary at its first row."""
+    images = [
+        SimpleNamespace(image_url=f"/uploads/products/ab/cd/{name}.jpg", blob_sha256=None, image_type="main",
+                        file_size=100, file_type="image/jpeg")
+        for name in ("a", "b")
+    ]
+    conn = fake_db(image_model, [{"max_order": 2}, [{"image_id": 21}, {"image_id": 22}]])
+
+    assert image_model.create_product_images(7, images) == [{"image_id": 21}, {"image_id": 22}]
+
+    cursor = conn.fake_cursor
+    statements = [sql.strip() for sql, params in cursor.executed]
+    insert_at = next(i for i, sql in enumerate(statements) if sql.startswith("INSERT INTO product_images"))
+    insert_params = cursor.executed[insert_at][1]
+    assert insert_params[4] == 3 and insert_params[13] == 4  # sort_order ต่อจากรูปเดิม
+    # LAST_INSERT_ID() ต้องอ่านทันทีหลัง Multi-row INSERT จึงได้ ID ของแถวแรกใน batch
+    assert statements[insert_at + 1].startswith("UPDATE products SET primary_image_id = LAST_INSERT_ID()")
+    assert "primary_image_id IS NULL" in statements[insert_at + 1]
+    assert cursor.statements("INSERT INTO image_blobs") == []
+    assert conn.commits == 1
+
+
+def test_primary_images_are_copied_before_the_old_column_is_dropped(fake_db):
+    """Test that the upgrade commits the is_primary backfill before dropping the column and is a no-op afterwards."""
+    conn = fake_db(image_model, [{"count": 0}, {"count": 1}], rowcount=4)
+
+    assert image_model.migrate_primary_images() == 4
+
+    statements = [sql.strip() for sql, params in conn.fake_cursor.executed if not sql.strip().startswith("SELECT")]
+    assert statements[0].startswith("ALTER TABLE products ADD COLUMN primary_image_id")
+    assert statements[1].startswith("UPDATE products p") and "pi.is_primary = 1" in statements[1]
+    assert statements[2:] == ["COMMIT", "ALTER TABLE product_images DROP COLUMN is_primary"]
+
+    conn = fake_db(image_model, [{"count": 1}, {"count": 0}])
+    assert image_model.migrate_primary_images() == 0
+    assert all(sql.strip().startswith("SELECT") for sql, params in conn.fake_cursor.executed)
@@ -0,0 +1,81 @@
+import os
+import sys
+import pytest
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog_cache
+import catalog_index
+from cache import TTLCache
+from models import product as product_model
+from tests.conftest import FakeCursor
+
+
+@pytest.fixture
+def count_cache(monkeypatch):
+    cache = TTLCache(maxsize=16, ttl=60)
+    monkeypatch.setattr(catalog_cache, "count_cache", cache)
+    return cache
+
+
+def _products(*product_ids):
+    return [{"product_id": product_id, "primary_image_id": None} for product_id in product_ids]
+
+
+def test_unfiltered_and_stock_counts_read_the_counter_table(count_cache):
+    """Test that counts without a price or text filter come from product_counters and are exact."""
+    cursor = FakeCursor([{"count": 42}, {"count": 7}])
+
+    assert product_model.count_products(cursor) == (42, True)
+    assert product_model.count_products(cursor, stock_status="low_stock") == (7, True)
+
+    assert [sql for sql, params in cursor.executed] == [
+        "SELECT COALESCE(SUM(total), 0) AS count FROM product_counters",
+        "SELECT COALESCE(SUM(low_stock), 0) AS count FROM product_counters",
+    ]
+
+
+def test_price_count_is_exact_and_search_count_is_cached_as_about(count_cache):
+    """Test that a price filter counts the rows every time and a text search count is cached and marked approximate."""
+    cursor = FakeCursor([{"count": 5}, {"count": 3}])
+
+    assert product_model.count_products(cursor, min_price=100.0, stock_status="in_stock") == (5, True)
+    sql, params = cursor.executed[0]
+    assert sql.startswith("SELECT COUNT(*) AS count FROM products p") and "p.stock_quantity > 0" in sql
+    assert params == [100.0]
+
+    assert product_model.count_products(cursor, search="mug") == (3, False)
+    assert product_model.count_products(cursor, search="mug") == (3, False)
+    assert len(cursor.executed) == 2 and count_cache.get(("mug", None, None, None)) == 3
+
+
+def test_search_products_uses_the_index_count_and_loads_only_the_page(fake_db, monkeypatch):
+    """Test that index-backed listing takes the total from the index and reads just the page rows."""
+    monkeypatch.setattr(catalog_index, "query", lambda *args: ([3, 1], 5))
+    conn = fake_db(product_model, [_products(1, 3)])
+
+    result = product_model.search_products(page=1, per_page=2)
+
+    assert [product["product_id"] for product in result["products"]] == [3, 1]
+    assert result["has_next"] is True and result["total_count"] == 5 and result["total_exact"] is True
+    assert conn.fake_cursor.executed[0][1] == [3, 1]
+    assert conn.fake_cursor.statements("SELECT COALESCE") == []
+
+
+def test_next_pagination_skips_counting_and_reads_one_extra_row(fake_db, monkeypatch):
+    """Test that pagination=next never counts and fetches per_page + 1 rows to detect the next page."""
+    monkeypatch.setattr(catalog_index, "query", lambda *args: None)
+    conn = fake_db(product_model, [_products(9, 8, 7)])
+
+    result = product_model.search_products(page=3, per_page=2, pagination=product_model.PAGINATION_NEXT)
+
+    assert [product["product_id"] for product in result["products"]] == [9, 8]
+    assert result["has_next"] is True and result["total_count"] is None and result["total_exact"] is False
+    assert len(conn.fake_cursor.executed) == 1
+    sql, params = conn.fake_cursor.executed[0]
+    assert "LIMIT %s OFFSET %s" in sql and params[-2:] == [3, 4]
+
+    conn = fake_db(product_model, [_products(2)])
+    result = product_model.search_products(page=4, per_page=2, pagination=product_model.PAGINATION_NEXT)
+    assert result["has_next"] is False and len(result["products"]) == 1
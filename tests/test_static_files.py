@@ -0,0 +1,72 @@
+import gzip
+import os
+import sys
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from static_files import CachedStaticFiles, IMMUTABLE_CACHE_CONTROL
+
+SHA = "ab" * 32
+
+def make_client(directory):
+    app = FastAPI()
+    app.mount("/uploads", CachedStaticFiles(directory=str(directory)), name="uploads")
+    return TestClient(app)
+
+def test_fingerprinted_files_are_immutable_with_strong_etag(tmp_path):
+    """Test that content-addressed files get a long-lived cache header and revalidate to 304."""
+    (tmp_path / f"{SHA}.png").write_bytes(b"\x89PNG" + b"\x00" * 100)
+    client = make_client(tmp_path)
+
+    response = client.get(f"/uploads/{SHA}.png")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["etag"] == f'"{SHA}"'
+
+    not_modified = client.get(f"/uploads/{SHA}.png", headers={"If-None-Match": f'"{SHA}"'})
+    assert not_modified.status_code == 304
+
+    partial = client.get(f"/uploads/{SHA}.png", headers={"Range": "bytes=0-3"})
+    assert partial.status_code == 206
+    assert partial.content == b"\x89PNG"
+
+def test_other_files_revalidate_and_use_precompressed_sidecars(tmp_path):
+    """Test that non-fingerprinted files must revalidate and .gz sidecars are served when accepted."""
+    svg = b"<svg xmlns='http://www.w3.org/2000/svg'></svg>"
+    (tmp_path / "logo.svg").write_bytes(svg)
+    (tmp_path / "logo.svg.gz").write_bytes(gzip.compress(svg))
+    client = make_client(tmp_path)
+
+    response = client.get("/uploads/logo.svg", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == svg
+
+def test_flat_urls_resolve_after_files_move_to_sharded_layout(tmp_path):
+    """Test that an old flat URL still serves the file once it has moved to ab/cd/."""
+    sharded_dir = tmp_path / "products" / SHA[:2] / SHA[2:4]
+    sharded_dir.mkdir(parents=True)
+    (sharded_dir / f"{SHA}.png").write_bytes(b"\x89PNG" + b"\x00" * 10)
+    client = make_client(tmp_path)
+
+    assert client.get(f"/uploads/products/{SHA}.png").status_code == 200
+    assert client.get(f"/uploads/products/{SHA[:2]}/{SHA[2:4]}/{SHA}.png").status_code == 200
+    assert client.get("/uploads/products/missing.png").status_code == 404
+
+def test_only_variants_named_with_their_parameters_are_immutable(tmp_path):
+    """Test that a derived image is immutable only when its size/format/quality tag is part of the name."""
+    import image_processing
+
+    tag = image_processing.variant_tag(128, "JPEG")
+    assert tag != image_processing.variant_tag(160, "JPEG") and tag != image_processing.variant_tag(128, "WEBP")
+
+    (tmp_path / f"{SHA}_thumbnail-{tag}.jpg").write_bytes(b"\xff\xd8" + b"\x00" * 10)
+    (tmp_path / f"{SHA}_thumbnail.jpg").write_bytes(b"\xff\xd8" + b"\x00" * 10)
+    client = make_client(tmp_path)
+
+    assert client.get(f"/uploads/{SHA}_thumbnail-{tag}.jpg").headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert client.get(f"/uploads/{SHA}_thumbnail.jpg").headers["cache-control"] == "no-cache"